@@ -2,13 +2,30 @@ from flask import request, jsonify
 from app import app
 from marshmallow import Schema, fields, validate
 from modules.models.account import AccountType
-from modules.utils.db import db
+from modules.utils.db import after_commit, db, unit_of_work
+from modules.utils.principals import cache_principal_details, invalidate_principal
+from modules.utils.query_plans import register_query
 from secrets import token_urlsafe
 import jwt
 
 from modules.utils.route_utils import handle_route, protected_route
 from modules.utils.schema_utils import UnionField
 
+# The account with its student/lecturer ID, looked up by `account_id = %s` or `email = %s`.
+LOGIN_QUERY = """
+    SELECT a.*, sd.student_id, ld.lecturer_id
+    FROM Account a
+    LEFT JOIN StudentDetails sd ON sd.account_id = a.account_id
+    LEFT JOIN LecturerDetails ld ON ld.account_id = a.account_id
+    WHERE a.{condition}
+"""
+
+register_query(
+    "auth.login",
+    LOGIN_QUERY.format(condition="email = %s"),
+    "SELECT email FROM Account LIMIT 1",
+)
+
 class RegisterSchema(Schema):
     email = fields.Str(required=True)
     name = fields.Str(required=True)
@@ -32,6 +49,7 @@ class LoginSchema(Schema):
 
 @app.route("/auth/register", methods=["POST"])
 @protected_route(roles=[AccountType.Admin])
+@unit_of_work
 def register():
     body = RegisterSchema().load(request.get_json(force=True))
     db_cursor = db.cursor()
@@ -73,7 +91,6 @@ def register():
         ),
     )
 
-    db.commit()
     user_id = db_cursor.lastrowid
 
     # Based on the account type, create either a StudentDetails or LecturerDetails record
@@ -82,20 +99,25 @@ def register():
             "INSERT INTO StudentDetails (account_id, major) VALUES (%s, %s)",
             (user_id, major),
         )
+        details_claims = {"student_id": db_cursor.lastrowid}
     else:
         db_cursor.execute(
             "INSERT INTO LecturerDetails (account_id, department) VALUES (%s, %s)",
             (user_id, dept),
         )
+        details_claims = {"lecturer_id": db_cursor.lastrowid}
 
-    db.commit()
+    # Drop any cached role details for this account once the new ones are committed,
+    # they're resolved again on next use.
+    after_commit(lambda: invalidate_principal(user_id))
 
     token = jwt.encode(
         payload={
             "sub": user_id,
             "name": body["name"],
             "email": body["email"],
-            "account_type": AccountType.Student.name,
+            "account_type": body["account_type"],
+            **details_claims,
         },
         key=app.config["JWT_SECRET"],
         algorithm="HS256",
@@ -110,7 +132,7 @@ def register():
 def login():
     def handler():
         body = LoginSchema().load(request.get_json(force=True))
-        db_cursor = db.cursor()
+        db_cursor = db.cursor(dictionary=True)
 
         # Find user with the ID
         query = ""
@@ -125,10 +147,8 @@ def login():
         else:
             query = "email = %s"
 
-        db_cursor.execute(
-            f"SELECT * FROM Account WHERE {query}",
-            (body["user_id"],),
-        )
+        # Resolve the student/lecturer ID in the same query so it can be signed into the token.
+        db_cursor.execute(LOGIN_QUERY.format(condition=query), (body["user_id"],))
         user = db_cursor.fetchone()
 
         # If the user does not exist, return an error.
@@ -139,19 +159,29 @@ def login():
             )
 
         # If the password is incorrect, return an error.
-        if not body["password"] == user[2]:
+        if not body["password"] == user["password"]:
             return (
                 jsonify({"message": "Invalid credentails!"}),
                 400,
             )
 
+        # Warm the principal cache with the account's student/lecturer ID.
+        details_claims = {
+            key: user[key]
+            for key in ("student_id", "lecturer_id")
+            if user[key] is not None
+        }
+        if details_claims:
+            cache_principal_details(user["account_id"], **details_claims)
+
         # Create a JWT token and return the token to the user
         token = jwt.encode(
             payload={
-                "sub": user[0],
-                "name": user[5],
-                "email": user[1],
-                "account_type": user[3],
+                "sub": user["account_id"],
+                "name": user["name"],
+                "email": user["email"],
+                "account_type": user["account_type"],
+                **details_claims,
             },
             key=app.config["JWT_SECRET"],
             algorithm="HS256",
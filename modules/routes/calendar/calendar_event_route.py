@@ -2,6 +2,7 @@ import traceback
 from flask import request, jsonify
 from app import app
 from modules.models.account import AccountType
+from modules.routes.courses.courses_access import resolve_course_visibility
 from modules.routes.courses.courses_route import (
     _check_course_visibility,
     _fetch_student_details_from_session,
@@ -10,9 +11,25 @@ from modules.routes.calendar.calendar_event_schema import (
     CalendarEventSchema,
     DateRangeSchema,
 )
-from modules.utils.db import db
+from modules.utils.db import db, unit_of_work
+from modules.utils.query_plans import register_query
 from modules.utils.route_utils import authenticate, fetch_session, protected_route
 
+COURSE_EVENTS_QUERY = "SELECT * FROM CalendarEvent WHERE course_id = %s"
+STUDENT_EVENTS_QUERY = "SELECT * FROM CalendarEvent WHERE course_id IN (SELECT course_code FROM Enrollment WHERE student_id = %s)"
+DATE_BETWEEN_FILTER = " AND date BETWEEN %s AND %s"
+
+register_query(
+    "calendar.get_course_calendar_events",
+    COURSE_EVENTS_QUERY,
+    "SELECT course_code FROM Course LIMIT 1",
+)
+register_query(
+    "calendar.get_student_calendar_events",
+    STUDENT_EVENTS_QUERY + DATE_BETWEEN_FILTER,
+    "SELECT student_id, CURDATE() AS start_date, CURDATE() + INTERVAL 30 DAY AS end_date FROM Enrollment LIMIT 1",
+)
+
 
 @app.route("/course/<string:course_code>/calendar", methods=["POST", "GET"])
 @protected_route()
@@ -23,6 +40,7 @@ def handle_course_calendar(course_code):
         return get_course_calendar_events(course_code)
 
 
+@unit_of_work
 def create_calendar_event(course_code: str):
     body = CalendarEventSchema().load(request.get_json(force=True))
     auth_res = authenticate([AccountType.Lecturer, AccountType.Admin])
@@ -42,7 +60,7 @@ def create_calendar_event(course_code: str):
     db_cursor = db.cursor(dictionary=True)
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only create a calendar event for your own courses!",
@@ -57,7 +75,6 @@ def create_calendar_event(course_code: str):
             "INSERT INTO CalendarEvent (course_id, date, event_name) VALUES (%s, %s, %s)",
             (body["course_id"], body["date"], body["event_name"]),
         )
-        db.commit()
 
         # Fetch the created calendar event
         event_no = db_cursor.lastrowid
@@ -69,7 +86,6 @@ def create_calendar_event(course_code: str):
         return jsonify(event), 201
     except Exception as e:
         traceback.print_exc()
-        db.rollback()
         return jsonify({"message": f"Failed to create calendar event: {str(e)}"}), 500
 
 
@@ -78,10 +94,12 @@ def get_course_calendar_events(course_code):
     if auth_res:
         return auth_res
 
+    session = fetch_session()
+
     db_cursor = db.cursor(dictionary=True)
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only get a calendar event for your own courses!",
@@ -92,9 +110,7 @@ def get_course_calendar_events(course_code):
         return visibility_res
 
     # Retrieve all calendar events
-    db_cursor.execute(
-        "SELECT * FROM CalendarEvent WHERE course_id = %s", (course_code,)
-    )
+    db_cursor.execute(COURSE_EVENTS_QUERY, (course_code,))
     events = db_cursor.fetchall()
     if not events:
         return jsonify({"message": "No calendar events found for this course"}), 404
@@ -110,8 +126,9 @@ def get_student_course_calendar_events(course_code: str, student_id: int):
     session = fetch_session()
 
     if session["account_type"] == AccountType.Student.name:
-        student_details = _fetch_student_details_from_session(session)
-        if student_details["student_id"] != student_id:
+        # Resolves the student's ID along with the course check, once per request.
+        visibility = resolve_course_visibility(session, course_code)
+        if visibility.student_id != student_id:
             return (
                 jsonify({"message": "Unauthorized access to student calendar events"}),
                 403,
@@ -137,11 +154,11 @@ def get_student_course_calendar_events(course_code: str, student_id: int):
     end_date = date_range.get("end_date")
 
     # Construct the query based on the provided start and end dates
-    query = "SELECT * FROM CalendarEvent WHERE course_id IN (SELECT course_id FROM Enrollment WHERE student_id = %s) AND course_id = %s"
+    query = STUDENT_EVENTS_QUERY + " AND course_id = %s"
     params = [student_id, course_code]
 
     if start_date is not None and end_date is not None:
-        query += " AND date BETWEEN %s AND %s"
+        query += DATE_BETWEEN_FILTER
         params.extend([start_date, end_date])
     elif start_date is not None:
         query += " AND date >= %s"
@@ -194,11 +211,11 @@ def get_student_calendar_events(student_id: int):
     end_date = date_range.get("end_date")
 
     # Construct the query based on the provided start and end dates
-    query = "SELECT * FROM CalendarEvent WHERE course_id IN (SELECT course_id FROM Enrollment WHERE student_id = %s)"
+    query = STUDENT_EVENTS_QUERY
     params = [student_id]
 
     if start_date is not None and end_date is not None:
-        query += " AND date BETWEEN %s AND %s"
+        query += DATE_BETWEEN_FILTER
         params.extend([start_date, end_date])
     elif start_date is not None:
         query += " AND date >= %s"
@@ -0,0 +1,316 @@
+from itertools import chain
+from typing import Iterator, NamedTuple
+from flask import g
+from modules.models.account import AccountType
+from modules.utils.db import db
+from modules.utils.principals import cache_principal_details, peek_principal_details
+from modules.utils.query_plans import register_query
+from modules.utils.route_utils import JWTPayload
+from modules.utils.streaming import iter_batches
+
+ALL_ROLES = (AccountType.Student, AccountType.Lecturer)
+
+
+class AccessResult(NamedTuple):
+    # Whether the row the query is anchored on (e.g. the assignment) exists.
+    found: bool
+    # Whether the principal may see the course that row belongs to.
+    allowed: bool
+    # The payload rows, without the access column.
+    rows: list[dict]
+
+
+class StreamedAccess(NamedTuple):
+    found: bool
+    allowed: bool
+    # Whether there is at least one payload row to stream.
+    has_rows: bool
+    # The payload rows in `fetchmany` batches, read lazily from the open cursor.
+    batches: Iterator[list[dict]]
+
+
+class CourseVisibility(NamedTuple):
+    visible: bool
+    # Whether the course exists at all, checked by the same query.
+    course_exists: bool = True
+    # The principal's StudentDetails/LecturerDetails ID, resolved by the same query.
+    student_id: int | None = None
+    lecturer_id: int | None = None
+
+
+def course_access_clause(
+    session: JWTPayload, course_code_column: str, roles=ALL_ROLES
+) -> tuple[str, tuple]:
+    """
+    Build a SQL expression that is 1 when the session's principal may see the
+    course in `course_code_column`. Students have to be enrolled in the course and
+    lecturers have to teach it. Any role not listed in `roles` is always allowed.
+    """
+    account_type = AccountType[session["account_type"]]
+    if account_type not in roles:
+        return "1", ()
+
+    # Skip the join on the details table when the principal's ID is already known.
+    details = peek_principal_details(session)
+    if details and account_type == AccountType.Student:
+        return (
+            f"""EXISTS (
+                SELECT 1 FROM Enrollment access_e
+                WHERE access_e.student_id = %s AND access_e.course_code = {course_code_column}
+            )""",
+            (details["student_id"],),
+        )
+    elif details and account_type == AccountType.Lecturer:
+        return (
+            f"""EXISTS (
+                SELECT 1 FROM Course access_c
+                WHERE access_c.lecturer_id = %s AND access_c.course_code = {course_code_column}
+            )""",
+            (details["lecturer_id"],),
+        )
+
+    if account_type == AccountType.Student:
+        return (
+            f"""EXISTS (
+                SELECT 1 FROM Enrollment access_e
+                JOIN StudentDetails access_sd ON access_sd.student_id = access_e.student_id
+                WHERE access_sd.account_id = %s AND access_e.course_code = {course_code_column}
+            )""",
+            (session["sub"],),
+        )
+    elif account_type == AccountType.Lecturer:
+        return (
+            f"""EXISTS (
+                SELECT 1 FROM Course access_c
+                JOIN LecturerDetails access_ld ON access_ld.lecturer_id = access_c.lecturer_id
+                WHERE access_ld.account_id = %s AND access_c.course_code = {course_code_column}
+            )""",
+            (session["sub"],),
+        )
+
+    return "1", ()
+
+
+def as_student(query: str, course_code_column: str) -> str:
+    """
+    Fill in a query's `{access}` check the way it runs for a signed-in student, so
+    `check-query-plans` can EXPLAIN it. The student ID is its first parameter.
+    """
+    session = {"sub": 0, "account_type": AccountType.Student.name, "student_id": 0}
+    access_sql, _ = course_access_clause(session, course_code_column)
+    return query.format(access=access_sql)
+
+
+def fetch_with_access(
+    session: JWTPayload,
+    query: str,
+    params: tuple,
+    course_code_column: str,
+    payload_key: str | None = None,
+    roles=ALL_ROLES,
+) -> AccessResult:
+    """
+    Answer "does this exist", "may this principal see it" and fetch the payload in
+    a single round trip.
+
+    `query` must select `{access} AS has_access` before any other placeholder, since
+    the access check's parameters are sent ahead of `params`. It should return no
+    rows when the anchor row doesn't exist. When the payload comes from a LEFT JOIN,
+    `payload_key` names a payload column so that the empty, unmatched row is dropped.
+    """
+    access = stream_with_access(
+        session, query, params, course_code_column, payload_key, roles
+    )
+    rows = list(chain.from_iterable(access.batches))
+    return AccessResult(found=access.found, allowed=access.allowed, rows=rows)
+
+
+def stream_with_access(
+    session: JWTPayload,
+    query: str,
+    params: tuple,
+    course_code_column: str,
+    payload_key: str | None = None,
+    roles=ALL_ROLES,
+) -> StreamedAccess:
+    """
+    Like `fetch_with_access`, but only the first batch is read up front to answer
+    the existence and access checks. The rest of the payload is left on the cursor
+    for the caller to stream.
+    """
+    access_sql, access_params = course_access_clause(
+        session, course_code_column, roles
+    )
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(query.format(access=access_sql), access_params + tuple(params))
+    batches = iter_batches(db_cursor)
+
+    first_batch = next(batches, None)
+    if not first_batch:
+        return StreamedAccess(found=False, allowed=False, has_rows=False, batches=iter(()))
+
+    allowed = bool(first_batch[0]["has_access"])
+    if not allowed:
+        # Drop the rows we won't send so the connection can run the next query.
+        db.consume_results()
+        return StreamedAccess(found=True, allowed=False, has_rows=False, batches=iter(()))
+
+    def payload(rows: list[dict]) -> list[dict]:
+        return [
+            {key: value for key, value in row.items() if key != "has_access"}
+            for row in rows
+            if not payload_key or row[payload_key] is not None
+        ]
+
+    # An unmatched LEFT JOIN only ever produces a single row, so an empty first
+    # batch means there is no payload at all.
+    first_payload = payload(first_batch)
+    if not first_payload:
+        db.consume_results()
+    return StreamedAccess(
+        found=True,
+        allowed=True,
+        has_rows=bool(first_payload),
+        batches=chain([first_payload], map(payload, batches)),
+    )
+
+
+_COURSE_EXISTS = "EXISTS (SELECT 1 FROM Course WHERE course_code = %s) AS course_exists"
+
+# Whether a course exists and whether a known student/lecturer may see it.
+STUDENT_VISIBILITY_QUERY = f"""
+    SELECT {_COURSE_EXISTS}, EXISTS (
+        SELECT 1 FROM Enrollment WHERE student_id = %s AND course_code = %s
+    ) AS visible
+"""
+LECTURER_VISIBILITY_QUERY = f"""
+    SELECT {_COURSE_EXISTS}, EXISTS (
+        SELECT 1 FROM Course WHERE lecturer_id = %s AND course_code = %s
+    ) AS visible
+"""
+
+# The same, resolving the principal's ID from the account. The outer join keeps
+# the row when the account has no details.
+STUDENT_ACCOUNT_VISIBILITY_QUERY = f"""
+    SELECT {_COURSE_EXISTS}, sd.student_id, EXISTS (
+        SELECT 1 FROM Enrollment e
+        WHERE e.student_id = sd.student_id AND e.course_code = %s
+    ) AS visible
+    FROM (SELECT 1) principal
+    LEFT JOIN StudentDetails sd ON sd.account_id = %s
+"""
+LECTURER_ACCOUNT_VISIBILITY_QUERY = f"""
+    SELECT {_COURSE_EXISTS}, ld.lecturer_id, EXISTS (
+        SELECT 1 FROM Course c
+        WHERE c.course_code = %s AND c.lecturer_id = ld.lecturer_id
+    ) AS visible
+    FROM (SELECT 1) principal
+    LEFT JOIN LecturerDetails ld ON ld.account_id = %s
+"""
+
+register_query(
+    "courses.student_visibility",
+    STUDENT_VISIBILITY_QUERY,
+    "SELECT course_code, student_id, course_code AS enrolled_course_code FROM Enrollment LIMIT 1",
+)
+register_query(
+    "courses.lecturer_visibility",
+    LECTURER_VISIBILITY_QUERY,
+    """
+    SELECT course_code, lecturer_id, course_code AS taught_course_code FROM Course
+    WHERE lecturer_id IS NOT NULL LIMIT 1
+    """,
+)
+register_query(
+    "courses.student_account_visibility",
+    STUDENT_ACCOUNT_VISIBILITY_QUERY,
+    """
+    SELECT e.course_code, e.course_code AS enrolled_course_code, sd.account_id
+    FROM Enrollment e JOIN StudentDetails sd ON sd.student_id = e.student_id LIMIT 1
+    """,
+)
+register_query(
+    "courses.lecturer_account_visibility",
+    LECTURER_ACCOUNT_VISIBILITY_QUERY,
+    """
+    SELECT c.course_code, c.course_code AS taught_course_code, ld.account_id
+    FROM Course c JOIN LecturerDetails ld ON ld.lecturer_id = c.lecturer_id LIMIT 1
+    """,
+)
+
+
+def resolve_course_visibility(session: JWTPayload, course_code: str) -> CourseVisibility:
+    """
+    Check whether the session's principal may see a course. Students have to be
+    enrolled in it and lecturers have to teach it, admins can see every course.
+
+    Whether the course exists, the check and the principal's student/lecturer ID
+    are resolved by a single query of primary key lookups, and the answer is
+    memoized for the rest of the request.
+    """
+    memo = g.setdefault("course_visibility", {})
+    key = (session["sub"], session["account_type"], course_code)
+    if key in memo:
+        return memo[key]
+
+    account_type = AccountType[session["account_type"]]
+    details = peek_principal_details(session)
+    db_cursor = db.cursor(dictionary=True)
+
+    if account_type == AccountType.Student and details:
+        db_cursor.execute(
+            STUDENT_VISIBILITY_QUERY,
+            (course_code, details["student_id"], course_code),
+        )
+        row = db_cursor.fetchone()
+        visibility = CourseVisibility(
+            visible=bool(row["visible"]),
+            course_exists=bool(row["course_exists"]),
+            student_id=details["student_id"],
+        )
+    elif account_type == AccountType.Lecturer and details:
+        db_cursor.execute(
+            LECTURER_VISIBILITY_QUERY,
+            (course_code, details["lecturer_id"], course_code),
+        )
+        row = db_cursor.fetchone()
+        visibility = CourseVisibility(
+            visible=bool(row["visible"]),
+            course_exists=bool(row["course_exists"]),
+            lecturer_id=details["lecturer_id"],
+        )
+    elif account_type == AccountType.Student:
+        db_cursor.execute(
+            STUDENT_ACCOUNT_VISIBILITY_QUERY,
+            (course_code, course_code, session["sub"]),
+        )
+        row = db_cursor.fetchone()
+        if row["student_id"] is not None:
+            cache_principal_details(session["sub"], student_id=row["student_id"])
+        visibility = CourseVisibility(
+            visible=bool(row["visible"]),
+            course_exists=bool(row["course_exists"]),
+            student_id=row["student_id"],
+        )
+    elif account_type == AccountType.Lecturer:
+        db_cursor.execute(
+            LECTURER_ACCOUNT_VISIBILITY_QUERY,
+            (course_code, course_code, session["sub"]),
+        )
+        row = db_cursor.fetchone()
+        if row["lecturer_id"] is not None:
+            cache_principal_details(session["sub"], lecturer_id=row["lecturer_id"])
+        visibility = CourseVisibility(
+            visible=bool(row["visible"]),
+            course_exists=bool(row["course_exists"]),
+            lecturer_id=row["lecturer_id"],
+        )
+    else:
+        db_cursor.execute(f"SELECT {_COURSE_EXISTS}", (course_code,))
+        visibility = CourseVisibility(
+            visible=True, course_exists=bool(db_cursor.fetchone()["course_exists"])
+        )
+
+    memo[key] = visibility
+    return visibility
@@ -9,7 +9,18 @@ from modules.routes.courses.courses_schema import (
     UpdateCourseSchema,
     CreateAssignmentSchema,
 )
-from modules.utils.db import db
+from modules.routes.courses.courses_access import (
+    as_student,
+    fetch_with_access,
+    resolve_course_visibility,
+    stream_with_access,
+)
+from modules.routes.courses.enrollment_counters import record_enrollment
+from modules.utils.db import db, unit_of_work
+from modules.utils.events import publish
+from modules.utils.pagination import Page
+from modules.utils.principals import resolve_principal_details
+from modules.utils.query_plans import register_query
 from modules.utils.route_utils import (
     JWTPayload,
     authenticate,
@@ -17,10 +28,117 @@ from modules.utils.route_utils import (
     fetch_session,
     protected_route,
 )
+from modules.utils.streaming import stream_rows
+
+# Columns of the Course table that list endpoints can project with `fields=`.
+COURSE_FIELDS = [
+    "course_code",
+    "course_name",
+    "lecturer_id",
+    "semester",
+    "enrollment_count",
+]
+
+
+def _course_page() -> Page:
+    # The course lists returned every course before they were paginated.
+    return Page(COURSE_FIELDS, key_columns=["course_code"], paged_by_default=False)
+
+
+def _courses_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause()
+    return f"SELECT {page.select_list()} FROM Course WHERE {keyset} ORDER BY {page.order_by()} LIMIT %s"
+
+
+def _courses_for_student_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause("c")
+    return f"""
+        SELECT {page.select_list("c")} FROM Course c
+        JOIN Enrollment e ON e.course_code = c.course_code AND e.student_id = %s
+        WHERE {keyset} ORDER BY {page.order_by("c")} LIMIT %s
+    """
+
+
+def _courses_for_lecturer_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause()
+    return f"SELECT {page.select_list()} FROM Course WHERE lecturer_id = %s AND {keyset} ORDER BY {page.order_by()} LIMIT %s"
+
+
+COURSE_MEMBERS_QUERY = """
+    SELECT {access} AS has_access, sd.*
+    FROM (SELECT %s AS course_code) c
+    LEFT JOIN Enrollment e ON e.course_code = c.course_code
+    LEFT JOIN StudentDetails sd ON sd.student_id = e.student_id
+"""
+
+ASSIGNMENTS_QUERY = """
+    SELECT {access} AS has_access, a.*
+    FROM Course c
+    LEFT JOIN Assignment a ON a.course_code = c.course_code
+    WHERE c.course_code = %s
+"""
+
+
+def _submissions_query(own_only: bool) -> str:
+    # Students only get their own submission.
+    own_submission = (
+        " AND s.student_id = (SELECT student_id FROM StudentDetails WHERE account_id = %s)"
+        if own_only
+        else ""
+    )
+    return f"""
+        SELECT {{access}} AS has_access, s.*
+        FROM Assignment a
+        LEFT JOIN AssignmentSubmission s ON s.assignment_id = a.assignment_id{own_submission}
+        WHERE a.assignment_id = %s
+    """
+
+
+register_query(
+    "courses.get_courses",
+    _courses_query,
+    "SELECT course_code, 101 AS row_limit FROM Course LIMIT 1",
+    page=_course_page,
+)
+register_query(
+    "courses.get_courses_for_student",
+    _courses_for_student_query,
+    "SELECT student_id, course_code, 101 AS row_limit FROM Enrollment LIMIT 1",
+    page=_course_page,
+)
+register_query(
+    "courses.get_courses_for_lecturer",
+    _courses_for_lecturer_query,
+    """
+    SELECT lecturer_id, course_code, 101 AS row_limit FROM Course
+    WHERE lecturer_id IS NOT NULL LIMIT 1
+    """,
+    page=_course_page,
+)
+register_query(
+    "courses.get_course_members",
+    as_student(COURSE_MEMBERS_QUERY, "c.course_code"),
+    "SELECT student_id, course_code FROM Enrollment LIMIT 1",
+)
+register_query(
+    "courses.get_assignments",
+    as_student(ASSIGNMENTS_QUERY, "c.course_code"),
+    "SELECT student_id, course_code FROM Enrollment LIMIT 1",
+)
+register_query(
+    "courses.get_submissions_for_assignment",
+    as_student(_submissions_query(own_only=True), "a.course_code"),
+    """
+    SELECT e.student_id, sd.account_id, a.assignment_id FROM Assignment a
+    JOIN Enrollment e ON e.course_code = a.course_code
+    JOIN StudentDetails sd ON sd.student_id = e.student_id LIMIT 1
+    """,
+)
 
 
 @app.route("/courses", methods=["POST"])
 @protected_route(roles=[AccountType.Admin])
+@unit_of_work
 def create_course():
     body = CreateCourseSchema().load(request.get_json(force=True))
     db_cursor = db.cursor()
@@ -58,13 +176,15 @@ def create_course():
         ),
     )
 
-    db.commit()
+    publish("course.changed", course_code=body["course_code"])
+
     course_code = db_cursor.lastrowid
     return jsonify({"course_code": course_code}), 201
 
 
 @app.route("/courses/<string:course_code>", methods=["PATCH"])
 @protected_route(roles=[AccountType.Admin])
+@unit_of_work
 def update_course(course_code: str):
     body = UpdateCourseSchema().load(request.get_json(force=True))
     db_cursor = db.cursor(dictionary=True)
@@ -101,7 +221,7 @@ def update_course(course_code: str):
         ),
     )
 
-    db.commit()
+    publish("course.changed", course_code=course_code)
 
     # Fetch current course details
     db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
@@ -113,10 +233,13 @@ def update_course(course_code: str):
 @app.route("/courses", methods=["GET"])
 @protected_route()
 def get_courses():
+    page = _course_page()
+    _, keyset_params = page.keyset_clause()
+
     db_cursor = db.cursor(dictionary=True)
-    db_cursor.execute("SELECT * FROM Course")
+    db_cursor.execute(_courses_query(page), keyset_params + (page.fetch_limit(),))
     courses = db_cursor.fetchall()
-    return jsonify(courses), 200
+    return page.response(courses), 200
 
 
 @app.route("/courses/<string:course_code>", methods=["GET"])
@@ -148,31 +271,41 @@ def get_courses_for_student(student_id: int):
         if student_id != student_details["student_id"]:
             return jsonify({"message": "You can only view your own courses!"}), 403
 
+    page = _course_page()
+    _, keyset_params = page.keyset_clause("c")
+
     db_cursor.execute(
-        "SELECT * FROM Course WHERE course_code IN (SELECT course_code FROM Enrollment WHERE student_id = %s)",
-        (student_id,),
+        _courses_for_student_query(page),
+        (student_id,) + keyset_params + (page.fetch_limit(),),
     )
 
     courses = db_cursor.fetchall()
-    if not len(courses):
+    if not len(courses) and page.after is None:
         return jsonify({"message": "There are no courses for this student!"}), 404
-    return jsonify(courses), 200
+    return page.response(courses), 200
 
 
 @app.route("/courses/lecturer/<int:lecturer_id>", methods=["GET"])
 @protected_route()
 def get_courses_for_lecturer(lecturer_id: int):
+    page = _course_page()
+    _, keyset_params = page.keyset_clause()
+
     db_cursor = db.cursor(dictionary=True)
-    db_cursor.execute("SELECT * FROM Course WHERE lecturer_id = %s", (lecturer_id,))
+    db_cursor.execute(
+        _courses_for_lecturer_query(page),
+        (lecturer_id,) + keyset_params + (page.fetch_limit(),),
+    )
 
     courses = db_cursor.fetchall()
-    if not len(courses):
+    if not len(courses) and page.after is None:
         return jsonify({"message": "There are no courses for this lecturer!"}), 404
-    return jsonify(courses), 200
+    return page.response(courses), 200
 
 
 @app.route("/courses/register/<string:course_code>", methods=["POST"])
 @protected_route([AccountType.Student])
+@unit_of_work
 def register_for_course(course_code: str):
     session = fetch_session()
     db_cursor = db.cursor(dictionary=True)
@@ -205,8 +338,13 @@ def register_for_course(course_code: str):
         "INSERT INTO Enrollment (student_id, course_code) VALUES (%s, %s)",
         (student_details["student_id"], course_code),
     )
+    record_enrollment(student_details["student_id"], course_code, 1)
+    publish(
+        "enrollment.changed",
+        course_code=course_code,
+        student_id=student_details["student_id"],
+    )
 
-    db.commit()
     return (
         jsonify(
             {
@@ -221,6 +359,7 @@ def register_for_course(course_code: str):
 
 @app.route("/courses/unregister/<string:course_code>", methods=["DELETE"])
 @protected_route([AccountType.Student])
+@unit_of_work
 def deregister_from_course(course_code: str):
     session = fetch_session()
     db_cursor = db.cursor(dictionary=True)
@@ -253,8 +392,15 @@ def deregister_from_course(course_code: str):
         "DELETE FROM Enrollment WHERE student_id = %s AND course_code = %s",
         (student_details["student_id"], course_code),
     )
+    # A concurrent request may have deleted it first, only count our own delete.
+    if db_cursor.rowcount:
+        record_enrollment(student_details["student_id"], course_code, -1)
+        publish(
+            "enrollment.changed",
+            course_code=course_code,
+            student_id=student_details["student_id"],
+        )
 
-    db.commit()
     return (
         jsonify(
             {
@@ -271,31 +417,26 @@ def deregister_from_course(course_code: str):
 @protected_route()
 def get_course_members(course_code: str):
     session = fetch_session()
-    db_cursor = db.cursor(dictionary=True)
 
-    if session["account_type"] == AccountType.Student.name:
-        # Fetch StudentDetails record
-        student_details = _fetch_student_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-            (student_details["student_id"], course_code),
-        )
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view members for your courses!"}),
-                403,
-            )
-
-    db_cursor.execute(
-        "SELECT * FROM StudentDetails WHERE student_id IN (SELECT student_id FROM Enrollment WHERE course_code = %s)",
+    # Check visibility and stream the members from one query.
+    access = stream_with_access(
+        session,
+        COURSE_MEMBERS_QUERY,
         (course_code,),
+        course_code_column="c.course_code",
+        payload_key="student_id",
+        roles=(AccountType.Student,),
     )
 
-    members = db_cursor.fetchall()
-    if not len(members):
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only view members for your courses!"}),
+            403,
+        )
+
+    if not access.has_rows:
         return jsonify({"message": "There are no members for this course!"}), 404
-    return jsonify(members), 200
+    return stream_rows(access.batches, filename=f"{course_code}-members"), 200
 
 
 @app.route("/courses/<string:course_code>/assignments", methods=["POST", "GET"])
@@ -307,6 +448,7 @@ def handle_assignments(course_code: str):
         return get_assignments(course_code)
 
 
+@unit_of_work
 def create_assignment(course_code: str):
     auth_res = authenticate([AccountType.Lecturer])
     if auth_res:
@@ -315,18 +457,21 @@ def create_assignment(course_code: str):
     body = CreateAssignmentSchema().load(request.get_json(force=True))
     db_cursor = db.cursor(dictionary=True)
 
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
+    # Check if the course exists and if the lecturer is the owner of the course.
+    access = fetch_with_access(
+        fetch_session(),
+        "SELECT {access} AS has_access, c.course_code FROM Course c WHERE c.course_code = %s",
+        (course_code,),
+        course_code_column="c.course_code",
+        roles=(AccountType.Lecturer,),
+    )
+    if not access.found:
         return (
             jsonify({"message": "There is no course with that course code!"}),
             404,
         )
 
-    # Check if the lecturer is the owner of the course.
-    lecturer_details = _fetch_lecturer_details_from_session(fetch_session())
-    if course["lecturer_id"] != lecturer_details["lecturer_id"]:
+    if not access.allowed:
         return (
             jsonify({"message": "You can only create assignments for your courses!"}),
             403,
@@ -344,41 +489,33 @@ def create_assignment(course_code: str):
         ),
     )
 
-    db.commit()
     assignment_id = db_cursor.lastrowid
     return jsonify({"assignment_id": assignment_id}), 201
 
 
 def get_assignments(course_code: str):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
+    # Check if the course exists, if a student is enrolled in it and fetch the assignments in one query.
+    access = fetch_with_access(
+        fetch_session(),
+        ASSIGNMENTS_QUERY,
+        (course_code,),
+        course_code_column="c.course_code",
+        payload_key="assignment_id",
+        roles=(AccountType.Student,),
+    )
+    if not access.found:
         return (
             jsonify({"message": "There is no course with that course code!"}),
             404,
         )
 
-    # If the user is a student, check if they are enrolled in the course.
-    session = fetch_session()
-    if session["account_type"] == AccountType.Student.name:
-        # Fetch StudentDetails record
-        student_details = _fetch_student_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-            (student_details["student_id"], course_code),
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only view assignments for your courses!"}),
+            403,
         )
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view assignments for your courses!"}),
-                403,
-            )
 
-    db_cursor.execute("SELECT * FROM Assignment WHERE course_code = %s", (course_code,))
-    assignments = db_cursor.fetchall()
+    assignments = access.rows
     if not len(assignments):
         return jsonify({"message": "There are no assignments for this course!"}), 404
     return jsonify(assignments), 200
@@ -386,6 +523,7 @@ def get_assignments(course_code: str):
 
 @app.route("/courses/assignments/<int:assignment_id>/submit", methods=["POST"])
 @protected_route([AccountType.Student])
+@unit_of_work
 def submit_assignment(assignment_id: int):
     uploaded_file = request.files.get("file")
     if not uploaded_file:
@@ -394,37 +532,37 @@ def submit_assignment(assignment_id: int):
     session = fetch_session()
     db_cursor = db.cursor(dictionary=True)
 
-    # Fetch StudentDetails record
-    student_details = _fetch_student_details_from_session(session)
-
-    # Check if the assignment exists.
-    db_cursor.execute(
-        "SELECT * FROM Assignment WHERE assignment_id = %s", (assignment_id,)
+    # Check if the assignment exists, if the student is enrolled in its course and
+    # if they have already submitted it in one query.
+    access = fetch_with_access(
+        session,
+        """
+        SELECT {access} AS has_access, sd.student_id,
+            EXISTS (
+                SELECT 1 FROM AssignmentSubmission s
+                WHERE s.assignment_id = a.assignment_id AND s.student_id = sd.student_id
+            ) AS already_submitted
+        FROM Assignment a
+        LEFT JOIN StudentDetails sd ON sd.account_id = %s
+        WHERE a.assignment_id = %s
+        """,
+        (session["sub"], assignment_id),
+        course_code_column="a.course_code",
     )
-    assignment = db_cursor.fetchone()
-    if not assignment:
+    if not access.found:
         return (
             jsonify({"message": "There is no assignment with that ID!"}),
             404,
         )
 
-    # Check if the student is enrolled in the course.
-    db_cursor.execute(
-        "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-        (student_details["student_id"], assignment["course_code"]),
-    )
-    if not db_cursor.fetchone():
+    if not access.allowed:
         return (
             jsonify({"message": "You are not enrolled in this course!"}),
             400,
         )
 
-    # Check if the assignment has already been submitted.
-    db_cursor.execute(
-        "SELECT * FROM AssignmentSubmission WHERE assignment_id = %s AND student_id = %s",
-        (assignment_id, student_details["student_id"]),
-    )
-    if db_cursor.fetchone():
+    student_details = access.rows[0]
+    if student_details["already_submitted"]:
         return (
             jsonify({"message": "You have already submitted this assignment!"}),
             400,
@@ -446,8 +584,6 @@ def submit_assignment(assignment_id: int):
         ),
     )
 
-    db.commit()
-
     submission_id = db_cursor.lastrowid
     return (
         jsonify({"message": "Assignment submitted!", "submission_id": submission_id}),
@@ -458,65 +594,42 @@ def submit_assignment(assignment_id: int):
 @app.route("/courses/assignments/<int:assignment_id>/submissions", methods=["GET"])
 @protected_route()
 def get_submissions_for_assignment(assignment_id: int):
-    db_cursor = db.cursor(dictionary=True)
+    session = fetch_session()
 
-    # Check if the assignment exists.
-    db_cursor.execute(
-        "SELECT * FROM Assignment WHERE assignment_id = %s", (assignment_id,)
+    # Check if the assignment exists, if the user may see its course and stream the
+    # submissions from one query. Students only get their own submission.
+    own_only = session["account_type"] == AccountType.Student.name
+    query_params = (session["sub"],) if own_only else ()
+    query_params += (assignment_id,)
+
+    access = stream_with_access(
+        session,
+        _submissions_query(own_only),
+        query_params,
+        course_code_column="a.course_code",
+        payload_key="submission_id",
     )
-    assignment = db_cursor.fetchone()
-    if not assignment:
+    if not access.found:
         return (
             jsonify({"message": "There is no assignment with that ID!"}),
             404,
         )
 
-    # Check if the user is a lecturer and if they teach the course associated with the assignment.
-    session = fetch_session()
-    if session["account_type"] == AccountType.Lecturer.name:
-        # Fetch LecturerDetails record
-        lecturer_details = _fetch_lecturer_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Course WHERE course_code = %s AND lecturer_id = %s",
-            (assignment["course_code"], lecturer_details["lecturer_id"]),
-        )
-
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view submissions for your courses!"}),
-                403,
-            )
-    elif session["account_type"] == AccountType.Student.name:
-        # Fetch StudentDetails record
-        student_details = _fetch_student_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-            (student_details["student_id"], assignment["course_code"]),
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only view submissions for your courses!"}),
+            403,
         )
 
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view submissions for your courses!"}),
-                403,
-            )
-
-    query = "SELECT * FROM AssignmentSubmission WHERE assignment_id = %s"
-    query_params = (assignment_id,)
-    if session["account_type"] == AccountType.Student.name:
-        query += " AND student_id = %s"
-        query_params += (student_details["student_id"],)
-
-    db_cursor.execute(query, query_params)
-    submissions = db_cursor.fetchall()
-
-    if not len(submissions):
+    if not access.has_rows:
         return (
             jsonify({"message": "There are no submissions for this assignment!"}),
             404,
         )
-    return jsonify(submissions), 200
+    return (
+        stream_rows(access.batches, filename=f"assignment-{assignment_id}-submissions"),
+        200,
+    )
 
 
 @app.route(
@@ -525,71 +638,50 @@ def get_submissions_for_assignment(assignment_id: int):
 )
 @protected_route()
 def get_specific_submission(assignment_id: int, submission_id: int):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the assignment exists.
-    db_cursor.execute(
-        "SELECT * FROM Assignment WHERE assignment_id = %s", (assignment_id,)
-    )
-    assignment = db_cursor.fetchone()
-    if not assignment:
-        return (
-            jsonify({"message": "There is no assignment with that ID!"}),
-            404,
-        )
-
-    # Check if the user is a lecturer and if they teach the course associated with the assignment.
     session = fetch_session()
-    if session["account_type"] == AccountType.Lecturer.name:
-        # Fetch lecturer details
-        lecturer_details = _fetch_lecturer_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Course WHERE course_code = %s AND lecturer_id = %s",
-            (assignment["course_code"], lecturer_details["lecturer_id"]),
-        )
-
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view submissions for your courses!"}),
-                403,
-            )
-    elif session["account_type"] == AccountType.Student.name:
-        # Fetch StudentDetails record
-        student_details = _fetch_student_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-            (student_details["student_id"], assignment["course_code"]),
-        )
-
-        if not db_cursor.fetchone():
-            return (
-                jsonify({"message": "You can only view submissions for your courses!"}),
-                403,
-            )
 
-    query = "SELECT * FROM AssignmentSubmission WHERE submission_id = %s AND assignment_id = %s"
-    query_params = (submission_id, assignment_id)
+    # Check if the assignment exists, if the user may see its course and fetch the
+    # submission in one query. Students can only fetch their own submission.
+    query = """
+        SELECT {access} AS has_access, s.*
+        FROM Assignment a
+        LEFT JOIN AssignmentSubmission s
+            ON s.assignment_id = a.assignment_id AND s.submission_id = %s
+    """
+    query_params = (submission_id,)
     if session["account_type"] == AccountType.Student.name:
-        query += " AND student_id = %s"
-        query_params += (student_details["student_id"],)
+        query += " AND s.student_id = (SELECT student_id FROM StudentDetails WHERE account_id = %s)"
+        query_params += (session["sub"],)
+    query += " WHERE a.assignment_id = %s"
+    query_params += (assignment_id,)
 
-    db_cursor.execute(
+    access = fetch_with_access(
+        session,
         query,
         query_params,
+        course_code_column="a.course_code",
+        payload_key="submission_id",
     )
+    if not access.found:
+        return (
+            jsonify({"message": "There is no assignment with that ID!"}),
+            404,
+        )
 
-    submission = db_cursor.fetchone()
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only view submissions for your courses!"}),
+            403,
+        )
 
-    if not submission:
+    if not access.rows:
         return (
             jsonify(
                 {"message": "There is no submission with that ID for this assignment!"}
             ),
             404,
         )
-    return jsonify(submission), 200
+    return jsonify(access.rows[0]), 200
 
 
 @app.route(
@@ -597,28 +689,40 @@ def get_specific_submission(assignment_id: int, submission_id: int):
     methods=["POST"],
 )
 @protected_route(roles=[AccountType.Lecturer, AccountType.Admin])
+@unit_of_work
 def grade_assignment(assignment_id: int, submission_id: int):
     body = GradeAssignmentSchema().load(request.get_json(force=True))
     db_cursor = db.cursor(dictionary=True)
 
-    # Check if the assignment exists.
-    db_cursor.execute(
-        "SELECT * FROM Assignment WHERE assignment_id = %s", (assignment_id,)
+    # Check if the assignment and submission exist and if a lecturer teaches the
+    # course associated with the assignment in one query.
+    access = fetch_with_access(
+        fetch_session(),
+        """
+        SELECT {access} AS has_access, s.*
+        FROM Assignment a
+        LEFT JOIN AssignmentSubmission s
+            ON s.assignment_id = a.assignment_id AND s.submission_id = %s
+        WHERE a.assignment_id = %s
+        """,
+        (submission_id, assignment_id),
+        course_code_column="a.course_code",
+        payload_key="submission_id",
+        roles=(AccountType.Lecturer,),
     )
-    assignment = db_cursor.fetchone()
-    if not assignment:
+    if not access.found:
         return (
             jsonify({"message": "There is no assignment with that ID!"}),
             404,
         )
 
-    # Check if the submission exists.
-    db_cursor.execute(
-        "SELECT * FROM AssignmentSubmission WHERE submission_id = %s AND assignment_id = %s",
-        (submission_id, assignment_id),
-    )
-    submission = db_cursor.fetchone()
-    if not submission:
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only grade submissions for your courses!"}),
+            403,
+        )
+
+    if not access.rows:
         return (
             jsonify(
                 {"message": "There is no submission with that ID for this assignment!"}
@@ -626,39 +730,14 @@ def grade_assignment(assignment_id: int, submission_id: int):
             404,
         )
 
-    # Check if the user is a lecturer and if they teach the course associated with the assignment.
-    session = fetch_session()
-    if session["account_type"] == AccountType.Lecturer.name:
-        # Fetch lecturer details
-        lecturer_details = _fetch_lecturer_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Course WHERE course_code = %s AND lecturer_id = %s",
-            (assignment["course_code"], lecturer_details["lecturer_id"]),
-        )
-
-        if not db_cursor.fetchone():
-            return (
-                jsonify(
-                    {"message": "You can only grade submissions for your courses!"}
-                ),
-                403,
-            )
+    submission = access.rows[0]
 
     # Grade the assignment.
     db_cursor.execute(
         "UPDATE AssignmentSubmission SET grade = %s WHERE submission_id = %s",
         (body["grade"], submission_id),
     )
-
-    db.commit()
-
-    # Fetch updated submission
-    db_cursor.execute(
-        "SELECT * FROM AssignmentSubmission WHERE submission_id = %s AND assignment_id = %s",
-        (submission_id, assignment_id),
-    )
-    submission = db_cursor.fetchone()
+    publish("submission.graded", assignment_id=assignment_id, submission_id=submission_id)
 
     return jsonify({**submission, "grade": body["grade"]}), 200
 
@@ -673,20 +752,12 @@ def handle_course_sections(course_code: str):
 
 
 def get_course_sections(course_code: str):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
-        return (
-            jsonify({"message": "There is no course with that course code!"}),
-            404,
-        )
-
-    # If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    # Check if the course exists. If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    session = fetch_session()
+    # Memoized, so the check below doesn't run the query again.
+    visibility = resolve_course_visibility(session, course_code)
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "student_err": "You can only view sections for your courses!",
@@ -694,9 +765,16 @@ def get_course_sections(course_code: str):
         },
     )
 
+    if not visibility.course_exists:
+        return (
+            jsonify({"message": "There is no course with that course code!"}),
+            404,
+        )
+
     if visibility_res:
         return visibility_res
 
+    db_cursor = db.cursor(dictionary=True)
     db_cursor.execute("SELECT * FROM Sections WHERE course_code = %s", (course_code,))
     sections = db_cursor.fetchall()
 
@@ -705,38 +783,38 @@ def get_course_sections(course_code: str):
     return jsonify(sections), 200
 
 
+@unit_of_work
 def create_course_section(course_code: str):
     body = CreateCourseSectionSchema().load(request.get_json(force=True))
-    db_cursor = db.cursor(dictionary=True)
 
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
+    # Check if the course exists and, for a lecturer, that they teach it.
+    session = fetch_session()
+    visibility = resolve_course_visibility(session, course_code)
+    visibility_res = _check_course_visibility(
+        session,
+        course_code,
+        err_msgs={
+            "lecturer_err": "You can only create sections for your courses!",
+        },
+    )
+
+    if not visibility.course_exists:
         return (
             jsonify({"message": "There is no course with that course code!"}),
             404,
         )
 
-    session = fetch_session()
     if session["account_type"] == AccountType.Student.name:
         return (
             jsonify({"message": "You can't create sections for courses!"}),
             403,
         )
 
-    # Check if the user is a lecturer and if they teach the course
-    if session["account_type"] == AccountType.Lecturer.name:
-        # Fetch lecturer details
-        lecturer_details = _fetch_lecturer_details_from_session(session)
-
-        if course["lecturer_id"] != lecturer_details["lecturer_id"]:
-            return (
-                jsonify({"message": "You can only create sections for your courses!"}),
-                403,
-            )
+    if visibility_res:
+        return visibility_res
 
     # Create the course section.
+    db_cursor = db.cursor(dictionary=True)
     db_cursor.execute(
         "INSERT INTO Sections (course_code, section_name) VALUES (%s, %s)",
         (
@@ -745,7 +823,6 @@ def create_course_section(course_code: str):
         ),
     )
 
-    db.commit()
     section_id = db_cursor.lastrowid
     return jsonify({"section_id": section_id}), 201
 
@@ -762,20 +839,12 @@ def handle_course_section(course_code: str, section_id: int):
 
 
 def get_course_section(course_code: str, section_id: int):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
-        return (
-            jsonify({"message": "There is no course with that course code!"}),
-            404,
-        )
-
-    # If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    # Check if the course exists. If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    session = fetch_session()
+    # Memoized, so the check below doesn't run the query again.
+    visibility = resolve_course_visibility(session, course_code)
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "student_err": "You can only view sections for your courses!",
@@ -783,9 +852,17 @@ def get_course_section(course_code: str, section_id: int):
         },
     )
 
+    if not visibility.course_exists:
+        return (
+            jsonify({"message": "There is no course with that course code!"}),
+            404,
+        )
+
     if visibility_res:
         return visibility_res
 
+    db_cursor = db.cursor(dictionary=True)
+
     # Check if the section exists
     db_cursor.execute(
         "SELECT * FROM Sections WHERE course_code = %s AND section_id = %s",
@@ -807,6 +884,7 @@ def get_course_section(course_code: str, section_id: int):
     return jsonify({**section, "items": section_items}), 200
 
 
+@unit_of_work
 def create_course_section_item(course_code: str, section_id: int):
     # Make sure the user isn't a student
     session = fetch_session()
@@ -817,19 +895,16 @@ def create_course_section_item(course_code: str, section_id: int):
         )
 
     # If they are a lecturer, check if they teach the course
-    db_cursor = db.cursor(dictionary=True)
-    lecturer_details = _fetch_lecturer_details_from_session(session)
-
-    db_cursor.execute(
-        "SELECT * FROM Course WHERE course_code = %s AND lecturer_id = %s",
-        (course_code, lecturer_details["lecturer_id"]),
+    visibility_res = _check_course_visibility(
+        session,
+        course_code,
+        err_msgs={
+            "lecturer_err": "You can only create section items for your courses!",
+        },
     )
 
-    if not db_cursor.fetchone():
-        return (
-            jsonify({"message": "You can only create section items for your courses!"}),
-            403,
-        )
+    if visibility_res:
+        return visibility_res
 
     # Init form data
     form_data = request.form.to_dict()
@@ -879,7 +954,6 @@ def create_course_section_item(course_code: str, section_id: int):
         ),
     )
 
-    db.commit()
     section_item_id = db_cursor.lastrowid
 
     # Fetch created sectiom item
@@ -899,20 +973,12 @@ def create_course_section_item(course_code: str, section_id: int):
 def download_course_section_item_file(
     course_code: str, section_id: int, section_item_id: int
 ):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
-        return (
-            jsonify({"message": "There is no course with that course code!"}),
-            404,
-        )
-
-    # If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    # Check if the course exists. If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    session = fetch_session()
+    # Memoized, so the check below doesn't run the query again.
+    visibility = resolve_course_visibility(session, course_code)
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "student_err": "You can only view sections for your courses!",
@@ -920,9 +986,17 @@ def download_course_section_item_file(
         },
     )
 
+    if not visibility.course_exists:
+        return (
+            jsonify({"message": "There is no course with that course code!"}),
+            404,
+        )
+
     if visibility_res:
         return visibility_res
 
+    db_cursor = db.cursor(dictionary=True)
+
     # Check if the section actually exists for the course
     db_cursor.execute(
         "SELECT * FROM Sections WHERE course_code = %s AND section_id = %s",
@@ -965,20 +1039,12 @@ def download_course_section_item_file(
 def download_course_section_item_details(
     course_code: str, section_id: int, section_item_id: int
 ):
-    db_cursor = db.cursor(dictionary=True)
-
-    # Check if the course exists.
-    db_cursor.execute("SELECT * FROM Course WHERE course_code = %s", (course_code,))
-    course = db_cursor.fetchone()
-    if not course:
-        return (
-            jsonify({"message": "There is no course with that course code!"}),
-            404,
-        )
-
-    # If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    # Check if the course exists. If the user is a student, check if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
+    session = fetch_session()
+    # Memoized, so the check below doesn't run the query again.
+    visibility = resolve_course_visibility(session, course_code)
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "student_err": "You can only view sections for your courses!",
@@ -986,9 +1052,17 @@ def download_course_section_item_details(
         },
     )
 
+    if not visibility.course_exists:
+        return (
+            jsonify({"message": "There is no course with that course code!"}),
+            404,
+        )
+
     if visibility_res:
         return visibility_res
 
+    db_cursor = db.cursor(dictionary=True)
+
     # Check if the section actually exists for the course
     db_cursor.execute(
         "SELECT * FROM Sections WHERE course_code = %s AND section_id = %s",
@@ -1038,11 +1112,7 @@ def _fetch_student_details_from_session(session: JWTPayload):
     if session["account_type"] != AccountType.Student.name:
         return None
 
-    db_cursor = db.cursor(dictionary=True)
-    db_cursor.execute(
-        "SELECT * FROM StudentDetails WHERE account_id = %s", (session["sub"],)
-    )
-    return db_cursor.fetchone()
+    return resolve_principal_details(session)
 
 
 def _fetch_lecturer_details(account_id: str, account_type: str | None = None):
@@ -1065,54 +1135,23 @@ def _fetch_lecturer_details(account_id: str, account_type: str | None = None):
     return db_cursor.fetchone()
 
 
-def _fetch_lecturer_details_from_session(session):
-    if session["account_type"] != AccountType.Lecturer.name:
+def _check_course_visibility(session, course_code, err_msgs={}):
+    """
+    Check whether the session's principal may see a course, and return a 403
+    response when it can't. Handlers that need whether the course exists or the
+    principal's student/lecturer ID call `resolve_course_visibility` first; the
+    answer is memoized, so this doesn't query again.
+    """
+    session = session or fetch_session()
+    if resolve_course_visibility(session, course_code).visible:
         return None
 
-    db_cursor = db.cursor(dictionary=True)
-    db_cursor.execute(
-        "SELECT * FROM LecturerDetails WHERE account_id = %s", (session["sub"],)
-    )
-    return db_cursor.fetchone()
-
-
-def _check_course_visibility(session, course_code, err_msgs={}):
-    # Check if the user is a student and if they are enrolled in the course. If the user is a lecturer, check if they teach the course.
-    session = fetch_session()
     if session["account_type"] == AccountType.Student.name:
-        db_cursor = db.cursor(dictionary=True)
-        student_details = _fetch_student_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Enrollment WHERE student_id = %s AND course_code = %s",
-            (student_details["student_id"], course_code),
-        )
-        if not db_cursor.fetchone():
-            return (
-                jsonify(
-                    {
-                        "message": err_msgs.get("student_err")
-                        or "You can only view your courses!"
-                    }
-                ),
-                403,
-            )
-    elif session["account_type"] == AccountType.Lecturer.name:
-        db_cursor = db.cursor(dictionary=True)
-        lecturer_details = _fetch_lecturer_details_from_session(session)
-
-        db_cursor.execute(
-            "SELECT * FROM Course WHERE course_code = %s AND lecturer_id = %s",
-            (course_code, lecturer_details["lecturer_id"]),
-        )
+        message = err_msgs.get("student_err")
+    else:
+        message = err_msgs.get("lecturer_err")
 
-        if not db_cursor.fetchone():
-            return (
-                jsonify(
-                    {
-                        "message": err_msgs.get("lecturer_err")
-                        or "You can only view your courses!"
-                    }
-                ),
-                403,
-            )
+    return (
+        jsonify({"message": message or "You can only view your courses!"}),
+        403,
+    )
@@ -0,0 +1,32 @@
+from modules.utils.counters import register_counter
+from modules.utils.db import db
+
+
+def record_enrollment(student_id: int, course_code: str, delta: int):
+    """
+    Move the course's enrollment_count and the student's course_count by `delta`.
+    Call it in the same transaction as the Enrollment insert or delete.
+    """
+    db_cursor = db.cursor()
+    db_cursor.execute(
+        "UPDATE Course SET enrollment_count = enrollment_count + %s WHERE course_code = %s",
+        (delta, course_code),
+    )
+    db_cursor.execute(
+        "UPDATE StudentDetails SET course_count = course_count + %s WHERE student_id = %s",
+        (delta, student_id),
+    )
+
+
+register_counter(
+    "Course.enrollment_count",
+    "Course c",
+    "c.enrollment_count",
+    "SELECT COUNT(*) FROM Enrollment e WHERE e.course_code = c.course_code",
+)
+register_counter(
+    "StudentDetails.course_count",
+    "StudentDetails s",
+    "s.course_count",
+    "SELECT COUNT(*) FROM Enrollment e WHERE e.student_id = s.student_id",
+)
@@ -7,12 +7,141 @@ from modules.routes.courses.courses_route import (
 from modules.routes.forums.forum_schema import (
     ForumSchema,
     NewDiscussionReplySchema,
+    ThreadListQuerySchema,
 )
-from modules.utils.db import db
+from modules.routes.forums.forum_stream import start_reply_bridge
+from modules.routes.forums.reply_buffer import (
+    REPLY_BUFFER_ENABLED,
+    buffer_reply,
+    pending_reply,
+    reply_buffer,
+)
+from modules.utils.counters import register_counter
+from modules.utils.db import db, unit_of_work
+from modules.utils.events import publish
+from modules.utils.pagination import Page
+from modules.utils.query_plans import register_query
 from modules.utils.route_utils import authenticate, fetch_session, protected_route
 from datetime import date, datetime
 import traceback
 
+THREAD_FIELDS = ["thread_id", "replies", "timeStamp", "forum_id"]
+# client_id is added by migration 006, which only buffered replies rely on.
+REPLY_FIELDS = ["reply_id", "thread_id", "user_id", "reply_text", "reply_time"]
+if REPLY_BUFFER_ENABLED:
+    REPLY_FIELDS.insert(1, "client_id")
+
+# Columns only available in the thread summary, and how they are computed.
+THREAD_SUMMARY_FIELDS = {
+    "reply_count": "t.replies",
+    "last_reply_time": "(SELECT MAX(r.reply_time) FROM DiscussionReply r WHERE r.thread_id = t.thread_id)",
+}
+
+COURSE_FORUMS_QUERY = "SELECT * FROM DiscussionForum WHERE course_code = %s"
+
+THREAD_IN_FORUM_QUERY = """
+    SELECT t.forum_id FROM DiscussionThread t
+    JOIN DiscussionForum f ON f.forum_id = t.forum_id
+    WHERE t.thread_id = %s AND t.forum_id = %s AND f.course_code = %s
+"""
+
+
+def _thread_page() -> Page:
+    # Threads were listed in full before they were paginated.
+    return Page(
+        THREAD_FIELDS, key_columns=["timeStamp", "thread_id"], paged_by_default=False
+    )
+
+
+def _threads_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause()
+    return f"SELECT {page.select_list()} FROM DiscussionThread WHERE forum_id = %s AND {keyset} ORDER BY {page.order_by()} LIMIT %s"
+
+
+def _thread_summary_page() -> Page:
+    return Page(
+        THREAD_FIELDS + list(THREAD_SUMMARY_FIELDS),
+        key_columns=["timeStamp", "thread_id"],
+        paged_by_default=False,
+    )
+
+
+def _thread_summaries_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause("t")
+    columns = page.columns + [c for c in page.key_columns if c not in page.columns]
+    select_list = ", ".join(
+        f"{THREAD_SUMMARY_FIELDS[c]} AS {c}" if c in THREAD_SUMMARY_FIELDS else f"t.{c}"
+        for c in columns
+    )
+    return f"""
+        SELECT {select_list} FROM DiscussionThread t
+        WHERE t.forum_id = %s AND {keyset} ORDER BY {page.order_by("t")} LIMIT %s
+    """
+
+
+def _reply_page() -> Page:
+    return Page(
+        REPLY_FIELDS, key_columns=["reply_time", "reply_id"], paged_by_default=False
+    )
+
+
+def _replies_query(page: Page) -> str:
+    keyset, _ = page.keyset_clause()
+    return f"SELECT {page.select_list()} FROM DiscussionReply WHERE thread_id = %s AND {keyset} ORDER BY {page.order_by()} LIMIT %s"
+
+
+register_query(
+    "forums.get_course_forums",
+    COURSE_FORUMS_QUERY,
+    "SELECT course_code FROM Course LIMIT 1",
+)
+register_query(
+    "forums.thread_in_forum",
+    THREAD_IN_FORUM_QUERY,
+    """
+    SELECT t.thread_id, t.forum_id, f.course_code FROM DiscussionThread t
+    JOIN DiscussionForum f ON f.forum_id = t.forum_id LIMIT 1
+    """,
+)
+register_query(
+    "forums.get_forum_threads",
+    _threads_query,
+    "SELECT forum_id, timeStamp, thread_id, 101 AS row_limit FROM DiscussionThread LIMIT 1",
+    page=_thread_page,
+)
+register_query(
+    "forums.get_forum_thread_summaries",
+    _thread_summaries_query,
+    "SELECT forum_id, timeStamp, thread_id, 101 AS row_limit FROM DiscussionThread LIMIT 1",
+    page=_thread_summary_page,
+)
+register_query(
+    "forums.get_replies",
+    _replies_query,
+    "SELECT thread_id, reply_time, reply_id, 101 AS row_limit FROM DiscussionReply LIMIT 1",
+    page=_reply_page,
+)
+
+
+def _flushed_replies_query(count: int) -> str:
+    return f"SELECT client_id FROM DiscussionReply WHERE client_id IN ({', '.join(['%s'] * count)})"
+
+
+if REPLY_BUFFER_ENABLED:
+    register_query(
+        "forums.flushed_replies",
+        _flushed_replies_query(1),
+        "SELECT client_id FROM DiscussionReply WHERE client_id IS NOT NULL LIMIT 1",
+    )
+
+# Replies bump their thread's counter in the same transaction as the insert.
+register_counter(
+    "DiscussionThread.replies",
+    "DiscussionThread t",
+    "t.replies",
+    "SELECT COUNT(*) FROM DiscussionReply r WHERE r.thread_id = t.thread_id",
+)
+
 
 @app.route("/course/<string:course_code>/forums", methods=["GET", "POST"])
 @protected_route()
@@ -23,9 +152,9 @@ def handle_course_forums(course_code):
         return create_course_forum(course_code)
 
 
-def get_course_forums(
-    course_code, session=fetch_session(), db_cursor=db.cursor(dictionary=True)
-):
+def get_course_forums(course_code):
+    session = fetch_session()
+    db_cursor = db.cursor(dictionary=True)
     visibility_res = _check_course_visibility(
         session,
         course_code,
@@ -39,9 +168,7 @@ def get_course_forums(
         return visibility_res
 
     # Original logic to retrieve forums for the course
-    db_cursor.execute(
-        "SELECT * FROM DiscussionForum WHERE course_code = %s", (course_code,)
-    )
+    db_cursor.execute(COURSE_FORUMS_QUERY, (course_code,))
     forums = db_cursor.fetchall()
     if not forums:
         return jsonify({"message": "No forums found for this course"}), 404
@@ -49,6 +176,7 @@ def get_course_forums(
     return jsonify(forums), 200
 
 
+@unit_of_work
 def create_course_forum(course_code):
     auth_res = authenticate([AccountType.Lecturer, AccountType.Admin])
     if auth_res:
@@ -62,7 +190,7 @@ def create_course_forum(course_code):
 
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only create forums for your own courses!",
@@ -79,9 +207,8 @@ def create_course_forum(course_code):
     try:
         db_cursor.execute(
             "INSERT INTO DiscussionForum (topic, post_time, creator, course_code) VALUES (%s, %s, %s, %s)",
-            (body["topic"], date.today(), fetch_session()["sub"], course_code),
+            (body["topic"], date.today(), session["sub"], course_code),
         )
-        db.commit()
 
         created_forum_id = db_cursor.lastrowid
         db_cursor.execute(
@@ -92,7 +219,6 @@ def create_course_forum(course_code):
         return jsonify(created_forum), 201
     except Exception as e:
         traceback.print_exc()
-        db.rollback()
         return jsonify({"message": f"Failed to create forum: {str(e)}"}), 500
 
 
@@ -117,7 +243,7 @@ def get_forum_threads(forum_id: int, course_code: str):
 
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only view your own courses!",
@@ -127,15 +253,42 @@ def get_forum_threads(forum_id: int, course_code: str):
     if visibility_res:
         return visibility_res
 
-    # Proceed with retrieving discussion threads for the forum
-    db_cursor.execute("SELECT * FROM DiscussionThread WHERE forum_id = %s", (forum_id,))
-    threads = db_cursor.fetchall()
-    if not threads:
+    # Proceed with retrieving a page of discussion threads for the forum
+    args = ThreadListQuerySchema().load(request.args)
+    if args["summary"]:
+        threads, page = _fetch_thread_summaries(forum_id)
+    else:
+        page = _thread_page()
+        _, keyset_params = page.keyset_clause()
+        db_cursor.execute(
+            _threads_query(page),
+            (forum_id,) + keyset_params + (page.fetch_limit(),),
+        )
+        threads = db_cursor.fetchall()
+
+    if not threads and page.after is None:
         return jsonify({"message": "No discussion threads found for this forum"}), 404
-    # Convert the threads data into JSON format and return
-    return jsonify(threads), 200
+    return page.response(threads), 200
+
+
+def _fetch_thread_summaries(forum_id: int) -> tuple[list[dict], Page]:
+    """
+    Fetch a page of threads with their reply count and last reply time. The count
+    is the thread's replies counter, and the last reply time is a single lookup
+    on the (thread_id, reply_time) index per thread.
+    """
+    page = _thread_summary_page()
+    _, keyset_params = page.keyset_clause("t")
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(
+        _thread_summaries_query(page),
+        (forum_id,) + keyset_params + (page.fetch_limit(),),
+    )
+    return db_cursor.fetchall(), page
 
 
+@unit_of_work
 def add_thread_to_forum(forum_id: int, course_code: str):
     # Check if the user is a student
     session = fetch_session()
@@ -145,7 +298,7 @@ def add_thread_to_forum(forum_id: int, course_code: str):
 
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only view your own courses!",
@@ -160,7 +313,6 @@ def add_thread_to_forum(forum_id: int, course_code: str):
             "INSERT INTO DiscussionThread (replies, timeStamp, forum_id) VALUES (%s, %s, %s)",
             (0, datetime.now(), forum_id),
         )
-        db.commit()
 
         thread_id = db_cursor.lastrowid
         db_cursor.execute(
@@ -171,7 +323,6 @@ def add_thread_to_forum(forum_id: int, course_code: str):
         return jsonify(thread), 201
     except Exception as e:
         traceback.print_exc()
-        db.rollback()
         return jsonify({"message": f"Failed to add discussion thread: {str(e)}"}), 500
 
 
@@ -180,14 +331,16 @@ def add_thread_to_forum(forum_id: int, course_code: str):
     methods=["POST"],
 )
 @protected_route()
+@unit_of_work
 def add_reply_to_thread(course_code: str, forum_id: int, thread_id: int):
     db_cursor = db.cursor(dictionary=True)
     body = NewDiscussionReplySchema().load(request.get_json(force=True))
-    user_id = fetch_session()["sub"]
+    session = fetch_session()
+    user_id = session["sub"]
 
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only make replies to threads in courses that you lecture!",
@@ -198,37 +351,70 @@ def add_reply_to_thread(course_code: str, forum_id: int, thread_id: int):
     if visibility_res:
         return visibility_res
 
+    # The thread has to belong to the forum and course in the URL, so the reply
+    # can't end up in (and be streamed to) another course's forum.
+    db_cursor.execute(THREAD_IN_FORUM_QUERY, (thread_id, forum_id, course_code))
+    thread = db_cursor.fetchone()
+    if not thread:
+        return jsonify({"message": "There is no such thread in this forum!"}), 404
+
+    # Forked workers start their own bridge with their first stream or reply.
+    start_reply_bridge()
+
+    if REPLY_BUFFER_ENABLED:
+        return _buffer_reply(thread["forum_id"], thread_id, user_id, body["reply_text"])
+
     try:
         db_cursor.execute(
             "INSERT INTO DiscussionReply (thread_id, user_id, reply_text, reply_time) VALUES (%s, %s, %s, %s)",
             (thread_id, user_id, body["reply_text"], date.today()),
         )
-        db.commit()
 
         reply_id = db_cursor.lastrowid
+        # Keep the thread's reply counter in step, in the same transaction.
+        db_cursor.execute(
+            "UPDATE DiscussionThread SET replies = replies + 1 WHERE thread_id = %s",
+            (thread_id,),
+        )
         db_cursor.execute(
             "SELECT * FROM DiscussionReply WHERE reply_id = %s", (reply_id,)
         )
 
         reply = db_cursor.fetchone()
+        # Pushed to the thread's and forum's open streams once the reply commits.
+        publish("forum.reply_added", forum_id=thread["forum_id"], reply=reply)
         return jsonify(reply), 201
     except Exception as e:
         traceback.print_exc()
-        db.rollback()
         return jsonify({"message": f"Failed to add reply: {str(e)}"}), 500
 
 
+def _buffer_reply(forum_id: int, thread_id: int, user_id: int, reply_text: str):
+    """
+    Journal the reply for the next batched insert and acknowledge it with 202. The
+    reply gets its ID once it is flushed, the client ID ties the two together.
+    """
+    entry = buffer_reply(forum_id, thread_id, user_id, reply_text)
+    return jsonify(pending_reply(entry)), 202
+
+
 @app.route(
     "/course/<string:course_code>/forums/<int:forum_id>/threads/<int:thread_id>/replies",
     methods=["GET"],
 )
 @protected_route()
 def get_replies(course_code: str, forum_id: int, thread_id: int):
+    session = fetch_session()
+    # The user's own replies that aren't flushed yet. Taken before the first query,
+    # so a reply that is flushed in between is in the snapshot the query reads.
+    pending = (
+        reply_buffer.pending_for(thread_id, session["sub"]) if REPLY_BUFFER_ENABLED else []
+    )
     db_cursor = db.cursor(dictionary=True)
 
     # Check if the user is a lecturer who teaches this course
     visibility_res = _check_course_visibility(
-        fetch_session(),
+        session,
         course_code,
         err_msgs={
             "lecturer_err": "You can only view your own courses!",
@@ -239,12 +425,24 @@ def get_replies(course_code: str, forum_id: int, thread_id: int):
     if visibility_res:
         return visibility_res
 
-    # Proceed with retrieving discussion replies for the thread
+    # Proceed with retrieving a page of discussion replies for the thread
+    page = _reply_page()
+    _, keyset_params = page.keyset_clause()
     db_cursor.execute(
-        "SELECT * FROM DiscussionReply WHERE thread_id = %s", (thread_id,)
+        _replies_query(page),
+        (thread_id,) + keyset_params + (page.fetch_limit(),),
     )
     replies = db_cursor.fetchall()
-    if not replies:
+
+    # Replies flushed since the pending ones were taken are already in the table,
+    # on this page or another one. Their client IDs are looked up in the same
+    # snapshot, since `fields` may leave client_id out of the page.
+    if pending:
+        db_cursor.execute(
+            _flushed_replies_query(len(pending)), [e["client_id"] for e in pending]
+        )
+        flushed = {row["client_id"] for row in db_cursor.fetchall()}
+        pending = [pending_reply(e) for e in pending if e["client_id"] not in flushed]
+    if not replies and not pending and page.after is None:
         return jsonify({"message": "No discussion replies found for this thread"}), 404
-    # Convert the replies data into JSON format and return
-    return jsonify(replies), 200
+    return page.response(replies, trailing=pending), 200
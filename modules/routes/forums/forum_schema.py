@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import EXCLUDE, Schema, fields, validate
 
 class ForumSchema(Schema):
     topic = fields.Str(required=True)
@@ -14,3 +14,13 @@ class DiscussionReplySchema(Schema):
 
 class NewDiscussionReplySchema(Schema):
     reply_text = fields.Str(required=True)
+
+class ThreadListQuerySchema(Schema):
+    class Meta:
+        # The pagination parameters are parsed by Page.
+        unknown = EXCLUDE
+
+    summary = fields.Bool(load_default=False)
+
+class ReplyStreamQuerySchema(Schema):
+    last_event_id = fields.Int(load_default=None, validate=validate.Range(min=0))
@@ -0,0 +1,175 @@
+from collections import defaultdict, deque
+import os
+import queue
+import threading
+import time
+from app import app
+from modules.utils.db import pooled_connection
+from modules.utils.events import subscribe
+
+# Replies a stream may fall behind by before it is closed. The client reconnects
+# and catches up from the database with Last-Event-ID.
+STREAM_QUEUE_SIZE = 100
+
+# How far behind the highest reply ID seen the bridge re-reads. IDs are allocated
+# on insert, so a lower ID can still be committed after a higher one was read.
+BRIDGE_LOOKBACK = 100
+
+# Seconds between the bridge's polls for replies posted through other processes,
+# 0 disables it.
+FORUM_STREAM_POLL_INTERVAL = float(os.getenv("FORUM_STREAM_POLL_INTERVAL") or 0)
+
+# Marks a subscription whose client fell behind.
+OVERFLOW = object()
+
+
+class Subscription:
+    """The queue of replies for one open stream."""
+
+    def __init__(self, broker: "ReplyBroker", keys: tuple):
+        self.broker = broker
+        self.keys = keys
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    def offer(self, reply: dict):
+        try:
+            self._queue.put_nowait(reply)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout: float):
+        """The next reply, None after `timeout` seconds without one, or OVERFLOW."""
+        if self.overflowed:
+            return OVERFLOW
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class ReplyBroker:
+    """
+    Fans new replies out to the streams of this process that are subscribed to
+    their thread or forum. A reply is delivered at most once, whether it comes
+    from this process' reply route or from the database bridge.
+    """
+
+    def __init__(self, remembered: int = 10000):
+        self._subscriptions: dict[tuple, set[Subscription]] = defaultdict(set)
+        self._delivered = deque(maxlen=remembered)
+        self._delivered_ids = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, *keys: tuple) -> Subscription:
+        subscription = Subscription(self, keys)
+        with self._lock:
+            for key in keys:
+                self._subscriptions[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscriptions.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[key]
+
+    def publish(self, forum_id: int, reply: dict) -> bool:
+        """Deliver a reply, returns False when it was already delivered."""
+        with self._lock:
+            if reply["reply_id"] in self._delivered_ids:
+                return False
+            if len(self._delivered) == self._delivered.maxlen:
+                self._delivered_ids.discard(self._delivered[0])
+            self._delivered.append(reply["reply_id"])
+            self._delivered_ids.add(reply["reply_id"])
+
+            targets = self._subscriptions.get(("thread", reply["thread_id"]), set()) | (
+                self._subscriptions.get(("forum", forum_id), set())
+            )
+
+        for subscription in targets:
+            subscription.offer(reply)
+        return True
+
+
+reply_broker = ReplyBroker()
+
+
+@subscribe("forum.reply_added")
+def _fan_out_reply(forum_id: int, reply: dict):
+    reply_broker.publish(forum_id, reply)
+
+
+def poll_new_replies(conn, after_id: int | None, broker: ReplyBroker = reply_broker) -> int:
+    """
+    Deliver the replies committed since the last poll to `broker`, including the
+    ones other processes added, and return the new high water mark. The first
+    poll only reads the current highest reply ID.
+    """
+    db_cursor = conn.cursor(dictionary=True)
+    if after_id is None:
+        db_cursor.execute("SELECT COALESCE(MAX(reply_id), 0) AS max_id FROM DiscussionReply")
+        return db_cursor.fetchone()["max_id"]
+
+    db_cursor.execute(
+        """
+        SELECT r.*, t.forum_id FROM DiscussionReply r
+        JOIN DiscussionThread t ON t.thread_id = r.thread_id
+        WHERE r.reply_id > %s ORDER BY r.reply_id
+        """,
+        (max(0, after_id - BRIDGE_LOOKBACK),),
+    )
+    rows = db_cursor.fetchall()
+    for row in rows:
+        forum_id = row.pop("forum_id")
+        broker.publish(forum_id, row)
+    return max([after_id] + [row["reply_id"] for row in rows])
+
+
+_bridge_pid = None
+_bridge_lock = threading.Lock()
+
+
+def _poll_periodically(interval: float):
+    high_water = None
+    while True:
+        time.sleep(interval)
+        try:
+            # Each poll runs on a fresh transaction, so it sees every commit since the last one.
+            with pooled_connection() as conn:
+                high_water = poll_new_replies(conn, high_water)
+        except Exception:
+            app.logger.exception("Polling for new forum replies failed")
+
+
+def start_reply_bridge() -> bool:
+    """
+    Poll the database for new replies every FORUM_STREAM_POLL_INTERVAL seconds
+    on a background thread, once per process, so streams also receive the
+    replies posted through other worker processes. One query per process feeds
+    every open stream. Does nothing unless FORUM_STREAM_POLL_INTERVAL is set.
+    """
+    global _bridge_pid
+
+    if FORUM_STREAM_POLL_INTERVAL <= 0:
+        return False
+
+    pid = os.getpid()
+    with _bridge_lock:
+        if _bridge_pid != pid:
+            threading.Thread(
+                target=_poll_periodically,
+                args=(FORUM_STREAM_POLL_INTERVAL,),
+                name="forum-reply-bridge",
+                daemon=True,
+            ).start()
+            _bridge_pid = pid
+    return True
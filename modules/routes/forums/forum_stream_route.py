@@ -0,0 +1,167 @@
+import os
+from flask import Response, jsonify, request
+from app import app
+from modules.routes.courses.courses_route import _check_course_visibility
+from modules.routes.forums.forum_schema import ReplyStreamQuerySchema
+from modules.routes.forums.forum_stream import (
+    OVERFLOW,
+    Subscription,
+    reply_broker,
+    start_reply_bridge,
+)
+from modules.utils.db import db, release_db
+from modules.utils.route_utils import fetch_session, protected_route
+
+# Seconds between keep-alive comments on an idle stream, which is also how long
+# a closed stream can take to be noticed.
+STREAM_HEARTBEAT = float(os.getenv("FORUM_STREAM_HEARTBEAT") or 15)
+
+# Most missed replies sent to a resuming client, past that it is told to refetch.
+STREAM_RESUME_LIMIT = int(os.getenv("FORUM_STREAM_RESUME_LIMIT") or 500)
+
+# Milliseconds the browser waits before reconnecting a dropped stream.
+STREAM_RETRY = 3000
+
+
+@app.route(
+    "/course/<string:course_code>/forums/<int:forum_id>/threads/<int:thread_id>/stream",
+    methods=["GET"],
+)
+@protected_route()
+def stream_thread_replies(course_code: str, forum_id: int, thread_id: int):
+    return _stream_replies(
+        course_code,
+        key=("thread", thread_id),
+        exists_query=(
+            """
+            SELECT 1 FROM DiscussionThread t
+            JOIN DiscussionForum f ON f.forum_id = t.forum_id
+            WHERE t.thread_id = %s AND t.forum_id = %s AND f.course_code = %s
+            """,
+            (thread_id, forum_id, course_code),
+        ),
+        resume_query=(
+            """
+            SELECT * FROM DiscussionReply
+            WHERE thread_id = %s AND reply_id > %s ORDER BY reply_id LIMIT %s
+            """,
+            (thread_id,),
+        ),
+    )
+
+
+@app.route(
+    "/course/<string:course_code>/forums/<int:forum_id>/stream", methods=["GET"]
+)
+@protected_route()
+def stream_forum_replies(course_code: str, forum_id: int):
+    return _stream_replies(
+        course_code,
+        key=("forum", forum_id),
+        exists_query=(
+            "SELECT 1 FROM DiscussionForum WHERE forum_id = %s AND course_code = %s",
+            (forum_id, course_code),
+        ),
+        resume_query=(
+            """
+            SELECT r.* FROM DiscussionReply r
+            JOIN DiscussionThread t ON t.thread_id = r.thread_id
+            WHERE t.forum_id = %s AND r.reply_id > %s ORDER BY r.reply_id LIMIT %s
+            """,
+            (forum_id,),
+        ),
+    )
+
+
+def _stream_replies(course_code: str, key: tuple, exists_query: tuple, resume_query: tuple):
+    """
+    Open a Server-Sent Events stream of the replies posted to a thread or forum.
+    Each event's ID is the reply ID, so a reconnecting client (or one passing
+    `last_event_id`) first gets the replies it missed from the database.
+    """
+    session = fetch_session()
+    visibility_res = _check_course_visibility(
+        session,
+        course_code,
+        err_msgs={
+            "lecturer_err": "You can only view your own courses!",
+            "student_err": "You are not enrolled in this course!",
+        },
+    )
+    if visibility_res:
+        return visibility_res
+
+    args = ReplyStreamQuerySchema().load(_stream_args())
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(*exists_query)
+    if not db_cursor.fetchone():
+        return jsonify({"message": "There is no such forum or thread in this course!"}), 404
+
+    # Subscribe before reading the missed replies on a fresh snapshot, so a reply
+    # committed in between is in one or the other.
+    db.rollback()
+    # Forked workers start their own bridge with their first stream.
+    start_reply_bridge()
+    subscription = reply_broker.subscribe(key)
+    try:
+        backlog = []
+        if args["last_event_id"] is not None:
+            sql, params = resume_query
+            db_cursor.execute(
+                sql, params + (args["last_event_id"], STREAM_RESUME_LIMIT + 1)
+            )
+            backlog = db_cursor.fetchall()
+    except Exception:
+        subscription.close()
+        raise
+
+    # The stream can stay open for hours, it must not hold a pooled connection.
+    release_db()
+
+    return Response(
+        reply_events(subscription, backlog),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_args() -> dict:
+    # Browsers resend the last event's ID in a header when they reconnect.
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id"
+    )
+    return {"last_event_id": last_event_id} if last_event_id else {}
+
+
+def sse_event(event: str, data: dict, event_id=None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {app.json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def reply_events(subscription: Subscription, backlog: list[dict]):
+    """Encode the missed replies, then every new one, as `reply` events."""
+    try:
+        yield f"retry: {STREAM_RETRY}\n\n"
+
+        if len(backlog) > STREAM_RESUME_LIMIT:
+            # Too far behind to replay, the client should refetch the replies page.
+            yield sse_event("reset", {"message": "Too many missed replies, refetch them."})
+            backlog = []
+
+        for reply in backlog:
+            yield sse_event("reply", reply, reply["reply_id"])
+        sent = {reply["reply_id"] for reply in backlog}
+
+        while True:
+            reply = subscription.get(timeout=STREAM_HEARTBEAT)
+            if reply is None:
+                yield ": keep-alive\n\n"
+            elif reply is OVERFLOW:
+                # End the stream, the client reconnects and resumes from its last event.
+                return
+            elif reply["reply_id"] not in sent:
+                yield sse_event("reply", reply, reply["reply_id"])
+    finally:
+        subscription.close()
@@ -0,0 +1,373 @@
+import atexit
+from collections import Counter
+from contextlib import suppress
+from datetime import date, datetime
+import json
+import os
+import threading
+import time
+import uuid
+import mysql.connector
+from app import app
+from modules.utils.db import PoolTimeoutError, pooled_connection
+from modules.utils.events import publish
+from modules.utils.processes import process_alive
+
+# Replies are only buffered when this is set, otherwise they are inserted right away.
+REPLY_BUFFER_ENABLED = (os.getenv("REPLY_BUFFER_ENABLED") or "").lower() in ("1", "true")
+REPLY_BUFFER_INTERVAL = float(os.getenv("REPLY_BUFFER_INTERVAL") or 0.05)
+REPLY_BUFFER_BATCH_SIZE = int(os.getenv("REPLY_BUFFER_BATCH_SIZE") or 500)
+REPLY_BUFFER_MAX_ATTEMPTS = int(os.getenv("REPLY_BUFFER_MAX_ATTEMPTS") or 5)
+REPLY_JOURNAL_DIR = os.getenv("REPLY_JOURNAL_DIR") or "data/reply-journal"
+
+# Errors that say nothing about the replies being written, the whole flush is retried.
+TRANSIENT_ERRORS = (
+    mysql.connector.OperationalError,
+    mysql.connector.InterfaceError,
+    PoolTimeoutError,
+)
+
+
+class ReplyBuffer:
+    """
+    Accepts forum replies into a local journal and writes them to the database in
+    multi-row batches.
+
+    A reply is acknowledged once its journal entry is on disk. Concurrent appends
+    share one fsync. The journal is split into segments. Each flush starts a new
+    segment and deletes the old ones once all of their replies are committed.
+    Segments left behind by a crashed process are replayed on startup. Every
+    reply carries a client ID, so replaying one that was already committed does
+    nothing. A reply the database keeps rejecting is moved to the journal's
+    quarantine directory after `max_attempts` flushes, so it can't hold up the
+    replies behind it.
+    """
+
+    def __init__(self, journal_dir: str, batch_size: int, max_attempts: int = 5):
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+        # Accepted replies that aren't committed yet, oldest first.
+        self._pending: list[dict] = []
+        # Segments whose replies are all either pending or committed.
+        self._sealed: list[str] = []
+        self._segment = None
+        self._segment_path = None
+        self._instance = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._written = 0
+        self._synced = 0
+        # Client ID -> failed writes, for the replies that were rejected.
+        self._failures: dict[str, int] = {}
+
+        # Guards the pending replies and the open segment.
+        self._lock = threading.Lock()
+        # Held for an fsync, which covers every entry written before it.
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def append(self, forum_id: int, thread_id: int, user_id: int, reply_text: str) -> dict:
+        """Journal a reply and return its entry once it is durable."""
+        entry = {
+            "client_id": str(uuid.uuid4()),
+            "forum_id": forum_id,
+            "thread_id": thread_id,
+            "user_id": user_id,
+            "reply_text": reply_text,
+            "reply_time": date.today().isoformat(),
+        }
+        line = json.dumps(entry) + "\n"
+
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            self._written += 1
+            position = self._written
+            self._pending.append(entry)
+
+        self._sync(position)
+        return entry
+
+    def forked(self):
+        """
+        Start over with a new instance name in a forked worker. Workers forked
+        from one parent would otherwise share it, and `recover` would skip a
+        crashed sibling's segments as its own. The open segment and the pending
+        replies are left to the parent that journaled them.
+        """
+        with self._lock:
+            self._instance = uuid.uuid4().hex[:8]
+            self._pending = []
+            self._sealed = []
+            self._segment = None
+            self._segment_path = None
+            self._written = 0
+            self._synced = 0
+
+    def _open_segment(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._sequence += 1
+        self._segment_path = os.path.join(
+            self.journal_dir, f"{os.getpid()}-{self._instance}-{self._sequence:06}.ndjson"
+        )
+        self._segment = open(self._segment_path, "a")
+
+    def _sync(self, position: int):
+        with self._sync_lock:
+            if self._synced >= position:
+                # Another request's fsync already covered this entry.
+                return
+            with self._lock:
+                segment, written = self._segment, self._written
+            os.fsync(segment.fileno())
+            self._synced = written
+
+    def pending_for(self, thread_id: int, user_id: int) -> list[dict]:
+        """The replies a user posted to a thread that aren't committed yet."""
+        with self._lock:
+            return [
+                entry
+                for entry in self._pending
+                if entry["thread_id"] == thread_id and entry["user_id"] == user_id
+            ]
+
+    def recover(self) -> int:
+        """
+        Queue the replies journaled by processes that are gone, and return how many
+        were found. A restarted container can get its old PID back, so segments
+        with this process' PID are taken over too, unless this buffer wrote them.
+        """
+        if not os.path.isdir(self.journal_dir):
+            return 0
+
+        recovered = []
+        paths = []
+        for file_name in sorted(os.listdir(self.journal_dir)):
+            if not file_name.endswith(".ndjson"):
+                continue
+            pid, instance, _ = file_name.split("-", 2)
+            if instance == self._instance:
+                continue
+            if int(pid) != os.getpid() and process_alive(int(pid)):
+                continue
+
+            # Claim the segment under this buffer's name, so no other process replays it too.
+            path = os.path.join(
+                self.journal_dir, f"{os.getpid()}-{self._instance}-{pid}-{instance}-{file_name}"
+            )
+            try:
+                os.rename(os.path.join(self.journal_dir, file_name), path)
+            except FileNotFoundError:
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        recovered.append(json.loads(line))
+                    except ValueError:
+                        # The write was torn by the crash, so it was never acknowledged.
+                        break
+            paths.append(path)
+
+        with self._lock:
+            self._pending = recovered + self._pending
+            self._sealed.extend(paths)
+        return len(recovered)
+
+    def flush(self) -> int:
+        """Commit every pending reply and return how many rows were inserted."""
+        with self._flush_lock:
+            with self._sync_lock, self._lock:
+                if self._segment is not None:
+                    os.fsync(self._segment.fileno())
+                    self._synced = self._written
+                    self._segment.close()
+                    self._sealed.append(self._segment_path)
+                    self._segment = None
+                entries = list(self._pending)
+                sealed = list(self._sealed)
+
+            inserted = 0
+            stuck = False
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start : start + self.batch_size]
+                try:
+                    inserted += self._write_batch(batch)
+                    done = batch
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    # Find the replies failing the batch by writing them one at a time.
+                    app.logger.exception("Writing a batch of buffered forum replies failed")
+                    batch_inserted, done = self._write_each(batch)
+                    inserted += batch_inserted
+                    stuck = stuck or len(done) < len(batch)
+
+                done_ids = {id(entry) for entry in done}
+                with self._lock:
+                    self._pending = [e for e in self._pending if id(e) not in done_ids]
+
+            if stuck:
+                # The sealed segments still hold replies that are retried next time.
+                return inserted
+
+            # Every reply in the sealed segments is committed (or quarantined) now.
+            for path in sealed:
+                with suppress(FileNotFoundError):
+                    os.remove(path)
+            with self._lock:
+                self._sealed = [path for path in self._sealed if path not in sealed]
+            return inserted
+
+    def _write_each(self, entries: list[dict]) -> tuple[int, list[dict]]:
+        """
+        Write replies one by one, quarantining those that failed `max_attempts`
+        times. Returns how many rows were inserted and the replies that are done.
+        """
+        inserted = 0
+        done = []
+        for entry in entries:
+            client_id = entry["client_id"]
+            try:
+                inserted += self._write_batch([entry])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception:
+                attempts = self._failures.get(client_id, 0) + 1
+                self._failures[client_id] = attempts
+                if attempts < self.max_attempts:
+                    app.logger.exception(f"Buffered forum reply {client_id} failed, retrying it with the next flush")
+                    continue
+                app.logger.exception(f"Buffered forum reply {client_id} failed {attempts} times, quarantining it")
+                self._quarantine(entry)
+            self._failures.pop(client_id, None)
+            done.append(entry)
+        return inserted, done
+
+    def _quarantine(self, entry: dict):
+        quarantine_dir = os.path.join(self.journal_dir, "quarantine")
+        os.makedirs(quarantine_dir, exist_ok=True)
+        path = os.path.join(quarantine_dir, f"{os.getpid()}-{self._instance}.ndjson")
+        with open(path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_batch(self, entries: list[dict]) -> int:
+        with pooled_connection() as conn:
+            db_cursor = conn.cursor(dictionary=True)
+
+            # Replayed replies may have been committed before the crash.
+            client_ids = [entry["client_id"] for entry in entries]
+            db_cursor.execute(
+                f"SELECT client_id FROM DiscussionReply WHERE client_id IN ({', '.join(['%s'] * len(client_ids))})",
+                client_ids,
+            )
+            committed = {row["client_id"] for row in db_cursor.fetchall()}
+            new_entries = [e for e in entries if e["client_id"] not in committed]
+            if not new_entries:
+                return 0
+
+            # A reply whose thread or author was deleted in the meantime fails the
+            # batch, flush() then retries its replies one by one to isolate it.
+            db_cursor.execute(
+                "INSERT INTO DiscussionReply (client_id, thread_id, user_id, reply_text, reply_time) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s)"] * len(new_entries)),
+                [
+                    value
+                    for e in new_entries
+                    for value in (e["client_id"], e["thread_id"], e["user_id"], e["reply_text"], e["reply_time"])
+                ],
+            )
+            db_cursor.execute(
+                f"SELECT * FROM DiscussionReply WHERE client_id IN ({', '.join(['%s'] * len(new_entries))}) ORDER BY reply_id",
+                [e["client_id"] for e in new_entries],
+            )
+            replies = db_cursor.fetchall()
+
+            # Lock the threads in a fixed order so concurrent flushes can't deadlock.
+            for thread_id, count in sorted(Counter(r["thread_id"] for r in replies).items()):
+                db_cursor.execute(
+                    "UPDATE DiscussionThread SET replies = replies + %s WHERE thread_id = %s",
+                    (count, thread_id),
+                )
+            conn.commit()
+
+        forum_ids = {e["client_id"]: e["forum_id"] for e in new_entries}
+        for reply in replies:
+            publish("forum.reply_added", forum_id=forum_ids[reply["client_id"]], reply=reply)
+        return len(replies)
+
+
+def pending_reply(entry: dict) -> dict:
+    """A journaled reply in the shape of a DiscussionReply row, without its ID yet."""
+    return {
+        "reply_id": None,
+        "client_id": entry["client_id"],
+        "thread_id": entry["thread_id"],
+        "user_id": entry["user_id"],
+        "reply_text": entry["reply_text"],
+        "reply_time": datetime.combine(
+            date.fromisoformat(entry["reply_time"]), datetime.min.time()
+        ),
+    }
+
+
+reply_buffer = ReplyBuffer(
+    REPLY_JOURNAL_DIR, REPLY_BUFFER_BATCH_SIZE, REPLY_BUFFER_MAX_ATTEMPTS
+)
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_periodically(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            reply_buffer.flush()
+        except Exception:
+            app.logger.exception("Flushing buffered forum replies failed")
+
+
+def _flush_on_exit():
+    try:
+        reply_buffer.flush()
+    except Exception:
+        # The journal still has them, they are replayed on the next start.
+        app.logger.exception("Flushing buffered forum replies on exit failed")
+
+
+def start_reply_buffer() -> bool:
+    """
+    Replay the journal and start flushing replies every REPLY_BUFFER_INTERVAL
+    seconds, once per process. Does nothing unless REPLY_BUFFER_ENABLED is set.
+    """
+    global _flusher_pid
+
+    if not REPLY_BUFFER_ENABLED:
+        return False
+
+    pid = os.getpid()
+    with _flusher_lock:
+        if _flusher_pid != pid:
+            # The buffer was created before the fork, with the parent's instance name.
+            reply_buffer.forked()
+            reply_buffer.recover()
+            threading.Thread(
+                target=_flush_periodically,
+                args=(REPLY_BUFFER_INTERVAL,),
+                name="reply-buffer-flush",
+                daemon=True,
+            ).start()
+            atexit.register(_flush_on_exit)
+            _flusher_pid = pid
+    return True
+
+
+def buffer_reply(forum_id: int, thread_id: int, user_id: int, reply_text: str) -> dict:
+    # Forked workers start their own flusher on their first reply.
+    start_reply_buffer()
+    return reply_buffer.append(forum_id, thread_id, user_id, reply_text)
@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+from typing import NamedTuple
+import click
+import numpy as np
+from app import app
+from modules.utils.cache import TTLCache
+from modules.utils.db import db, pooled_connection
+from modules.utils.events import subscribe
+from modules.utils.streaming import iter_batches
+
+# How long the arrays pulled from the database are reused before being reloaded.
+ANALYTICS_TTL = float(os.getenv("ANALYTICS_TTL") or 300)
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+# The top of the GPA scale, histograms span [0, MAX_GPA].
+MAX_GPA = 4.33
+
+
+class GpaArrays(NamedTuple):
+    student_ids: np.ndarray
+    gpa: np.ndarray
+    # Index into `majors` for every student.
+    major_codes: np.ndarray
+    majors: np.ndarray
+
+
+_gpa_arrays: GpaArrays | None = None
+_gpa_loaded_at = 0.0
+_gpa_reloading = False
+# Only guards the fields above, the arrays are never loaded while holding it.
+_gpa_lock = threading.Lock()
+
+# assignment_id -> array of the assignment's grades
+grade_cache = TTLCache(max_size=1024, ttl=ANALYTICS_TTL)
+
+
+def load_gpa_arrays(conn) -> GpaArrays:
+    """Pull every graded student's GPA and major into compact arrays."""
+    db_cursor = conn.cursor()
+    db_cursor.execute(
+        "SELECT student_id, gpa, COALESCE(major, '') FROM StudentDetails WHERE gpa IS NOT NULL"
+    )
+
+    student_ids, gpa, majors = [], [], []
+    for batch in iter_batches(db_cursor):
+        ids, gpas, batch_majors = zip(*batch)
+        student_ids.append(np.array(ids, dtype=np.int32))
+        gpa.append(np.array(gpas, dtype=np.float32))
+        majors.extend(batch_majors)
+
+    if not student_ids:
+        empty = np.array([], dtype=np.int32)
+        return GpaArrays(empty, np.array([], dtype=np.float32), empty, np.array([]))
+
+    major_names, major_codes = np.unique(np.array(majors), return_inverse=True)
+    return GpaArrays(
+        student_ids=np.concatenate(student_ids),
+        gpa=np.concatenate(gpa),
+        major_codes=major_codes.astype(np.int32),
+        majors=major_names,
+    )
+
+
+def get_gpa_arrays() -> GpaArrays:
+    """
+    Fetch the cached GPA arrays, reloading them once they are older than
+    ANALYTICS_TTL. While one request reloads them, the others keep getting the
+    old arrays instead of waiting.
+    """
+    global _gpa_arrays, _gpa_loaded_at, _gpa_reloading
+
+    with _gpa_lock:
+        stale = _gpa_arrays is None or time.monotonic() - _gpa_loaded_at > ANALYTICS_TTL
+        if not stale or (_gpa_reloading and _gpa_arrays is not None):
+            return _gpa_arrays
+        _gpa_reloading = True
+
+    try:
+        arrays = load_gpa_arrays(db)
+        with _gpa_lock:
+            _gpa_arrays = arrays
+            _gpa_loaded_at = time.monotonic()
+    finally:
+        with _gpa_lock:
+            _gpa_reloading = False
+    return arrays
+
+
+def get_grades(assignment_id: int) -> np.ndarray:
+    grades = grade_cache.get(assignment_id)
+    if grades is None:
+        db_cursor = db.cursor()
+        db_cursor.execute(
+            "SELECT grade FROM AssignmentSubmission WHERE assignment_id = %s AND grade IS NOT NULL",
+            (assignment_id,),
+        )
+        grades = np.fromiter(
+            (row[0] for batch in iter_batches(db_cursor) for row in batch),
+            dtype=np.float32,
+        )
+        grade_cache.set(assignment_id, grades)
+    return grades
+
+
+@subscribe("submission.graded")
+def _on_submission_graded(assignment_id: int, **event):
+    grade_cache.delete(assignment_id)
+
+
+def describe(values: np.ndarray, bins: int, upper_bound: float) -> dict:
+    """Summary statistics, percentiles and a histogram of `values` over [0, upper_bound]."""
+    if not len(values):
+        # The same shape as for data, so callers don't have to special-case it.
+        return {
+            "count": 0,
+            "mean": None,
+            "stddev": None,
+            "min": None,
+            "max": None,
+            "percentiles": {f"p{p}": None for p in PERCENTILES},
+            "histogram": [],
+        }
+
+    value_range = (0.0, max(upper_bound, float(values.max())))
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "stddev": round(float(values.std()), 4),
+        "min": round(float(values.min()), 2),
+        "max": round(float(values.max()), 2),
+        "percentiles": {
+            f"p{p}": round(float(value), 4) for p, value in zip(PERCENTILES, percentiles)
+        },
+        "histogram": [
+            {
+                "start": round(float(edges[i]), 4),
+                "end": round(float(edges[i + 1]), 4),
+                "count": int(counts[i]),
+            }
+            for i in range(len(counts))
+        ],
+    }
+
+
+def major_means(arrays: GpaArrays) -> list[dict]:
+    counts = np.bincount(arrays.major_codes, minlength=len(arrays.majors))
+    sums = np.bincount(
+        arrays.major_codes, weights=arrays.gpa, minlength=len(arrays.majors)
+    )
+    return [
+        {
+            "major": str(arrays.majors[i]) or None,
+            "students": int(counts[i]),
+            "mean_gpa": round(float(sums[i] / counts[i]), 4),
+        }
+        for i in range(len(arrays.majors))
+        if counts[i]
+    ]
+
+
+def top_students(arrays: GpaArrays, n: int) -> list[dict]:
+    """
+    The students within the top `n` distinct GPAs, with their dense rank, i.e. the
+    same rows as DENSE_RANK() OVER (ORDER BY gpa DESC) <= n.
+    """
+    if not len(arrays.gpa):
+        return []
+
+    distinct = np.unique(arrays.gpa)[::-1]
+    cutoff = distinct[min(n, len(distinct)) - 1]
+    selected = np.flatnonzero(arrays.gpa >= cutoff)
+    selected = selected[np.argsort(-arrays.gpa[selected], kind="stable")]
+    ranks = np.searchsorted(-distinct, -arrays.gpa[selected]) + 1
+
+    return [
+        {
+            "student_id": int(arrays.student_ids[i]),
+            "gpa": round(float(arrays.gpa[i]), 2),
+            "rank": int(rank),
+        }
+        for i, rank in zip(selected, ranks)
+    ]
+
+
+def _time(f, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@app.cli.command("benchmark-analytics")
+@click.option("--repeat", default=5, show_default=True, help="Runs per measurement.")
+def benchmark_analytics_command(repeat: int):
+    """Compare the GPA analytics against the equivalent SQL queries."""
+    with pooled_connection() as conn:
+        db_cursor = conn.cursor()
+
+        def sql(query):
+            def run():
+                db_cursor.execute(query)
+                db_cursor.fetchall()
+
+            return run
+
+        arrays = load_gpa_arrays(conn)
+        benchmarks = [
+            (
+                "top 10 students",
+                sql(
+                    """
+                    SELECT * FROM (
+                        SELECT student_id, gpa, DENSE_RANK() OVER (ORDER BY gpa DESC) AS `rank`
+                        FROM StudentDetails
+                    ) r WHERE r.`rank` <= 10
+                    """
+                ),
+                lambda: top_students(arrays, 10),
+            ),
+            (
+                "percentiles",
+                sql(
+                    """
+                    SELECT DISTINCT
+                        PERCENTILE_CONT(0.1) WITHIN GROUP (ORDER BY gpa) OVER (),
+                        PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY gpa) OVER (),
+                        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY gpa) OVER (),
+                        PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY gpa) OVER (),
+                        PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY gpa) OVER ()
+                    FROM StudentDetails WHERE gpa IS NOT NULL
+                    """
+                ),
+                lambda: np.percentile(arrays.gpa, PERCENTILES),
+            ),
+            (
+                "histogram",
+                sql(
+                    """
+                    SELECT FLOOR(gpa * 4) / 4 AS bucket, COUNT(*) FROM StudentDetails
+                    WHERE gpa IS NOT NULL GROUP BY bucket
+                    """
+                ),
+                lambda: np.histogram(arrays.gpa, bins=20, range=(0, MAX_GPA)),
+            ),
+            (
+                "per-major means",
+                sql("SELECT major, AVG(gpa) FROM StudentDetails GROUP BY major"),
+                lambda: major_means(arrays),
+            ),
+        ]
+
+        load_time = _time(lambda: load_gpa_arrays(conn), repeat)
+        print(f"Loaded {len(arrays.gpa)} students in {load_time * 1000:.1f} ms")
+        print(f"{'benchmark':<20}{'sql (ms)':>12}{'numpy (ms)':>12}")
+        for name, run_sql, run_numpy in benchmarks:
+            print(
+                f"{name:<20}{_time(run_sql, repeat) * 1000:>12.2f}{_time(run_numpy, repeat) * 1000:>12.2f}"
+            )
@@ -0,0 +1,70 @@
+from flask import jsonify, request
+from app import app
+from modules.models.account import AccountType
+from modules.routes.courses.courses_access import fetch_with_access
+from modules.routes.report.analytics import (
+    MAX_GPA,
+    describe,
+    get_gpa_arrays,
+    get_grades,
+    major_means,
+    top_students,
+)
+from modules.routes.report.report_schema import AnalyticsQuerySchema
+from modules.utils.route_utils import fetch_session, protected_route
+
+
+# Route for the GPA distribution, per-major means and the top students
+@app.route("/reports/analytics/gpa", methods=["GET"])
+@protected_route(roles=[AccountType.Admin])
+def get_gpa_analytics():
+    args = AnalyticsQuerySchema().load(request.args)
+    arrays = get_gpa_arrays()
+    return (
+        jsonify(
+            {
+                "distribution": describe(arrays.gpa, args["bins"], MAX_GPA),
+                "majors": major_means(arrays),
+                "top_students": top_students(arrays, args["top"]),
+            }
+        ),
+        200,
+    )
+
+
+# Route for the grade distribution of an assignment
+@app.route("/reports/analytics/assignments/<int:assignment_id>/grades", methods=["GET"])
+@protected_route(roles=[AccountType.Admin, AccountType.Lecturer])
+def get_assignment_grade_analytics(assignment_id: int):
+    args = AnalyticsQuerySchema().load(request.args)
+
+    # Check if the assignment exists and if the lecturer teaches its course.
+    access = fetch_with_access(
+        fetch_session(),
+        "SELECT {access} AS has_access, a.total_marks FROM Assignment a WHERE a.assignment_id = %s",
+        (assignment_id,),
+        course_code_column="a.course_code",
+        roles=(AccountType.Lecturer,),
+    )
+    if not access.found:
+        return jsonify({"message": "There is no assignment with that ID!"}), 404
+
+    if not access.allowed:
+        return (
+            jsonify({"message": "You can only view grades for your courses!"}),
+            403,
+        )
+
+    total_marks = float(access.rows[0]["total_marks"] or 100)
+    return (
+        jsonify(
+            {
+                "assignment_id": assignment_id,
+                "total_marks": total_marks,
+                "distribution": describe(
+                    get_grades(assignment_id), args["bins"], total_marks
+                ),
+            }
+        ),
+        200,
+    )
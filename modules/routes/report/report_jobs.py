@@ -0,0 +1,231 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+import re
+import threading
+from typing import Callable
+import uuid
+from app import app
+from modules.utils.db import pooled_connection
+from modules.utils.processes import process_alive, process_instance
+from modules.utils.route_utils import create_missing_dirs
+
+# Completed (and in-flight) jobs are persisted here, one JSON file per job.
+REPORT_JOBS_DIR = os.getenv("REPORT_JOBS_DIR") or "data/report-jobs"
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Report name -> function computing the report's result on a connection.
+JOB_REPORTS: dict[str, Callable] = {}
+
+
+def job_report(name: str):
+    def decorator(f):
+        JOB_REPORTS[name] = f
+        return f
+
+    return decorator
+
+
+@job_report("gpa_distribution")
+def gpa_distribution(conn) -> dict:
+    db_cursor = conn.cursor(dictionary=True)
+    db_cursor.execute(
+        """
+        SELECT COUNT(gpa) AS students, AVG(gpa) AS mean, STDDEV_POP(gpa) AS stddev,
+            MIN(gpa) AS min, MAX(gpa) AS max
+        FROM StudentDetails
+        """
+    )
+    summary = db_cursor.fetchone()
+
+    db_cursor.execute(
+        """
+        SELECT FLOOR(gpa * 4) / 4 AS bucket_start, COUNT(*) AS students
+        FROM StudentDetails
+        WHERE gpa IS NOT NULL
+        GROUP BY bucket_start
+        ORDER BY bucket_start
+        """
+    )
+    return {"summary": summary, "buckets": db_cursor.fetchall()}
+
+
+@job_report("department_rollup")
+def department_rollup(conn) -> dict:
+    db_cursor = conn.cursor(dictionary=True)
+    db_cursor.execute(
+        """
+        SELECT d.department,
+            COALESCE(l.lecturers, 0) AS lecturers,
+            COALESCE(l.courses, 0) AS courses,
+            COALESCE(l.enrollments, 0) AS enrollments,
+            COALESCE(s.students, 0) AS students,
+            s.mean_gpa
+        FROM (
+            SELECT department FROM LecturerDetails WHERE department IS NOT NULL
+            UNION
+            SELECT major FROM StudentDetails WHERE major IS NOT NULL
+        ) d
+        LEFT JOIN (
+            SELECT ld.department, COUNT(DISTINCT ld.lecturer_id) AS lecturers,
+                COUNT(c.course_code) AS courses, SUM(c.enrollment_count) AS enrollments
+            FROM LecturerDetails ld
+            LEFT JOIN Course c ON c.lecturer_id = ld.lecturer_id
+            GROUP BY ld.department
+        ) l ON l.department = d.department
+        LEFT JOIN (
+            SELECT major, COUNT(*) AS students, AVG(gpa) AS mean_gpa
+            FROM StudentDetails
+            GROUP BY major
+        ) s ON s.major = d.department
+        ORDER BY d.department
+        """
+    )
+    return {"departments": db_cursor.fetchall()}
+
+
+@job_report("semester_retention")
+def semester_retention(conn) -> dict:
+    # A student is retained when they're enrolled in a course of the following semester.
+    db_cursor = conn.cursor(dictionary=True)
+    db_cursor.execute(
+        """
+        WITH StudentSemester AS (
+            SELECT DISTINCT e.student_id, c.semester
+            FROM Enrollment e
+            JOIN Course c ON c.course_code = e.course_code
+            WHERE c.semester IS NOT NULL
+        )
+        SELECT cur.semester, COUNT(*) AS students, COUNT(nxt.student_id) AS retained
+        FROM StudentSemester cur
+        LEFT JOIN StudentSemester nxt
+            ON nxt.student_id = cur.student_id AND nxt.semester = cur.semester + 1
+        GROUP BY cur.semester
+        ORDER BY cur.semester
+        """
+    )
+    cohorts = db_cursor.fetchall()
+    for cohort in cohorts:
+        cohort["retention_rate"] = cohort["retained"] / cohort["students"]
+    return {"cohorts": cohorts}
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(REPORT_JOBS_DIR, f"{job_id}.json")
+
+
+def _save_job(job: dict):
+    # Write to a temporary file first so readers never see a half-written job.
+    path = _job_path(job["job_id"])
+    create_missing_dirs(path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(app.json.dumps(job))
+    os.replace(temp_path, path)
+
+
+def load_job(job_id: str) -> dict | None:
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+
+    try:
+        with open(_job_path(job_id)) as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    _fail_if_interrupted(job)
+    return job
+
+
+def _job_owner_alive(job: dict) -> bool:
+    if job["pid"] == os.getpid():
+        # Jobs from before a restart can carry this process' PID.
+        return job.get("instance") == process_instance()
+    return process_alive(job["pid"])
+
+
+def _fail_if_interrupted(job: dict):
+    """
+    Mark a job that was queued or running in a process that no longer exists as
+    failed, since nothing will ever finish it.
+    """
+    if job["status"] not in ("queued", "running") or _job_owner_alive(job):
+        return
+
+    job["status"] = "failed"
+    job["error"] = "The job was interrupted by a restart."
+    job["finished_at"] = datetime.now()
+    _save_job(job)
+
+
+def _fail_interrupted_jobs():
+    if not os.path.isdir(REPORT_JOBS_DIR):
+        return
+
+    for file_name in os.listdir(REPORT_JOBS_DIR):
+        if file_name.endswith(".json"):
+            # Loading a job fails it if it was interrupted.
+            load_job(file_name[: -len(".json")])
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Start this process' job workers on first use, cleaning up after a restart."""
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _fail_interrupted_jobs()
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("REPORT_JOB_WORKERS") or 2),
+                    thread_name_prefix="report-job",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def _run_job(job: dict):
+    job["status"] = "running"
+    job["started_at"] = datetime.now()
+    _save_job(job)
+
+    try:
+        with pooled_connection() as conn:
+            job["result"] = JOB_REPORTS[job["report"]](conn)
+        job["status"] = "succeeded"
+    except Exception as e:
+        app.logger.exception(f"Report job {job['job_id']} failed")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+    job["finished_at"] = datetime.now()
+    _save_job(job)
+
+
+def submit_job(report: str) -> dict:
+    """Queue a report for the job workers and return the new job's record."""
+    executor = _get_executor()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "report": report,
+        "status": "queued",
+        "pid": os.getpid(),
+        "instance": process_instance(),
+        "created_at": datetime.now(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None,
+    }
+    _save_job(job)
+    executor.submit(_run_job, dict(job))
+    return job
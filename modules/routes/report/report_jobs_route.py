@@ -0,0 +1,43 @@
+from flask import jsonify, request, url_for
+from app import app
+from modules.models.account import AccountType
+from modules.routes.report.report_jobs import JOB_REPORTS, load_job, submit_job
+from modules.routes.report.report_schema import CreateReportJobSchema
+from modules.utils.route_utils import protected_route
+
+
+@app.route("/reports/jobs", methods=["POST"])
+@protected_route(roles=[AccountType.Admin])
+def create_report_job():
+    body = CreateReportJobSchema().load(request.get_json(force=True))
+    if body["report"] not in JOB_REPORTS:
+        return (
+            jsonify(
+                {
+                    "message": "There is no report with that name!",
+                    "reports": sorted(JOB_REPORTS),
+                }
+            ),
+            400,
+        )
+
+    job = submit_job(body["report"])
+    location = url_for("get_report_job", job_id=job["job_id"])
+    return (
+        jsonify(
+            {"job_id": job["job_id"], "status": job["status"], "location": location}
+        ),
+        202,
+        {"Location": location},
+    )
+
+
+@app.route("/reports/jobs/<string:job_id>", methods=["GET"])
+@protected_route(roles=[AccountType.Admin])
+def get_report_job(job_id: str):
+    job = load_job(job_id)
+    if not job:
+        return jsonify({"message": "There is no report job with that ID!"}), 404
+
+    job.pop("pid", None)
+    return jsonify(job), 200
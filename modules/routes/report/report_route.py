@@ -1,96 +1,308 @@
-from flask import Flask, jsonify
+from datetime import datetime
+import hashlib
+import os
+import threading
+from typing import NamedTuple
+from flask import jsonify, request
 from app import app
+from modules.models.account import AccountType
+from modules.routes.report.report_schema import ReportQuerySchema
+from modules.routes.report.report_tables import (
+    build_summary_table,
+    refresh_summary_tables,
+    start_report_scheduler,
+)
+from modules.utils.cache import TTLCache
 from modules.utils.db import db
+from modules.utils.events import subscribe
+from modules.utils.route_utils import handle_route, protected_route
+from modules.utils.streaming import (
+    JSON_MIMETYPE,
+    iter_batches,
+    negotiate_format,
+    stream_rows,
+)
 
-db_cursor = db.cursor(dictionary=True)
+
+class ThresholdReport(NamedTuple):
+    # The table the rows are read from, a base table with counters or a summary table.
+    source: str
+    columns: str
+    # The indexed column the threshold is compared against.
+    key: str
+    # ">=" keeps rows with at least `threshold`, "<=" keeps the top `threshold` ranks.
+    comparison: str
+    default_threshold: int
+    # The summary table's name in ReportSnapshot, None when it's read live.
+    snapshot: str | None = None
+
+
+REPORTS = {
+    "course_enrollment": ThresholdReport(
+        source="Course",
+        columns="course_code, course_name, enrollment_count AS student_count",
+        key="enrollment_count",
+        comparison=">=",
+        default_threshold=1,
+    ),
+    "student_course_load": ThresholdReport(
+        source="StudentDetails",
+        columns="student_id, gpa, course_count",
+        key="course_count",
+        comparison=">=",
+        default_threshold=1,
+    ),
+    "lecturer_load": ThresholdReport(
+        source="ReportLecturerLoad",
+        columns="lecturer_id, course_count",
+        key="course_count",
+        comparison=">=",
+        default_threshold=1,
+        snapshot="lecturer_load",
+    ),
+    "student_rank": ThresholdReport(
+        source="ReportStudentRank",
+        columns="student_id, gpa, `rank`",
+        key="`rank`",
+        comparison="<=",
+        default_threshold=10,
+        snapshot="student_rank",
+    ),
+}
+
+
+# Seconds a request waits for a summary table that is being built.
+REPORT_BUILD_WAIT = float(os.getenv("REPORT_BUILD_WAIT") or 30)
+
+
+class ReportNotReady(Exception):
+    pass
+
+
+def _read_snapshot(report: ThresholdReport) -> dict | None:
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(
+        "SELECT generated_at FROM ReportSnapshot WHERE report_name = %s",
+        (report.snapshot,),
+    )
+    return db_cursor.fetchone()
+
+
+def _generated_at(report: ThresholdReport) -> datetime:
+    """
+    Fetch when the report's summary table was generated. A summary table that was
+    never generated (e.g. on a fresh database) is built first, or waited for when
+    another request is already building it.
+    """
+    if report.snapshot is None:
+        return datetime.now()
+
+    snapshot = _read_snapshot(report)
+    if snapshot is None:
+        if not build_summary_table(report.snapshot, wait=REPORT_BUILD_WAIT):
+            raise ReportNotReady()
+        # It was built on another connection, read it from a fresh snapshot.
+        db.rollback()
+        snapshot = _read_snapshot(report)
+    return snapshot["generated_at"]
+
+
+def _report_query(report: ThresholdReport, threshold: int | None, limit: int | None):
+    """
+    Build a report's query: a range scan on its indexed key, ordered by that key,
+    so every threshold and top N variant is the same query.
+    """
+    if threshold is None:
+        threshold = report.default_threshold
+
+    order = "DESC" if report.comparison == ">=" else "ASC"
+    query = f"""
+        SELECT {report.columns} FROM {report.source}
+        WHERE {report.key} {report.comparison} %s
+        ORDER BY {report.key} {order}
+    """
+    params = (threshold,)
+    if limit is not None:
+        query += " LIMIT %s"
+        params += (limit,)
+    return query, params
+
+
+def run_report(name: str, threshold: int | None = None, limit: int | None = None):
+    report = REPORTS[name]
+    generated_at = _generated_at(report)
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(*_report_query(report, threshold, limit))
+    return {"generated_at": generated_at, "results": db_cursor.fetchall()}
+
+
+def stream_report(name: str, threshold: int | None = None, limit: int | None = None):
+    """Stream a report's rows straight from the cursor as CSV or NDJSON."""
+    report = REPORTS[name]
+    generated_at = _generated_at(report)
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(*_report_query(report, threshold, limit))
+    response = stream_rows(iter_batches(db_cursor), filename=name)
+    # Like the JSON responses, only summary tables have a generation time to send.
+    if report.snapshot is not None:
+        response.last_modified = generated_at
+    return response
+
+
+class CachedReport(NamedTuple):
+    body: str
+    etag: str
+    # When the summary table was generated, None for reports read live.
+    last_modified: datetime | None
+
+
+# (report name, generation, threshold, limit) -> CachedReport
+report_cache = TTLCache(
+    max_size=int(os.getenv("REPORT_CACHE_SIZE") or 256),
+    ttl=float(os.getenv("REPORT_CACHE_TTL") or 30),
+)
+
+# Bumped whenever a report's data changes, which orphans its cached entries.
+_report_generations: dict[str, int] = {name: 0 for name in REPORTS}
+_generations_lock = threading.Lock()
+
+
+def invalidate_reports(*names: str):
+    """
+    Evict the cached results of reports whose data changed. The cache and the
+    generations are per process, other processes keep serving their cached
+    results until REPORT_CACHE_TTL expires.
+    """
+    with _generations_lock:
+        for name in names:
+            _report_generations[name] += 1
+
+
+def cached_report(name: str, threshold: int | None, limit: int | None) -> CachedReport:
+    # Read the generation first, so a result computed while the report is being
+    # invalidated is stored under the old generation and never served.
+    key = (name, _report_generations[name], threshold, limit)
+    cached = report_cache.get(key)
+    if cached is None:
+        result = run_report(name, threshold=threshold, limit=limit)
+        # The ETag only covers the data, so it stays the same across cache misses
+        # and processes while the rows don't change.
+        version = app.json.dumps(
+            {"threshold": threshold, "limit": limit, "results": result["results"]}
+        )
+        cached = CachedReport(
+            body=app.json.dumps(result),
+            etag=hashlib.sha1(version.encode()).hexdigest(),
+            last_modified=(
+                result["generated_at"] if REPORTS[name].snapshot is not None else None
+            ),
+        )
+        report_cache.set(key, cached)
+    return cached
+
+
+@subscribe("enrollment.changed")
+def _on_enrollment_changed(**event):
+    invalidate_reports("course_enrollment", "student_course_load")
+
+
+@subscribe("course.changed")
+def _on_course_changed(**event):
+    invalidate_reports("course_enrollment", "lecturer_load")
+
+
+@subscribe("reports.refreshed")
+def _on_reports_refreshed(report_name: str, **event):
+    invalidate_reports(report_name)
+
+
+def _report_response(name: str, threshold: int | None = None, limit: int | None = None):
+    """
+    Serve a report from the cache, letting the `threshold` and `limit` query
+    parameters override the defaults. Clients that send the ETag back in
+    `If-None-Match` get a 304 while the report is unchanged. Clients accepting
+    CSV or NDJSON get the rows streamed in that format instead.
+    """
+
+    # Forked workers keep the summary tables fresh too.
+    start_report_scheduler()
+
+    def handler():
+        args = ReportQuerySchema().load(request.args)
+        threshold_arg = args.get("threshold", threshold)
+        limit_arg = args.get("limit", limit)
+
+        try:
+            # Exports skip the cache and are streamed from the cursor.
+            if negotiate_format() != JSON_MIMETYPE:
+                response = stream_report(
+                    name, threshold=threshold_arg, limit=limit_arg
+                )
+                response.vary.add("Accept")
+                return response
+
+            report = cached_report(name, threshold=threshold_arg, limit=limit_arg)
+        except ReportNotReady:
+            response = jsonify(
+                {"message": "The report is being generated, try again shortly!"}
+            )
+            response.headers["Retry-After"] = "5"
+            return response, 503
+
+        response = app.response_class(report.body, mimetype="application/json")
+        response.set_etag(report.etag)
+        response.last_modified = report.last_modified
+        response.cache_control.no_cache = True
+        response.vary.add("Accept")
+        return response.make_conditional(request)
+
+    return handle_route(handler=handler)
+
+
+# Route for any report, e.g. /reports/course_enrollment?threshold=50&limit=10
+@app.route("/reports/<string:report_name>", methods=["GET"])
+def get_report(report_name: str):
+    if report_name not in REPORTS:
+        return jsonify({"message": "There is no report with that name!"}), 404
+    return _report_response(report_name)
 
 
 # Route for all courses with 50 or more students
 @app.route("/reports/courses/50students", methods=["GET"])
 def courses_50_students():
-    query = """
-    CREATE OR REPLACE VIEW Courses_With_50_Or_More_Students AS
-    SELECT c.course_code, c.course_name, COUNT(e.student_id) AS student_count
-    FROM Course c
-    JOIN Enrollment e ON c.course_code = e.course_code
-    GROUP BY c.course_code
-    HAVING COUNT(e.student_id) >= 50;
-    """
-    db_cursor.execute(query)
-    db_cursor.execute("SELECT * FROM Courses_With_50_Or_More_Students;")
-    courses = db_cursor.fetchall()
-    return jsonify(courses), 200
+    return _report_response("course_enrollment", threshold=50)
 
 
 # Route for all students enrolled in 5 or more courses
 @app.route("/reports/students/5courses", methods=["GET"])
 def students_5_courses():
-    query = """
-    CREATE OR REPLACE VIEW Students_Taking_5_Or_More_Courses AS
-    SELECT s.student_id, s.gpa, COUNT(e.course_code) AS course_count
-    FROM StudentDetails s
-    JOIN Enrollment e ON s.student_id = e.student_id
-    GROUP BY s.student_id
-    HAVING COUNT(e.course_code) >= 5;
-    """
-    db_cursor.execute(query)
-    db_cursor.execute("SELECT * FROM Students_Taking_5_Or_More_Courses;")
-    students = db_cursor.fetchall()
-    return jsonify(students), 200
+    return _report_response("student_course_load", threshold=5)
 
 
 # Route for all lecturers teaching 3 or more courses
 @app.route("/reports/lecturers/3courses", methods=["GET"])
 def lecturers_3_courses():
-    query = """
-    CREATE OR REPLACE VIEW Lecturers_Teaching_3_Or_More_Courses AS
-    SELECT l.lecturer_id, COUNT(c.course_code) AS course_count
-    FROM LecturerDetails l
-    JOIN Course c ON l.lecturer_id = c.lecturer_id
-    GROUP BY l.lecturer_id
-    HAVING COUNT(c.course_code) >= 3;
-    """
-    db_cursor.execute(query)
-    db_cursor.execute("SELECT * FROM Lecturers_Teaching_3_Or_More_Courses;")
-    lecturers = db_cursor.fetchall()
-    return jsonify(lecturers), 200
+    return _report_response("lecturer_load", threshold=3)
 
 
 # Route for the top 10 most enrolled courses
 @app.route("/reports/top10enrolled", methods=["GET"])
 def top_10_enrolled_courses():
-    query = """
-    CREATE OR REPLACE VIEW Top_10_Enrolled_Courses AS
-    SELECT c.course_code, c.course_name, COUNT(e.student_id) AS student_count
-    FROM Course c
-    JOIN Enrollment e ON c.course_code = e.course_code
-    GROUP BY c.course_code
-    ORDER BY COUNT(e.student_id) DESC
-    LIMIT 10;
-    """
-    db_cursor.execute(query)
-    db_cursor.execute("SELECT * FROM Top_10_Enrolled_Courses;")
-    top_courses = db_cursor.fetchall()
-    return jsonify(top_courses), 200
+    return _report_response("course_enrollment", limit=10)
 
 
 # Route for the top 10 students with the highest overall averages
 @app.route("/reports/top10students", methods=["GET"])
 def top_10_students():
-    student_rank_query = """
-    CREATE OR REPLACE VIEW Student_Rank AS
-    SELECT s.student_id, s.gpa, DENSE_RANK() OVER (ORDER BY s.gpa DESC) AS rank
-    FROM StudentDetails s
-    """
+    return _report_response("student_rank", threshold=10)
 
-    query = """
-    SELECT s.student_id, s.gpa, sr.rank
-    FROM StudentDetails AS s
-    JOIN Student_Rank AS sr ON s.student_id = sr.student_id
-    WHERE sr.rank <= 10
-    """
 
-    db_cursor.execute(student_rank_query)
-    db_cursor.execute(query)
-    top_students = db_cursor.fetchall()
-    return jsonify(top_students), 200
+# Route to recompute every report now instead of waiting for the scheduler
+@app.route("/reports/refresh", methods=["POST"])
+@protected_route(roles=[AccountType.Admin])
+def refresh_reports():
+    if not refresh_summary_tables(db):
+        return jsonify({"message": "The reports are already being refreshed!"}), 409
+    return jsonify({"message": "Reports refreshed successfully!"}), 200
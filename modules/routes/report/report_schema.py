@@ -0,0 +1,21 @@
+from marshmallow import EXCLUDE, Schema, fields, validate
+
+
+class ReportQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    threshold = fields.Int(required=False, validate=validate.Range(min=0))
+    limit = fields.Int(required=False, validate=validate.Range(min=1, max=10000))
+
+
+class CreateReportJobSchema(Schema):
+    report = fields.String(required=True)
+
+
+class AnalyticsQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    bins = fields.Int(load_default=20, validate=validate.Range(min=1, max=200))
+    top = fields.Int(load_default=10, validate=validate.Range(min=1, max=1000))
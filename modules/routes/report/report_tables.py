@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from typing import NamedTuple
+from app import app
+from modules.utils.db import pooled_connection
+from modules.utils.events import publish
+
+
+class SummaryTable(NamedTuple):
+    table: str
+    # Recomputes the table's rows from the base tables.
+    refresh_sql: str
+
+
+SUMMARY_TABLES = {
+    "lecturer_load": SummaryTable(
+        "ReportLecturerLoad",
+        """
+        INSERT INTO ReportLecturerLoad (lecturer_id, course_count)
+        SELECT l.lecturer_id, COUNT(c.course_code)
+        FROM LecturerDetails l
+        JOIN Course c ON l.lecturer_id = c.lecturer_id
+        GROUP BY l.lecturer_id
+        """,
+    ),
+    "student_rank": SummaryTable(
+        "ReportStudentRank",
+        """
+        INSERT INTO ReportStudentRank (student_id, gpa, `rank`)
+        SELECT s.student_id, s.gpa, DENSE_RANK() OVER (ORDER BY s.gpa DESC)
+        FROM StudentDetails s
+        """,
+    ),
+}
+
+# Only one process refreshes the summary tables at a time.
+REFRESH_LOCK_NAME = "report_refresh"
+
+
+def refresh_summary_table(conn, name: str):
+    """
+    Recompute one summary table and record when it was generated. The table is
+    swapped in a single transaction, so readers see either the old rows or the new.
+    """
+    summary = SUMMARY_TABLES[name]
+    db_cursor = conn.cursor()
+    try:
+        db_cursor.execute(f"DELETE FROM {summary.table}")
+        db_cursor.execute(summary.refresh_sql)
+        db_cursor.execute(
+            """
+            INSERT INTO ReportSnapshot (report_name, generated_at) VALUES (%s, NOW())
+            ON DUPLICATE KEY UPDATE generated_at = VALUES(generated_at)
+            """,
+            (name,),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    publish("reports.refreshed", report_name=name)
+
+
+def refresh_summary_tables(conn, max_age: float | None = None) -> bool:
+    """
+    Recompute every summary table. Returns False without doing anything when
+    another process is already refreshing them. With `max_age`, the tables are
+    left alone when all of them were generated less than `max_age` seconds ago.
+    """
+    db_cursor = conn.cursor()
+    db_cursor.execute("SELECT GET_LOCK(%s, 0)", (REFRESH_LOCK_NAME,))
+    if not db_cursor.fetchone()[0]:
+        return False
+
+    try:
+        if max_age is not None:
+            # Another process may have just refreshed them.
+            db_cursor.execute(
+                """
+                SELECT COUNT(*) FROM ReportSnapshot
+                WHERE report_name IN ({}) AND generated_at > NOW() - INTERVAL %s SECOND
+                """.format(", ".join(["%s"] * len(SUMMARY_TABLES))),
+                tuple(SUMMARY_TABLES) + (max_age,),
+            )
+            if db_cursor.fetchone()[0] == len(SUMMARY_TABLES):
+                return True
+
+        for name in SUMMARY_TABLES:
+            refresh_summary_table(conn, name)
+    finally:
+        db_cursor.execute("SELECT RELEASE_LOCK(%s)", (REFRESH_LOCK_NAME,))
+        db_cursor.fetchone()
+    return True
+
+
+def build_summary_table(name: str, wait: float) -> bool:
+    """
+    Build a summary table that was never generated (e.g. on a fresh database) on
+    a connection of its own. A build or refresh that is already running is waited
+    for instead of repeated. Returns False when it didn't finish within `wait`
+    seconds.
+    """
+    with pooled_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute("SELECT GET_LOCK(%s, %s)", (REFRESH_LOCK_NAME, wait))
+        if not db_cursor.fetchone()[0]:
+            return False
+
+        try:
+            # Whoever held the lock may have built it in the meantime.
+            db_cursor.execute(
+                "SELECT 1 FROM ReportSnapshot WHERE report_name = %s", (name,)
+            )
+            if db_cursor.fetchone() is None:
+                refresh_summary_table(conn, name)
+        finally:
+            db_cursor.execute("SELECT RELEASE_LOCK(%s)", (REFRESH_LOCK_NAME,))
+            db_cursor.fetchone()
+    return True
+
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def _refresh_periodically(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            with pooled_connection() as conn:
+                # Every worker runs a scheduler, only the first one due refreshes.
+                refresh_summary_tables(conn, max_age=interval / 2)
+        except Exception:
+            app.logger.exception("Refreshing the report tables failed")
+
+
+def start_report_scheduler() -> bool:
+    """
+    Refresh the report tables every REPORT_REFRESH_INTERVAL seconds (300 by
+    default, 0 disables it) on a background thread, once per process. Forked
+    workers start their own on their first report request.
+    """
+    global _scheduler_pid
+
+    interval = float(os.getenv("REPORT_REFRESH_INTERVAL") or 300)
+    if interval <= 0:
+        return False
+
+    pid = os.getpid()
+    with _scheduler_lock:
+        if _scheduler_pid != pid:
+            threading.Thread(
+                target=_refresh_periodically,
+                args=(interval,),
+                name="report-refresh",
+                daemon=True,
+            ).start()
+            _scheduler_pid = pid
+    return True
+
+
+@app.cli.command("refresh-reports")
+def refresh_reports_command():
+    """Recompute the report summary tables."""
+    with pooled_connection() as conn:
+        refreshed = refresh_summary_tables(conn)
+
+    if refreshed:
+        print("Report tables refreshed!")
+    else:
+        print("Report tables are already being refreshed, skipping!")
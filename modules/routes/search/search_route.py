@@ -0,0 +1,157 @@
+from typing import NamedTuple
+from flask import request
+from app import app
+from modules.routes.courses.courses_route import _check_course_visibility
+from modules.routes.search.search_schema import SearchQuerySchema
+from modules.utils.db import db
+from modules.utils.pagination import Page
+from modules.utils.query_plans import register_query
+from modules.utils.route_utils import fetch_session, protected_route
+
+SEARCH_FIELDS = ["kind", "id", "parent_id", "title", "snippet", "score"]
+
+# How much of a matching row's text is returned with it.
+SNIPPET_LENGTH = 200
+
+
+class SearchSource(NamedTuple):
+    kind: str
+    # The FROM clause, joined up to the table holding the row's course code.
+    tables: str
+    course_column: str
+    id_column: str
+    # The thread of a reply or the section of a section item.
+    parent_column: str
+    title_column: str
+    text_column: str
+    # The columns of the source's FULLTEXT index, in index order.
+    match_columns: str
+    # For `check-query-plans`: a row of a matching word and the row's course code.
+    sample_sql: str
+
+
+SEARCH_SOURCES = [
+    SearchSource(
+        kind="reply",
+        tables="""
+            DiscussionReply r
+            JOIN DiscussionThread t ON t.thread_id = r.thread_id
+            JOIN DiscussionForum f ON f.forum_id = t.forum_id
+        """,
+        course_column="f.course_code",
+        id_column="r.reply_id",
+        parent_column="r.thread_id",
+        title_column="NULL",
+        text_column="r.reply_text",
+        match_columns="r.reply_text",
+        sample_sql="""
+            SELECT SUBSTRING_INDEX(r.reply_text, ' ', 1) AS word, f.course_code
+            FROM DiscussionReply r
+            JOIN DiscussionThread t ON t.thread_id = r.thread_id
+            JOIN DiscussionForum f ON f.forum_id = t.forum_id LIMIT 1
+        """,
+    ),
+    SearchSource(
+        kind="section_item",
+        tables="SectionItems si JOIN Sections s ON s.section_id = si.section_id",
+        course_column="s.course_code",
+        id_column="si.item_id",
+        parent_column="si.section_id",
+        title_column="si.title",
+        text_column="si.description",
+        match_columns="si.title, si.description",
+        sample_sql="""
+            SELECT SUBSTRING_INDEX(si.title, ' ', 1) AS word, s.course_code
+            FROM SectionItems si JOIN Sections s ON s.section_id = si.section_id LIMIT 1
+        """,
+    ),
+    SearchSource(
+        kind="assignment",
+        tables="Assignment a",
+        course_column="a.course_code",
+        id_column="a.assignment_id",
+        parent_column="NULL",
+        title_column="a.title",
+        text_column="a.description",
+        match_columns="a.title, a.description",
+        sample_sql="""
+            SELECT SUBSTRING_INDEX(a.title, ' ', 1) AS word, a.course_code
+            FROM Assignment a LIMIT 1
+        """,
+    ),
+]
+
+
+def _source_query(source: SearchSource, page: Page) -> str:
+    """
+    Rank one source's matches in a course. Only a page's worth of rows past the
+    cursor is taken from each source before they are merged. The score is
+    rounded so that it survives the round trip through the cursor unchanged.
+    """
+    keyset, _ = page.keyset_clause()
+    match = f"MATCH({source.match_columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+    return f"""
+        (SELECT '{source.kind}' AS kind, {source.id_column} AS id,
+            {source.parent_column} AS parent_id, {source.title_column} AS title,
+            LEFT({source.text_column}, {SNIPPET_LENGTH}) AS snippet,
+            ROUND({match}, 6) AS score
+        FROM {source.tables}
+        WHERE {source.course_column} = %s AND {match}
+        HAVING {keyset}
+        ORDER BY {page.order_by()} LIMIT %s)
+    """
+
+
+def _search_page() -> Page:
+    return Page(SEARCH_FIELDS, key_columns=["score", "kind", "id"], descending=True)
+
+
+for source in SEARCH_SOURCES:
+    # Each source is checked on its own, with a cursor past the best match.
+    register_query(
+        f"search.course_{source.kind}s",
+        lambda page, source=source: _source_query(source, page),
+        f"""
+        SELECT sample.word, sample.course_code, sample.word AS word_again,
+            1000000 AS score, 'zzz' AS kind, 0 AS id, 101 AS row_limit
+        FROM ({source.sample_sql}) sample
+        """,
+        page=_search_page,
+    )
+
+
+@app.route("/course/<string:course_code>/search", methods=["GET"])
+@protected_route()
+def search_course(course_code: str):
+    session = fetch_session()
+    visibility_res = _check_course_visibility(
+        session,
+        course_code,
+        err_msgs={
+            "lecturer_err": "You can only search your own courses!",
+            "student_err": "You are not enrolled in this course!",
+        },
+    )
+    if visibility_res:
+        return visibility_res
+
+    args = SearchQuerySchema().load(request.args)
+    page = _search_page()
+    _, keyset_params = page.keyset_clause()
+
+    # Most relevant first, across forum replies, section items and assignments.
+    sources = " UNION ALL ".join(_source_query(s, page) for s in SEARCH_SOURCES)
+    params = ()
+    for _ in SEARCH_SOURCES:
+        params += (args["q"], course_code, args["q"]) + keyset_params + (page.fetch_limit(),)
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(
+        f"""
+        SELECT {page.select_list("results")} FROM ({sources}) results
+        ORDER BY {page.order_by("results")} LIMIT %s
+        """,
+        params + (page.fetch_limit(),),
+    )
+    results = db_cursor.fetchall()
+    return page.response(results), 200
@@ -0,0 +1,9 @@
+from marshmallow import EXCLUDE, Schema, fields, validate
+
+
+class SearchQuerySchema(Schema):
+    class Meta:
+        # The pagination parameters are parsed by Page.
+        unknown = EXCLUDE
+
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=255))
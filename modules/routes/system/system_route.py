@@ -0,0 +1,11 @@
+from flask import jsonify
+from app import app
+from modules.models.account import AccountType
+from modules.utils.db import get_pool
+from modules.utils.route_utils import protected_route
+
+
+@app.route("/system/db-pool", methods=["GET"])
+@protected_route(roles=[AccountType.Admin])
+def get_db_pool_stats():
+    return jsonify(get_pool().stats()), 200
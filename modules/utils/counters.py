@@ -0,0 +1,69 @@
+from typing import NamedTuple
+import click
+from app import app
+from modules.utils.db import pooled_connection
+
+
+class Counter(NamedTuple):
+    # The table holding the counter, with an alias for `actual` to correlate on.
+    table: str
+    column: str
+    # A correlated subquery counting the rows the counter should match.
+    actual: str
+
+
+# Each denormalized counter by name, registered by the module that maintains it.
+COUNTERS: dict[str, Counter] = {}
+
+
+def register_counter(name: str, table: str, column: str, actual: str):
+    """Register a denormalized counter, so `reconcile-counters` checks it."""
+    COUNTERS[name] = Counter(table, column, actual)
+
+
+def reconcile_counters(conn, fix: bool = True) -> dict[str, int]:
+    """
+    Compare every counter against the rows it counts and return how many rows
+    disagree, per counter. With `fix`, those rows are corrected in the same statement. The
+    counts are read with locks, so concurrent registrations aren't lost.
+    """
+    db_cursor = conn.cursor()
+    drift = {}
+    try:
+        for name, (table, column, actual) in COUNTERS.items():
+            if fix:
+                db_cursor.execute(
+                    f"UPDATE {table} SET {column} = ({actual}) WHERE {column} <> ({actual})"
+                )
+                drift[name] = db_cursor.rowcount
+            else:
+                db_cursor.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE {column} <> ({actual})"
+                )
+                drift[name] = db_cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return drift
+
+
+@app.cli.command("reconcile-counters")
+@click.option(
+    "--dry-run", is_flag=True, help="Only report drift, don't correct it."
+)
+def reconcile_counters_command(dry_run: bool):
+    """Check the denormalized counters against their base tables."""
+    with pooled_connection() as conn:
+        drift = reconcile_counters(conn, fix=not dry_run)
+
+    for name, rows in drift.items():
+        if not rows:
+            print(f"{name} is consistent")
+        elif dry_run:
+            print(f"{name} is off for {rows} row(s)")
+        else:
+            print(f"{name} was corrected for {rows} row(s)")
+
+    if dry_run and any(drift.values()):
+        raise SystemExit(1)
@@ -0,0 +1,63 @@
+import os
+import re
+import time
+import click
+import mysql.connector
+from app import app
+from modules.utils.db import database_connect_args
+from modules.utils.migrations import read_statements
+
+LOAD_DATA_PATTERN = re.compile(r"LOAD DATA LOCAL INFILE '([^']+)' INTO TABLE (\w+)")
+
+
+def load_dataset(conn, directory: str) -> list[tuple[str, int, float]]:
+    """
+    Run the `load.sql` script written by `scripts/gen_sql.py --format tsv`, with
+    its data files resolved relative to `directory`. Returns the `(table, rows,
+    seconds)` of every bulk load.
+    """
+    directory = os.path.abspath(directory)
+    db_cursor = conn.cursor()
+    loads = []
+    try:
+        for statement in read_statements(os.path.join(directory, "load.sql")):
+            match = LOAD_DATA_PATTERN.match(statement)
+            if match:
+                path = os.path.join(directory, match.group(1)).replace("\\", "/")
+                statement = statement.replace(
+                    f"'{match.group(1)}'", "'" + path.replace("'", "''") + "'", 1
+                )
+
+            start = time.perf_counter()
+            db_cursor.execute(statement)
+            if match:
+                loads.append(
+                    (match.group(2), db_cursor.rowcount, time.perf_counter() - start)
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return loads
+
+
+@app.cli.command("load-dataset")
+@click.argument("directory", default="scripts/dataset")
+def load_dataset_command(directory: str):
+    """Bulk load a dataset generated with `gen_sql.py --format tsv`."""
+    # LOAD DATA LOCAL has to be allowed by the client, so this doesn't use the pool.
+    conn = mysql.connector.connect(**database_connect_args(), allow_local_infile=True)
+    start = time.perf_counter()
+    try:
+        loads = load_dataset(conn, directory)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+
+    for table, rows, seconds in loads:
+        print(f"{table}: {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+    total = sum(rows for _, rows, _ in loads)
+    print(
+        f"Loaded {total} rows in {elapsed:.2f}s, including index builds ({total / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
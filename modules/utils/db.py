@@ -1,33 +1,372 @@
+from contextlib import contextmanager
+from functools import wraps
 import os
+import threading
+import time
 import mysql.connector
+from flask import g, has_app_context
+from werkzeug.local import LocalProxy
 
+from app import app
 from modules.models.account import AccountType
 
-db = mysql.connector.connect(
-    host=os.getenv("DATABASE_HOST") or "localhost",
-    user=os.getenv("DATABASE_USER"),
-    password=os.getenv("DATABASE_PASSWORD"),
-    database=os.getenv("DATABASE"),
-    port=int(os.getenv("DATABASE_PORT") or 3306),
-)
-
-print("Database connected!" if db else "Database connection failed!")
-
-if db:
-    # Create the root user if it doesn't exist.
-    db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM Account WHERE email = 'root'")
-    if not db_cursor.fetchone():
-        db_cursor.execute(
-            "INSERT INTO Account (email, password, account_type, name) VALUES (%s, %s, %s, %s)",
-            (
-                "root",
-                os.getenv("MASTER_PASSWORD"),
-                AccountType.Admin.name,
-                "Root User",
-            ),
-        )
-        db.commit()
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of MySQL connections.
+
+    Connections are health-checked when they are checked out, and stale sockets
+    are reconnected before being handed to a caller. When every connection is in
+    use, callers wait up to `timeout` seconds for one to be returned.
+    """
+
+    def __init__(self, min_size=1, max_size=10, timeout=30.0, **connect_args):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size configuration!")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.connect_args = connect_args
+
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        for _ in range(min_size):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def acquire(self):
+        start = time.monotonic()
+        conn = None
+        with self._available:
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out waiting for a database connection after {self.timeout} seconds!"
+                        )
+                    self._available.wait(remaining)
+
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    # Reserve the slot now, the socket is opened outside the lock.
+                    self._size += 1
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not conn.is_connected():
+                # is_connected() pings the server, so a stale socket ends up here.
+                conn.reconnect(attempts=3, delay=0)
+                with self._lock:
+                    self._reconnects += 1
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        return conn
+
+    def release(self, conn):
+        try:
+            # Never hand out a connection with unread rows or a half-finished transaction.
+            if conn.unread_result:
+                conn.consume_results()
+            conn.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._available:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+            self._available.notify()
+
+        if not healthy:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "total_wait_time": self._total_wait_time,
+                "max_wait_time": self._max_wait_time,
+                "avg_wait_time": (
+                    self._total_wait_time / self._checkouts if self._checkouts else 0.0
+                ),
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Code running outside of a request (tests, scripts) holds one connection per thread
+# until it calls `close_thread_db`.
+_thread_local = threading.local()
+
+
+def database_connect_args() -> dict:
+    """The `mysql.connector.connect` arguments for the configured database."""
+    return {
+        "host": os.getenv("DATABASE_HOST") or "localhost",
+        "user": os.getenv("DATABASE_USER"),
+        "password": os.getenv("DATABASE_PASSWORD"),
+        "database": os.getenv("DATABASE"),
+        "port": int(os.getenv("DATABASE_PORT") or 3306),
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Fetch the process' connection pool, creating it on first use. Nothing is
+    opened at import time, and a forked worker builds its own pool instead of
+    sharing the parent's sockets.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    min_size=int(os.getenv("DATABASE_POOL_MIN") or 1),
+                    max_size=int(os.getenv("DATABASE_POOL_MAX") or 10),
+                    timeout=float(os.getenv("DATABASE_POOL_TIMEOUT") or 30),
+                    **database_connect_args(),
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def get_db():
+    """
+    Fetch the connection for the current request, checking one out of the pool
+    on first use. The connection is returned to the pool on app context teardown,
+    or by `close_thread_db` outside of one.
+    """
+    if has_app_context():
+        if "db" not in g:
+            g.db_pool = get_pool()
+            g.db = g.db_pool.acquire()
+        return g.db
+
+    pool = get_pool()
+    conn = getattr(_thread_local, "db", None)
+    if conn is None or getattr(_thread_local, "db_pool", None) is not pool:
+        conn = pool.acquire()
+        _thread_local.db = conn
+        _thread_local.db_pool = pool
+    return conn
+
+
+def close_thread_db():
+    """Return the current thread's connection, taken outside of a request, to the pool."""
+    conn = getattr(_thread_local, "db", None)
+    pool = getattr(_thread_local, "db_pool", None)
+    _thread_local.db = None
+    _thread_local.db_pool = None
+    # A connection from before a fork belongs to the parent's pool, leave it alone.
+    if conn is not None and pool is get_pool():
+        pool.release(conn)
+
+
+@contextmanager
+def pooled_connection():
+    """Check a connection out of the pool for code running outside of a request."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@app.teardown_appcontext
+def release_db(exception=None):
+    conn = g.pop("db", None)
+    pool = g.pop("db_pool", None)
+    if conn is not None:
+        pool.release(conn)
+
+
+db = LocalProxy(get_db)
+
+
+def _transaction_state():
+    return g if has_app_context() else _thread_local
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block as one unit of work on the current connection. The outermost
+    block commits once when it exits cleanly and rolls back if an exception
+    escapes it. Nested blocks join the outer transaction.
+    """
+    state = _transaction_state()
+    depth = getattr(state, "tx_depth", 0)
+    state.tx_depth = depth + 1
+    if depth == 0:
+        state.tx_rollback_only = False
+        state.tx_after_commit = []
+
+    conn = get_db()
+    try:
+        yield conn
+    except BaseException:
+        state.tx_rollback_only = True
+        raise
+    finally:
+        state.tx_depth = depth
+        if depth == 0:
+            callbacks, state.tx_after_commit = state.tx_after_commit, []
+            if state.tx_rollback_only:
+                discard_transaction()
+            else:
+                if conn.unread_result:
+                    conn.consume_results()
+                conn.commit()
+                for callback in callbacks:
+                    callback()
+
+
+def mark_rollback_only():
+    """Make the enclosing transaction roll back instead of committing."""
+    state = _transaction_state()
+    if getattr(state, "tx_depth", 0):
+        state.tx_rollback_only = True
+
+
+def after_commit(callback):
+    """
+    Run `callback` once the enclosing transaction has committed, or right away
+    outside of one. It is dropped if the transaction rolls back.
+    """
+    state = _transaction_state()
+    if getattr(state, "tx_depth", 0):
+        state.tx_after_commit.append(callback)
+    else:
+        callback()
+
+
+def discard_transaction():
+    """Roll back whatever the current request or thread has done so far."""
+    if has_app_context():
+        conn = g.get("db")
+    else:
+        conn = getattr(_thread_local, "db", None)
+
+    if conn is None:
+        return
+
+    if conn.unread_result:
+        conn.consume_results()
+    conn.rollback()
+
+
+def _response_status(response):
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, "status_code", 200)
+
+
+def unit_of_work(f):
+    """
+    Wrap a handler in a single transaction. It is committed once if the handler
+    returns a successful response and rolled back if the handler returns an
+    error response or raises. Stacks underneath `protected_route`.
+    """
+
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        with transaction():
+            response = f(*args, **kwargs)
+            if _response_status(response) >= 400:
+                mark_rollback_only()
+            return response
+
+    return wrapped
+
+
+def seed_root_user() -> bool:
+    """
+    Create the root admin account if it doesn't exist yet. Safe to run any number
+    of times, returns True only when the account was created by this call.
+    """
+    with pooled_connection() as conn:
+        db_cursor = conn.cursor()
+        try:
+            db_cursor.execute(
+                """
+                INSERT INTO Account (email, password, account_type, name)
+                SELECT %s, %s, %s, %s FROM DUAL
+                WHERE NOT EXISTS (SELECT 1 FROM Account WHERE email = %s)
+                """,
+                (
+                    "root",
+                    os.getenv("MASTER_PASSWORD"),
+                    AccountType.Admin.name,
+                    "Root User",
+                    "root",
+                ),
+            )
+        except mysql.connector.IntegrityError:
+            # Another process created it between the check and the insert.
+            return False
+        conn.commit()
+        return db_cursor.rowcount > 0
+
+
+@app.cli.command("seed-root")
+def seed_root_command():
+    """Create the root admin account if it doesn't exist."""
+    if seed_root_user():
         print("Root user created!")
     else:
         print("Root user already exists, skipping creation!")
@@ -0,0 +1,33 @@
+from collections import defaultdict
+from typing import Callable
+from app import app
+from modules.utils.db import after_commit
+
+# Topic -> handlers, called with the published event's fields as keyword arguments.
+_subscribers: dict[str, list[Callable]] = defaultdict(list)
+
+
+def subscribe(topic: str):
+    """Register the decorated function as a handler for `topic`."""
+
+    def decorator(handler: Callable):
+        _subscribers[topic].append(handler)
+        return handler
+
+    return decorator
+
+
+def publish(topic: str, **event):
+    """
+    Notify the handlers of `topic` in this process. Inside a transaction, they are
+    only notified once it commits, so a rolled back write publishes nothing.
+    """
+    after_commit(lambda: _dispatch(topic, event))
+
+
+def _dispatch(topic: str, event: dict):
+    for handler in list(_subscribers[topic]):
+        try:
+            handler(**event)
+        except Exception:
+            app.logger.exception(f"Handling the {topic} event failed")
@@ -0,0 +1,73 @@
+import os
+from app import app
+from modules.utils.db import pooled_connection
+
+MIGRATIONS_DIR = os.path.join(app.root_path, "scripts", "migrations")
+
+
+def migration_files() -> list[tuple[str, str]]:
+    """
+    List the `(version, path)` of every migration in `scripts/migrations`, in the
+    order they have to be applied. The version is the file name without `.sql`.
+    """
+    if not os.path.isdir(MIGRATIONS_DIR):
+        return []
+
+    return [
+        (file_name[: -len(".sql")], os.path.join(MIGRATIONS_DIR, file_name))
+        for file_name in sorted(os.listdir(MIGRATIONS_DIR))
+        if file_name.endswith(".sql")
+    ]
+
+
+def read_statements(path: str) -> list[str]:
+    with open(path) as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "".join(lines).split(";") if statement.strip()]
+
+
+def apply_migrations(conn) -> list[str]:
+    """
+    Apply every migration that isn't recorded in SchemaMigration yet and return
+    the versions that were applied. Each migration is recorded as soon as it has
+    run, so a failed run can be resumed.
+    """
+    db_cursor = conn.cursor()
+    db_cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS SchemaMigration (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    db_cursor.execute("SELECT version FROM SchemaMigration")
+    applied = {row[0] for row in db_cursor.fetchall()}
+
+    newly_applied = []
+    for version, path in migration_files():
+        if version in applied:
+            continue
+
+        for statement in read_statements(path):
+            db_cursor.execute(statement)
+        db_cursor.execute(
+            "INSERT INTO SchemaMigration (version) VALUES (%s)", (version,)
+        )
+        conn.commit()
+        newly_applied.append(version)
+
+    return newly_applied
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations from scripts/migrations."""
+    with pooled_connection() as conn:
+        applied = apply_migrations(conn)
+
+    if applied:
+        for version in applied:
+            print(f"Applied migration {version}")
+    else:
+        print("Schema is up to date, no migrations to apply!")
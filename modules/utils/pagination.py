@@ -0,0 +1,138 @@
+import base64
+import json
+from urllib.parse import urlencode
+from flask import jsonify, request
+from marshmallow import EXCLUDE, Schema, ValidationError, fields, validate
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# MySQL's way of saying "no limit" in a LIMIT clause.
+UNBOUNDED_LIMIT = 18446744073709551615
+
+
+class PaginationSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    limit = fields.Int(
+        load_default=DEFAULT_PAGE_SIZE,
+        validate=validate.Range(min=1, max=MAX_PAGE_SIZE),
+    )
+    cursor = fields.Str(load_default=None)
+    projection = fields.Str(data_key="fields", load_default=None)
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+    return values
+
+
+class Page:
+    """
+    A keyset page request parsed from the `limit`, `cursor` and `fields` query
+    parameters. Rows are ordered by `key_columns`, highest first when `descending`,
+    and `after` holds the key of the last row on the previous page (or None for
+    the first page).
+
+    Endpoints that returned every row before they were paginated pass
+    `paged_by_default=False`, so they only page when `limit` or `cursor` is sent.
+    """
+
+    def __init__(
+        self,
+        allowed_columns: list[str],
+        key_columns: list[str],
+        descending=False,
+        paged_by_default=True,
+    ):
+        args = PaginationSchema().load(request.args)
+
+        paged = paged_by_default or "limit" in request.args or "cursor" in request.args
+        self.limit: int | None = args["limit"] if paged else None
+        self.key_columns = key_columns
+        self.descending = descending
+        self.after = (
+            decode_cursor(args["cursor"], len(key_columns)) if args["cursor"] else None
+        )
+
+        if args["projection"]:
+            requested = [c.strip() for c in args["projection"].split(",") if c.strip()]
+            unknown = [c for c in requested if c not in allowed_columns]
+            if unknown:
+                raise ValidationError(
+                    {"fields": [f"Unknown fields: {', '.join(unknown)}"]}
+                )
+            self.columns = list(dict.fromkeys(requested))
+        else:
+            self.columns = list(allowed_columns)
+
+    def select_list(self, table_alias: str | None = None) -> str:
+        # The key columns are always selected since the next cursor is built from them.
+        prefix = f"{table_alias}." if table_alias else ""
+        columns = self.columns + [c for c in self.key_columns if c not in self.columns]
+        return ", ".join(f"{prefix}{c}" for c in columns)
+
+    def keyset_clause(self, table_alias: str | None = None) -> tuple[str, tuple]:
+        """A `(key) > (cursor)` condition (`<` when descending), or a no-op on the first page."""
+        if self.after is None:
+            return "1 = 1", ()
+
+        prefix = f"{table_alias}." if table_alias else ""
+        columns = ", ".join(f"{prefix}{c}" for c in self.key_columns)
+        placeholders = ", ".join(["%s"] * len(self.key_columns))
+        operator = "<" if self.descending else ">"
+        return f"({columns}) {operator} ({placeholders})", tuple(self.after)
+
+    def order_by(self, table_alias: str | None = None) -> str:
+        prefix = f"{table_alias}." if table_alias else ""
+        direction = " DESC" if self.descending else ""
+        return ", ".join(f"{prefix}{c}{direction}" for c in self.key_columns)
+
+    def fetch_limit(self) -> int:
+        if self.limit is None:
+            return UNBOUNDED_LIMIT
+        # One extra row tells us whether there is a next page.
+        return self.limit + 1
+
+    def response(self, rows: list[dict], trailing: list[dict] = ()):
+        """
+        Build the JSON response for a page of rows fetched with `fetch_limit()`.
+        The token for the next page is sent in the `X-Next-Cursor` header along
+        with a `Link: rel="next"` header. `trailing` rows (e.g. writes that aren't
+        in the table yet) are appended to the last page only.
+        """
+        has_next = self.limit is not None and len(rows) > self.limit
+        rows = rows[: self.limit]
+        if not has_next and trailing:
+            rows = rows + [{c: row.get(c) for c in self.columns} for row in trailing]
+
+        next_cursor = None
+        if has_next and rows:
+            next_cursor = encode_cursor([rows[-1][c] for c in self.key_columns])
+
+        hidden = [c for c in self.key_columns if c not in self.columns]
+        if hidden:
+            rows = [{k: v for k, v in row.items() if k not in hidden} for row in rows]
+
+        response = jsonify(rows)
+        if next_cursor:
+            args = request.args.to_dict()
+            args["cursor"] = next_cursor
+            response.headers["X-Next-Cursor"] = next_cursor
+            response.headers["Link"] = (
+                f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+            )
+        return response
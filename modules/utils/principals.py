@@ -0,0 +1,88 @@
+import os
+from modules.models.account import AccountType
+from modules.utils.cache import TTLCache
+from modules.utils.db import db
+from modules.utils.query_plans import register_query
+
+# account_id -> {"account_id", "student_id"} or {"account_id", "lecturer_id"}
+principal_cache = TTLCache(
+    max_size=int(os.getenv("PRINCIPAL_CACHE_SIZE") or 10000),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL") or 300),
+)
+
+# The queries resolving an account's student/lecturer ID.
+DETAILS_QUERIES = {
+    "student_id": "SELECT student_id FROM StudentDetails WHERE account_id = %s",
+    "lecturer_id": "SELECT lecturer_id FROM LecturerDetails WHERE account_id = %s",
+}
+
+register_query(
+    "principals.resolve_student",
+    DETAILS_QUERIES["student_id"],
+    "SELECT account_id FROM StudentDetails LIMIT 1",
+)
+register_query(
+    "principals.resolve_lecturer",
+    DETAILS_QUERIES["lecturer_id"],
+    "SELECT account_id FROM LecturerDetails LIMIT 1",
+)
+
+
+def _details_key(account_type: str) -> str | None:
+    if account_type == AccountType.Student.name:
+        return "student_id"
+    elif account_type == AccountType.Lecturer.name:
+        return "lecturer_id"
+    return None
+
+
+def peek_principal_details(session) -> dict | None:
+    """
+    Resolve the session's student/lecturer ID from the token claims or the cache,
+    without touching the database. Returns None when neither has it.
+    """
+    key = _details_key(session["account_type"])
+    if not key:
+        return None
+
+    if session.get(key) is not None:
+        return {"account_id": session["sub"], key: session[key]}
+
+    return principal_cache.get(session["sub"])
+
+
+def resolve_principal_details(session) -> dict | None:
+    """
+    Resolve the session's student/lecturer ID, falling back to a StudentDetails or
+    LecturerDetails lookup that is cached for subsequent requests.
+    """
+    details = peek_principal_details(session)
+    if details is not None:
+        return details
+
+    key = _details_key(session["account_type"])
+    if not key:
+        return None
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(DETAILS_QUERIES[key], (session["sub"],))
+    row = db_cursor.fetchone()
+    if not row:
+        return None
+
+    return cache_principal_details(session["sub"], **row)
+
+
+def cache_principal_details(account_id: int, student_id=None, lecturer_id=None) -> dict:
+    details = {"account_id": account_id}
+    if student_id is not None:
+        details["student_id"] = student_id
+    if lecturer_id is not None:
+        details["lecturer_id"] = lecturer_id
+
+    principal_cache.set(account_id, details)
+    return details
+
+
+def invalidate_principal(account_id: int):
+    principal_cache.delete(account_id)
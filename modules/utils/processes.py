@@ -0,0 +1,30 @@
+import os
+import uuid
+
+_instance = None
+_instance_pid = None
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process with this PID exists, even if it belongs to another user."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def process_instance() -> str:
+    """
+    A random ID for this process, new in every forked worker. A restarted
+    container often gets its old PID back, this tells the two apart.
+    """
+    global _instance, _instance_pid
+
+    pid = os.getpid()
+    if _instance_pid != pid:
+        _instance = uuid.uuid4().hex[:8]
+        _instance_pid = pid
+    return _instance
@@ -0,0 +1,93 @@
+from typing import Callable, NamedTuple
+import click
+from app import app
+from modules.utils.db import pooled_connection
+from modules.utils.pagination import DEFAULT_PAGE_SIZE, Page
+
+
+class RouteQuery(NamedTuple):
+    name: str
+    # The query the route runs, or the function the route builds it with for a page.
+    sql: str | Callable[[Page], str]
+    # Returns one row of realistic parameter values for the query from the dataset,
+    # in placeholder order. For a paged query that includes the cursor and limit.
+    sample_sql: str
+    # Builds the route's Page. The query is checked as it runs past the first page.
+    page: Callable[[], Page] | None = None
+
+
+ROUTE_QUERIES: list[RouteQuery] = []
+
+
+def register_query(
+    name: str,
+    sql: str | Callable[[Page], str],
+    sample_sql: str,
+    page: Callable[[], Page] | None = None,
+):
+    """
+    Register a query a route runs, so `check-query-plans` EXPLAINs it. Routes pass
+    the same SQL (or SQL builder) they execute, so the check can't drift from them.
+    """
+    ROUTE_QUERIES.append(RouteQuery(name, sql, sample_sql, page))
+
+
+def route_query_sql(query: RouteQuery) -> str:
+    """The SQL of a registered query, as the route runs it for a page past the first."""
+    if query.page is None:
+        return query.sql if isinstance(query.sql, str) else query.sql(None)
+
+    with app.test_request_context(query_string={"limit": DEFAULT_PAGE_SIZE}):
+        page = query.page()
+    # Any cursor makes the route emit its keyset condition.
+    page.after = [None] * len(page.key_columns)
+    return query.sql(page)
+
+
+def find_full_scans(conn, min_rows: int = 1000) -> list[str]:
+    """
+    EXPLAIN every registered route query and describe each plan step that reads a
+    whole table (`type = ALL`) of at least `min_rows` estimated rows. Derived tables
+    and queries whose sample returns nothing are skipped.
+    """
+    db_cursor = conn.cursor(dictionary=True)
+    problems = []
+
+    for query in ROUTE_QUERIES:
+        db_cursor.execute(query.sample_sql)
+        sample = db_cursor.fetchone()
+        if not sample:
+            print(f"Skipping {query.name}, no sample data")
+            continue
+
+        db_cursor.execute("EXPLAIN " + route_query_sql(query), tuple(sample.values()))
+        for step in db_cursor.fetchall():
+            table = step["table"] or ""
+            if step["type"] != "ALL" or table.startswith("<"):
+                continue
+            if (step["rows"] or 0) < min_rows:
+                continue
+            problems.append(
+                f"{query.name}: full scan of {table} (~{step['rows']} rows)"
+            )
+
+    return problems
+
+
+@app.cli.command("check-query-plans")
+@click.option(
+    "--min-rows",
+    default=1000,
+    show_default=True,
+    help="Ignore full scans of tables smaller than this.",
+)
+def check_query_plans_command(min_rows: int):
+    """Fail if any registered route query does a full table scan."""
+    with pooled_connection() as conn:
+        problems = find_full_scans(conn, min_rows)
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print(f"All {len(ROUTE_QUERIES)} route queries use an index!")
@@ -2,30 +2,49 @@ from functools import wraps
 from io import TextIOWrapper
 from json import JSONDecodeError
 import os
+import time
 from traceback import print_exception
 from typing import TypedDict
-from flask import jsonify, request
+from flask import g, jsonify, request
 from marshmallow import ValidationError
 from app import app
 import jwt
 
 from modules.models.account import AccountType
+from modules.utils.cache import TTLCache
+from modules.utils.db import discard_transaction
 
-class JWTPayload(TypedDict):
+# Recently verified token strings -> decoded payload.
+token_cache = TTLCache(
+    max_size=int(os.getenv("TOKEN_CACHE_SIZE") or 4096),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL") or 60),
+)
+
+
+class _JWTClaims(TypedDict):
     sub: int
     name: str
     email: str
     account_type: str
 
+
+class JWTPayload(_JWTClaims, total=False):
+    # The account's StudentDetails/LecturerDetails ID, signed in by /auth/login.
+    student_id: int
+    lecturer_id: int
+
 def handle_route(handler):
     try:
         return handler()
     except ValidationError as e:
+        discard_transaction()
         return jsonify(e.messages), 400
     except JSONDecodeError as e:
+        discard_transaction()
         return jsonify({"message": "Invalid JSON body"}), 400
     except Exception as e:
         print_exception(e)
+        discard_transaction()
         return (
             jsonify({"message": "Something went wrong!"}),
             500,
@@ -72,6 +91,13 @@ def fetch_session():
     if not app or not request:
         return None
 
+    # The token is only decoded once per request.
+    if "jwt_session" not in g:
+        g.jwt_session = _decode_session()
+    return g.jwt_session
+
+
+def _decode_session():
     auth_header = request.headers.get("Authorization")
     if not auth_header:
         return None
@@ -81,11 +107,24 @@ def fetch_session():
         if directive != "Bearer":
             return None
 
+        # Skip verification for tokens that were recently verified.
+        cached_token: JWTPayload | None = token_cache.get(token)
+        if cached_token is not None:
+            return cached_token
+
         decoded_token: JWTPayload = jwt.decode(
             token, app.config["JWT_SECRET"], algorithms=["HS256"]
         )
+
+        # Never keep a token in the cache past its expiry.
+        ttl = token_cache.ttl
+        if "exp" in decoded_token:
+            ttl = min(ttl, decoded_token["exp"] - time.time())
+        if ttl > 0:
+            token_cache.set(token, decoded_token, ttl)
+
         return decoded_token
-    except jwt.DecodeError:
+    except jwt.InvalidTokenError:
         return None
     except ValueError:
         return None
@@ -0,0 +1,109 @@
+import csv
+from datetime import date
+import io
+import os
+from typing import Iterable, Iterator
+from flask import Response, current_app, request, stream_with_context
+from werkzeug.utils import secure_filename
+
+# How many rows are pulled from the server per round trip while streaming.
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE") or 500)
+
+JSON_MIMETYPE = "application/json"
+CSV_MIMETYPE = "text/csv"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def iter_batches(db_cursor, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[list]:
+    """Fetch the cursor's result set in `fetchmany` batches until it is exhausted."""
+    while True:
+        rows = db_cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def json_array(batches: Iterable[list]) -> Iterator[str]:
+    """
+    Encode batches of rows as a single JSON array, one chunk per batch, so only
+    the current batch is ever held in memory.
+    """
+    yield "["
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = ",".join(current_app.json.dumps(row) for row in batch)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
+
+
+def ndjson_lines(batches: Iterable[list]) -> Iterator[str]:
+    """Encode batches of rows as newline delimited JSON, one chunk per batch."""
+    for batch in batches:
+        if batch:
+            yield "".join(current_app.json.dumps(row) + "\n" for row in batch)
+
+
+def _csv_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(batches: Iterable[list[dict]]) -> Iterator[str]:
+    """
+    Encode batches of dict rows as CSV, one chunk per batch. The header is taken
+    from the first row's keys.
+    """
+    buffer = io.StringIO()
+    writer = None
+    for batch in batches:
+        if not batch:
+            continue
+
+        if writer is None:
+            writer = csv.writer(buffer)
+            writer.writerow(batch[0].keys())
+        for row in batch:
+            writer.writerow([_csv_value(value) for value in row.values()])
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def negotiate_format() -> str:
+    """Pick the response mimetype from the request's Accept header, JSON by default."""
+    return request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, CSV_MIMETYPE, NDJSON_MIMETYPE], default=JSON_MIMETYPE
+    )
+
+
+def stream_json(batches: Iterable[list]) -> Response:
+    """
+    Stream batches of rows as a JSON array response. The request context, and with
+    it the request's database connection, stays alive until the last batch is sent.
+    """
+    return Response(
+        stream_with_context(json_array(batches)), mimetype=JSON_MIMETYPE
+    )
+
+
+def stream_rows(batches: Iterable[list[dict]], filename: str) -> Response:
+    """
+    Stream batches of rows as a JSON array, CSV or NDJSON, depending on what the
+    client accepts. CSV is sent as an attachment named `filename`.csv.
+    """
+    mimetype = negotiate_format()
+    if mimetype == CSV_MIMETYPE:
+        response = Response(stream_with_context(csv_lines(batches)), mimetype=mimetype)
+        response.headers["Content-Disposition"] = (
+            f'attachment; filename="{secure_filename(filename)}.csv"'
+        )
+        return response
+    elif mimetype == NDJSON_MIMETYPE:
+        return Response(stream_with_context(ndjson_lines(batches)), mimetype=mimetype)
+
+    return stream_json(batches)
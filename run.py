@@ -1,8 +1,21 @@
 from app import app
+from modules.routes.forums.forum_stream import start_reply_bridge
+from modules.routes.forums.reply_buffer import start_reply_buffer
+from modules.routes.report.report_tables import start_report_scheduler
+from modules.utils.db import seed_root_user
 import os
 
 # If file is called directly called, then run the app on the PORT provided defined in ENV or use '3000'.
 if __name__ == "__main__":
+    # Make sure the root user exists before serving requests.
+    seed_root_user()
+    # Keep the report summary tables fresh in the background.
+    start_report_scheduler()
+    # Feed the forum streams with replies posted through other processes, if enabled.
+    # Forked workers start their own with their first stream or reply.
+    start_reply_bridge()
+    # Replay journaled replies and start flushing new ones, if buffering is enabled.
+    start_reply_buffer()
     app.run(
         "0.0.0.0",
         port=int(os.getenv("PORT", 3000)),
@@ -1,11 +1,29 @@
-from functools import partial
-from faker import Faker
+"""
+Generate a dataset for the University database, either as SQL insert queries or
+as tab-separated files for bulk loading.
+
+Lecturers, the courses of each department and students are generated in
+independent shards across a pool of processes. Every shard is seeded from --seed
+and its index, so the output only depends on --scale and --seed, not on the
+number of workers. Emails and contact numbers are derived from the account ID,
+so they are unique without any coordination between workers. Rows are streamed
+to disk as they are generated.
+
+    python scripts/gen_sql.py --scale 10 --seed 42 --workers 8
+    python scripts/gen_sql.py --format tsv --output-dir scripts/dataset
+"""
+
+import argparse
+import multiprocessing
+import os
 import random
-from collections import defaultdict
-import sys, time, multiprocessing
-
-# Initialize Faker generator
-fake = Faker()
+import re
+import shutil
+import string
+import sys
+import tempfile
+import time
+from faker import Faker
 
 # Define departments and their potential course themes or titles
 department_courses = {
@@ -130,296 +148,432 @@ department_courses = {
         "Game Theory",
     ],
 }
-print("Department courses defined")
 
-
-# Generate a unique course code
-def generate_course_code(prefix, number):
-    return f"{prefix}{number:03}"
+def unique_prefixes(departments) -> dict[str, str]:
+    """
+    Map each department to a two letter course code prefix. Departments sharing
+    their first two letters fall back to a later second letter, so no two
+    departments ever draw from the same course codes.
+    """
+    prefixes = {}
+    for dept in departments:
+        letters = [c for c in dept.upper() if c.isalpha()]
+        candidates = [letters[0] + second for second in letters[1:]]
+        prefixes[dept] = next(p for p in candidates if p not in prefixes.values())
+    return prefixes
 
 
 # Map departments to prefixes
-department_prefixes = {dept: dept[:2].upper() for dept in department_courses.keys()}
+department_prefixes = unique_prefixes(department_courses.keys())
 
-# Generate courses with adjustments - This section remains unchanged
-course_examples = []
-lecturer_course_counts = {i: 0 for i in range(1, 51)}
+# At scale 1 the dataset has 100k students, 50 lecturers and 200 courses.
+BASE_STUDENTS = 100000
+BASE_LECTURERS = 50
+BASE_COURSES = 200
 
+# Lecturers and students are generated in shards of this size, whatever the number of workers.
+SHARD_SIZE = 20000
 
-def gen_available_lecturer_id():
-    id = random.randint(1, 50)
-    while lecturer_course_counts[id] >= 5:
-        id = random.randint(1, 50)
-    lecturer_course_counts[id] += 1
-    return id
+# How many distinct first and last names each shard draws names from.
+NAME_POOL_SIZE = 1000
 
+EMAIL_DOMAINS = ["example.com", "example.org", "example.net", "uni.example.edu"]
 
-for _ in range(200):
-    dept = random.choice(list(department_courses.keys()))
-    prefix = department_prefixes[dept]
-    course_number = random.randint(100, 999)
-    course_code = generate_course_code(prefix, course_number)
-    while any(course[0] == course_code for course in course_examples):
-        course_number = random.randint(100, 999)
-        course_code = generate_course_code(prefix, course_number)
-    course_theme = random.choice(department_courses[dept])
-    course_name = course_theme
-    semester = random.randint(1, 2)
-    lecturer_id = gen_available_lecturer_id()
-    course_examples.append((course_code, course_name, lecturer_id, semester))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+INIT_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "init.sql")
 
-# Ensure only unique course codes
-course_examples = list(set(course_examples))
-print("Course examples generated")
+# The generated tables, in the order they have to be loaded.
+TABLE_COLUMNS = {
+    "Account": ("account_id", "email", "password", "account_type", "contact_info", "name"),
+    "LecturerDetails": ("lecturer_id", "account_id", "department"),
+    "StudentDetails": ("student_id", "account_id", "gpa", "major"),
+    "Course": ("course_code", "course_name", "lecturer_id", "semester"),
+    "Enrollment": ("student_id", "course_code"),
+}
 
 
-# Account creation adjusted for unique contact info
-num_lecturers = 50
-num_students = 100000  # Total number of students
-accounts = []
-account_details = []
+def sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+    return str(value)
 
 
-# Helper function to generate unique contact numbers
-def generate_unique_contact(start_sequence, total):
-    return [f"{start_sequence}{str(i).zfill(7)}" for i in range(total)]
+# Characters LOAD DATA expects to be escaped with a backslash.
+TSV_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"}
+)
 
 
-# Generate unique contact numbers for both lecturers and students
-unique_contacts = generate_unique_contact(876, num_lecturers + num_students)
-print("Unique contact numbers generated")
+def tsv_field(value) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(TSV_ESCAPES)
 
-# Initialize a set to track unique emails
-unique_emails = set()
 
+class InsertWriter:
+    """Write rows as multi-row INSERT statements of at most `batch_size` rows."""
 
-def calculate_eta(start_time, total_items, items_processed):
-    """Calculate the estimated time of arrival (completion)."""
-    current_time = time.time()
-    time_elapsed = current_time - start_time
-    items_per_second = items_processed / time_elapsed if time_elapsed > 0 else 0
-    items_remaining = total_items - items_processed
-    estimated_time_remaining = (
-        items_remaining / items_per_second if items_per_second > 0 else float("inf")
-    )
-    return estimated_time_remaining
+    extension = "sql"
 
+    def __init__(self, f, table: str, batch_size: int):
+        self.f = f
+        self.statement = f"INSERT INTO {table} ({', '.join(TABLE_COLUMNS[table])}) VALUES\n"
+        self.batch_size = batch_size
+        self.pending = 0
 
-def create_lecturer(i, eta_start_time):
-    sys.stdout.write(
-        f"\rCreating lecturer accounts: {i}/{num_lecturers} | ETA: {calculate_eta(eta_start_time, num_lecturers, i):.2f} seconds"
-    )
-    sys.stdout.flush()
-
-    email = fake.unique.email()  # Using Faker's unique provider
-    while email in unique_emails:  # Ensure email is unique
-        email = fake.unique.email()
-    unique_emails.add(email)  # Add the new unique email to the set
-
-    dept = random.choice(list(department_courses.keys()))
-    password = fake.password()
-    return {
-        "account_id": i,
-        "email": email,
-        "password": password,
-        "account_type": "Lecturer",
-        "contact_info": unique_contacts[i - 1],  # Adjusted index for unique contacts
-        "name": fake.name(),
-        "department": dept,
-    }, {
-        "account_id": i,
-        "password": password,
-    }
-
-
-# Create lecturer accounts
-start_time = time.time()
-for i in range(1, num_lecturers + 1):
-    lecturer, details = create_lecturer(i, start_time)
-    accounts.append(lecturer)
-    account_details.append(details)
-
-print("\nLecturer accounts created")
-
-
-def create_student(i, eta_start_time):
-    sys.stdout.write(
-        f"\rCreating student accounts: {i}/{num_students} | ETA: {calculate_eta(eta_start_time, num_students, i):.2f} seconds"
-    )
-    sys.stdout.flush()
-    email = fake.unique.email()
-    while email in unique_emails:
-        email = fake.unique.email()
-    unique_emails.add(email)
-
-    major = random.choice(list(department_courses.keys()))
-    gpa = round(random.uniform(0, 4.33), 2)
-    password = fake.password()
-    return {
-        "account_id": i,
-        "email": email,
-        "password": password,
-        "account_type": "Student",
-        "contact_info": unique_contacts[
-            i - 1
-        ],  # Assuming unique_contacts is correctly indexed
-        "name": fake.name(),
-        "major": major,
-        "gpa": gpa,
-    }, {
-        "account_id": i,
-        "password": password,
-    }
-
-
-# Use multithreading to create student accounts
-# thread_pool = multiprocessing.Pool(16)
-# with thread_pool as executor:
-#     start_time = time.time()
-#     f = partial(create_student, eta_start_time=start_time)
-#     for student, details in executor.map(
-#         f,
-#         range(num_lecturers + 1, num_lecturers + num_students + 1),
-#     ):
-#         accounts.append(student)
-#         account_details.append(details)
-
-# Create student accounts
-start_time = time.time()
-for i in range(num_lecturers + 1, num_lecturers + num_students + 1):
-    student, details = create_student(i, start_time)
-    accounts.append(student)
-    account_details.append(details)
-
-print("\nStudent accounts created")
-
-
-num_courses = max(200, num_lecturers)  # Ensure at least as many courses as lecturers
-
-# Initialize lecturer assignments
-lecturer_courses = defaultdict(list)
-
-# Assign courses to lecturers ensuring constraints are met
-for course_code, course_name, _, _ in course_examples:
-    # Randomly select a lecturer to assign
-    lecturer_id = random.randint(1, num_lecturers)
-
-    # Ensure no lecturer is assigned more than 5 courses
-    while len(lecturer_courses[lecturer_id]) >= 5:
-        lecturer_id = random.randint(1, num_lecturers)
-
-    lecturer_courses[lecturer_id].append(course_code)
-
-# Ensure each lecturer teaches at least 1 course
-lecturers_without_courses = set(range(1, num_lecturers + 1)) - set(
-    lecturer_courses.keys()
-)
-for lecturer_id in lecturers_without_courses:
-    course_to_assign = random.choice(list(lecturer_courses.keys()))
-    lecturer_courses[lecturer_id].append(lecturer_courses[course_to_assign].pop())
-
-print("Lecturer courses assigned")
-
-# Initialize student enrollments
-student_enrollments = defaultdict(list)
-
-# List of all course codes
-all_course_codes = [code for code, _, _, _ in course_examples]
-
-# Populate student enrollments
-student_id = 1  # Start from 1 for enrollment
-for acc in accounts:
-    if acc["account_type"] == "Student":
-        courses_to_enroll = random.sample(all_course_codes, random.randint(3, 6))
-        student_enrollments[student_id].extend(courses_to_enroll)
-        student_id += 1  # Increment student_id for the next student
-
-print("Student enrollments populated")
-
-# Ensure each course has at least 10 students
-course_memberships = defaultdict(list)
-for student_id, courses in student_enrollments.items():
-    for course_code in courses:
-        course_memberships[course_code].append(student_id)
-
-print("Course memberships populated")
-
-for course_code in all_course_codes:
-    while len(course_memberships[course_code]) < 10:
-        # Randomly select a student to enroll, ensuring they're not already in the course
-        # and do not exceed the 6-course limit
-        student_id = random.randint(num_lecturers + 1, num_lecturers + num_students + 1)
-        if (
-            len(student_enrollments[student_id]) < 6
-            and course_code not in student_enrollments[student_id]
-        ):
-            student_enrollments[student_id].append(course_code)
-            course_memberships[course_code].append(student_id)
-
-print("Course memberships adjusted")
-
-print("Generating SQL insert queries")
-with open("scripts/insert_queries.sql", "w") as f:
-    # Insert into Account
-    f.write(
-        "INSERT INTO Account (account_id, email, password, account_type, contact_info, name) VALUES\n"
-    )
-    account_values = [
-        f"({acc['account_id']}, '{acc['email']}', '{acc['password']}', '{acc['account_type']}', '{acc['contact_info']}', '{acc['name']}')"
-        for acc in accounts
-    ]
-    f.write(",\n".join(account_values))
-    f.write(";\n\n")
-
-    # Insert into LecturerDetails
-    lecturer_values = [
-        f"({lecturer['account_id']}, '{lecturer['department']}')"
-        for lecturer in accounts
-        if lecturer["account_type"] == "Lecturer"
-    ]
-    f.write(
-        "INSERT INTO LecturerDetails (account_id, department) VALUES\n"
-        + ",\n".join(lecturer_values)
-        + ";\n\n"
-    )
+    def write(self, row: tuple):
+        self.f.write(self.statement if self.pending == 0 else ",\n")
+        self.f.write("(" + ", ".join(sql_literal(value) for value in row) + ")")
+        self.pending += 1
+        if self.pending == self.batch_size:
+            self.close()
 
-    # Writing student details insertions to SQL file
-    f.write("INSERT INTO StudentDetails (account_id, gpa, major) VALUES\n")
+    def close(self):
+        if self.pending:
+            self.f.write(";\n")
+            self.pending = 0
 
-    # Generate INSERT statements for StudentDetails
-    student_details_values = []
-    for acc in accounts:
-        if acc["account_type"] == "Student":
-            # Use separate student_id and increment it for each student
-            student_details_values.append(
-                f"({acc['account_id']}, {acc['gpa']}, '{acc['major']}')"
-            )
 
-    f.write(",\n".join(student_details_values))
-    f.write(";\n\n")
+class TsvWriter:
+    """Write rows as tab-separated lines in the format LOAD DATA reads by default."""
 
-    # Insert into Course
-    f.write(
-        "INSERT INTO Course (course_code, course_name, lecturer_id, semester) VALUES\n"
-    )
-    course_values = [
-        f'("{course[0]}", "{course[1]}", {course[2]}, {course[3]})'
-        for course in course_examples
-    ]
-    f.write(",\n".join(course_values))
-    f.write(";\n\n")
+    extension = "tsv"
 
-    # Writing enrollment insertions to SQL file
-    f.write("INSERT INTO Enrollment (student_id, course_code) VALUES\n")
+    def __init__(self, f, table: str, batch_size: int):
+        self.f = f
 
-    enrollment_values = [
-        f'({student_id}, "{course_code}")'  # Reference updated student_id starting from 1
-        for student_id, course_codes in student_enrollments.items()
-        for course_code in course_codes
-    ]
+    def write(self, row: tuple):
+        self.f.write("\t".join(tsv_field(value) for value in row) + "\n")
+
+    def close(self):
+        pass
+
+
+WRITERS = {"sql": InsertWriter, "tsv": TsvWriter}
+
+
+def contact_for(account_id: int) -> str:
+    # Contact numbers are derived from the account ID, so they are unique by construction.
+    return f"876{account_id:07}"
+
+
+def random_password(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=12))
 
-    f.write(",\n".join(enrollment_values))
-    f.write(";\n")
 
+class NamePool:
+    """
+    A pool of Faker names to combine at random. Calling Faker for every row is by
+    far the slowest part of generating a large dataset.
+    """
+
+    def __init__(self, seed: int):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(NAME_POOL_SIZE)]
+        self.last_names = [fake.last_name() for _ in range(NAME_POOL_SIZE)]
+
+    def person(self, rng: random.Random, account_id: int) -> tuple[str, str]:
+        """
+        Pick a random name and an email address based on it. Names never contain
+        digits, so ending the address with the account ID makes it unique
+        without checking it against any other worker's.
+        """
+        first = rng.choice(self.first_names)
+        last = rng.choice(self.last_names)
+        local = "".join(c for c in f"{first}.{last}".lower() if c.isascii() and (c.isalpha() or c == "."))
+        email = f"{local}{account_id}@{rng.choice(EMAIL_DOMAINS)}"
+        return f"{first} {last}", email
+
+
+def shard_ranges(count: int, shard_size: int = SHARD_SIZE):
+    """Split the IDs 1..count into `(shard, first_id, last_id)` ranges."""
+    for shard, first_id in enumerate(range(1, count + 1, shard_size)):
+        yield shard, first_id, min(first_id + shard_size - 1, count)
+
+
+def course_catalog(seed: int, num_courses: int) -> dict[str, list[str]]:
+    """
+    Pick the course codes of every department. Course `i` of the catalog belongs
+    to department `i % len(departments)`, and codes are unique because every
+    department has its own prefix.
+    """
+    departments = list(department_courses.keys())
+    counts = [len(range(i, num_courses, len(departments))) for i in range(len(departments))]
+    # Course numbers are 3 digits while they last, then 4 digits.
+    upper = 1000 if max(counts) <= 900 else 10000
+    if max(counts) > upper - 100:
+        raise ValueError(f"Can't generate {num_courses} unique course codes!")
+
+    catalog = {}
+    for dept, count in zip(departments, counts):
+        rng = random.Random(f"{seed}-codes-{dept}")
+        numbers = rng.sample(range(100, upper), count)
+        catalog[dept] = [f"{department_prefixes[dept]}{number:03}" for number in numbers]
+    return catalog
+
+
+class ShardWriter:
+    """Open one writer per table for a shard, in files named `<table>-<shard>.<ext>`."""
+
+    def __init__(self, work_dir: str, shard: str, tables, output_format: str, batch_size: int):
+        Writer = WRITERS[output_format]
+        self.paths = {
+            table: os.path.join(work_dir, f"{table}-{shard}.{Writer.extension}")
+            for table in tables
+        }
+        self.files = {table: open(path, "w") for table, path in self.paths.items()}
+        self.writers = {
+            table: Writer(f, table, batch_size) for table, f in self.files.items()
+        }
+
+    def __getitem__(self, table: str):
+        return self.writers[table]
+
+    def close(self) -> dict[str, str]:
+        for table, writer in self.writers.items():
+            writer.close()
+            self.files[table].close()
+        return self.paths
+
+
+def generate_lecturer_shard(shard, first_lecturer, last_lecturer, seed, work_dir, output_format, batch_size):
+    rng = random.Random(f"{seed}-lecturers-{shard}")
+    names = NamePool(rng.randrange(2**32))
+    departments = list(department_courses.keys())
+
+    out = ShardWriter(
+        work_dir, f"lecturers-{shard:05}", ("Account", "LecturerDetails"), output_format, batch_size
+    )
+    for lecturer_id in range(first_lecturer, last_lecturer + 1):
+        # Lecturers take the first account IDs.
+        account_id = lecturer_id
+        name, email = names.person(rng, account_id)
+        out["Account"].write(
+            (account_id, email, random_password(rng), "Lecturer", contact_for(account_id), name)
+        )
+        out["LecturerDetails"].write((lecturer_id, account_id, rng.choice(departments)))
+    return out.close()
+
+
+def generate_department_courses(dept, course_codes, num_lecturers, seed, work_dir, output_format, batch_size):
+    """
+    Generate the courses of one department. Lecturers are assigned round-robin
+    over the whole catalog, so each lecturer teaches at least one course.
+    """
+    rng = random.Random(f"{seed}-courses-{dept}")
+    departments = list(department_courses.keys())
+    dept_index = departments.index(dept)
+
+    out = ShardWriter(
+        work_dir, f"courses-{department_prefixes[dept]}", ("Course",), output_format, batch_size
+    )
+    for i, course_code in enumerate(course_codes):
+        catalog_index = dept_index + i * len(departments)
+        lecturer_id = catalog_index % num_lecturers + 1
+        course_name = rng.choice(department_courses[dept])
+        out["Course"].write((course_code, course_name, lecturer_id, rng.randint(1, 2)))
+    return out.close()
+
+
+def generate_student_shard(shard, first_student, last_student, num_lecturers, course_codes, seed, work_dir, output_format, batch_size):
+    rng = random.Random(f"{seed}-students-{shard}")
+    names = NamePool(rng.randrange(2**32))
+    majors = list(department_courses.keys())
+
+    out = ShardWriter(
+        work_dir,
+        f"students-{shard:05}",
+        ("Account", "StudentDetails", "Enrollment"),
+        output_format,
+        batch_size,
+    )
+    for student_id in range(first_student, last_student + 1):
+        account_id = num_lecturers + student_id
+        name, email = names.person(rng, account_id)
+        out["Account"].write(
+            (account_id, email, random_password(rng), "Student", contact_for(account_id), name)
+        )
+        gpa = round(rng.uniform(0, 4.33), 2)
+        out["StudentDetails"].write((student_id, account_id, gpa, rng.choice(majors)))
+
+        # The first course is picked round-robin, so every course gets students.
+        num_enrollments = min(rng.randint(3, 6), len(course_codes))
+        first_course = course_codes[student_id % len(course_codes)]
+        others = rng.sample(course_codes, num_enrollments)
+        enrolled = [first_course] + [c for c in others if c != first_course]
+        for course_code in enrolled[:num_enrollments]:
+            out["Enrollment"].write((student_id, course_code))
+    return out.close()
+
+
+def run_task(task):
+    function, args = task
+    return function(*args)
+
+
+def index_statements() -> list[tuple[str, str, str]]:
+    """The `(index, table, statement)` of every secondary index the migrations create."""
+    indexes = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not file_name.endswith(".sql"):
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, file_name)) as f:
+            lines = [line for line in f if not line.lstrip().startswith("--")]
+        for statement in "".join(lines).split(";"):
+            statement = statement.strip()
+            match = re.match(r"CREATE INDEX IF NOT EXISTS (\w+) ON (\w+)", statement)
+            if match and match.group(2) in TABLE_COLUMNS:
+                indexes.append((match.group(1), match.group(2), statement))
+    return indexes
+
+
+def foreign_key_columns() -> dict[str, set[str]]:
+    """The columns of each table in init.sql that reference another table."""
+    with open(INIT_SQL) as f:
+        schema = f.read()
+    columns = {}
+    for table, body in re.findall(r"CREATE TABLE (\w+) \((.*?)\);", schema, re.DOTALL):
+        columns[table] = set(re.findall(r"FOREIGN KEY \((\w+)\)", body))
+    return columns
+
+
+def droppable_indexes() -> list[tuple[str, str, str]]:
+    """
+    The secondary indexes load.sql can drop while loading. An index leading with
+    a foreign key column may be the only one backing the constraint (InnoDB drops
+    its implicit index once another one covers the column), and dropping it fails
+    even with foreign_key_checks off, so those are kept.
+    """
+    foreign_keys = foreign_key_columns()
+    indexes = []
+    for index, table, statement in index_statements():
+        leading_column = re.search(r"\((\w+)", statement).group(1)
+        if leading_column not in foreign_keys.get(table, ()):
+            indexes.append((index, table, statement))
+    return indexes
+
+
+def write_load_script(output_dir: str, table_files: dict[str, list[str]]):
+    """
+    Write load.sql, which bulk loads the tab-separated files with the droppable
+    secondary indexes dropped and builds them once all rows are in.
+    """
+    indexes = droppable_indexes()
+    with open(os.path.join(output_dir, "load.sql"), "w") as f:
+        f.write(
+            "-- Generated by scripts/gen_sql.py. Load it with `flask --app app load-dataset <this directory>`,\n"
+            "-- or from this directory with `mysql --local-infile=1 University < load.sql`.\n\n"
+        )
+        f.write("SET foreign_key_checks = 0;\nSET unique_checks = 0;\n\n")
+        for index, table, _ in indexes:
+            f.write(f"DROP INDEX IF EXISTS {index} ON {table};\n")
+        f.write("\n")
+        for table, columns in TABLE_COLUMNS.items():
+            for path in table_files[table]:
+                f.write(
+                    f"LOAD DATA LOCAL INFILE '{os.path.basename(path)}' INTO TABLE {table}\n"
+                    f"    FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'\n"
+                    f"    ({', '.join(columns)});\n"
+                )
+        f.write("\nSET unique_checks = 1;\nSET foreign_key_checks = 1;\n\n")
+        for _, _, statement in indexes:
+            f.write(statement + ";\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Dataset size relative to 100k students, 50 lecturers and 200 courses.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for reproducible output.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes generating the dataset (defaults to the number of CPUs).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(WRITERS),
+        default="sql",
+        help="sql writes INSERT statements to --output, tsv writes tab-separated files and load.sql to --output-dir.",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Rows per INSERT statement."
+    )
+    parser.add_argument("--output", default="scripts/insert_queries.sql")
+    parser.add_argument("--output-dir", default="scripts/dataset")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    num_students = max(1, int(BASE_STUDENTS * args.scale))
+    num_lecturers = max(1, int(BASE_LECTURERS * args.scale))
+    num_courses = max(num_lecturers, int(BASE_COURSES * args.scale))
+
+    catalog = course_catalog(args.seed, num_courses)
+    course_codes = [code for codes in catalog.values() for code in codes]
+
+    # TSV shards are written straight to the output directory and loaded from
+    # there, SQL shards are concatenated into the output file at the end.
+    if args.format == "tsv":
+        os.makedirs(args.output_dir, exist_ok=True)
+        for file_name in os.listdir(args.output_dir):
+            if file_name.endswith(".tsv") and file_name.split("-")[0] in TABLE_COLUMNS:
+                os.remove(os.path.join(args.output_dir, file_name))
+        work_dir = args.output_dir
+    else:
+        work_dir = tempfile.mkdtemp(
+            prefix="gen_sql-", dir=os.path.dirname(os.path.abspath(args.output))
+        )
+
+    options = (args.seed, work_dir, args.format, args.batch_size)
+    tasks = [
+        (generate_lecturer_shard, (shard, first, last) + options)
+        for shard, first, last in shard_ranges(num_lecturers)
+    ]
+    tasks += [
+        (generate_department_courses, (dept, codes, num_lecturers) + options)
+        for dept, codes in catalog.items()
+        if codes
+    ]
+    tasks += [
+        (generate_student_shard, (shard, first, last, num_lecturers, course_codes) + options)
+        for shard, first, last in shard_ranges(num_students)
+    ]
 
-print("SQL insert queries generated and saved to 'insert_queries.sql'")
+    try:
+        # Every table's files are listed in task order, which is also ID order.
+        table_files = {table: [] for table in TABLE_COLUMNS}
+        with multiprocessing.Pool(max(1, args.workers)) as pool:
+            for done, paths in enumerate(pool.imap(run_task, tasks), start=1):
+                for table, path in paths.items():
+                    table_files[table].append(path)
+                sys.stdout.write(f"\rGenerating: {done}/{len(tasks)} shards")
+                sys.stdout.flush()
+        print(f"\n{num_lecturers} lecturers, {len(course_codes)} courses and {num_students} students generated")
+
+        if args.format == "tsv":
+            write_load_script(args.output_dir, table_files)
+            destination = args.output_dir
+        else:
+            with open(args.output, "w") as output:
+                for table in TABLE_COLUMNS:
+                    for path in table_files[table]:
+                        with open(path) as f:
+                            shutil.copyfileobj(f, output)
+            destination = args.output
+    finally:
+        if args.format != "tsv":
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Dataset saved to '{destination}' in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+-- Secondary indexes for the filters the routes actually run.
+-- Applied with `flask --app app migrate` on top of a database built from init.sql.
+
+-- Course members, per-course reports and access checks look enrollments up by course.
+-- The primary key (student_id, course_code) only helps lookups by student.
+CREATE INDEX IF NOT EXISTS idx_enrollment_course_student ON Enrollment (course_code, student_id);
+
+-- Admin/lecturer/student listings and reports filter accounts by type.
+CREATE INDEX IF NOT EXISTS idx_account_type ON Account (account_type);
+
+-- Courses taught by a lecturer, paged on course_code.
+CREATE INDEX IF NOT EXISTS idx_course_lecturer_code ON Course (lecturer_id, course_code);
+
+-- Calendar events for a course within a date range.
+CREATE INDEX IF NOT EXISTS idx_calendar_event_course_date ON CalendarEvent (course_id, date);
+
+-- Assignments for a course, by deadline.
+CREATE INDEX IF NOT EXISTS idx_assignment_course_deadline ON Assignment (course_code, deadline);
+
+-- Forums for a course, threads for a forum and replies for a thread, in posting order.
+CREATE INDEX IF NOT EXISTS idx_discussion_forum_course_time ON DiscussionForum (course_code, post_time);
+CREATE INDEX IF NOT EXISTS idx_discussion_thread_forum_time ON DiscussionThread (forum_id, timeStamp);
+CREATE INDEX IF NOT EXISTS idx_discussion_reply_thread_time ON DiscussionReply (thread_id, reply_time);
@@ -0,0 +1,28 @@
+-- Summary tables the reports that aren't backed by counters read from, refreshed by `flask --app app refresh-reports`
+-- or the report scheduler instead of being recomputed on every request.
+
+CREATE TABLE IF NOT EXISTS ReportLecturerLoad (
+    lecturer_id INT PRIMARY KEY,
+    course_count INT NOT NULL,
+    INDEX idx_report_lecturer_load_count (course_count)
+);
+
+CREATE TABLE IF NOT EXISTS ReportStudentRank (
+    student_id INT PRIMARY KEY,
+    gpa DECIMAL(3, 2),
+    `rank` INT NOT NULL,
+    INDEX idx_report_student_rank (`rank`)
+);
+
+-- When each report was last generated
+CREATE TABLE IF NOT EXISTS ReportSnapshot (
+    report_name VARCHAR(64) PRIMARY KEY,
+    generated_at DATETIME NOT NULL
+);
+
+-- The views the report endpoints used to recreate on every request
+DROP VIEW IF EXISTS Courses_With_50_Or_More_Students;
+DROP VIEW IF EXISTS Students_Taking_5_Or_More_Courses;
+DROP VIEW IF EXISTS Lecturers_Teaching_3_Or_More_Courses;
+DROP VIEW IF EXISTS Top_10_Enrolled_Courses;
+DROP VIEW IF EXISTS Student_Rank;
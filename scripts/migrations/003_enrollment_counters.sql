@@ -0,0 +1,20 @@
+-- Denormalized enrollment counters, kept up to date by the register/deregister routes
+-- and checked with `flask --app app reconcile-counters`.
+
+ALTER TABLE Course ADD COLUMN IF NOT EXISTS enrollment_count INT NOT NULL DEFAULT 0;
+ALTER TABLE StudentDetails ADD COLUMN IF NOT EXISTS course_count INT NOT NULL DEFAULT 0;
+
+UPDATE Course c
+SET c.enrollment_count = (
+    SELECT COUNT(*) FROM Enrollment e WHERE e.course_code = c.course_code
+);
+
+UPDATE StudentDetails s
+SET s.course_count = (
+    SELECT COUNT(*) FROM Enrollment e WHERE e.student_id = s.student_id
+);
+
+-- The enrollment reports are range scans on the counters
+CREATE INDEX IF NOT EXISTS idx_course_enrollment_count ON Course (enrollment_count);
+CREATE INDEX IF NOT EXISTS idx_student_course_count ON StudentDetails (course_count);
+
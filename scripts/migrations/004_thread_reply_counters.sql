@@ -0,0 +1,7 @@
+-- DiscussionThread.replies is now kept up to date by the reply route and checked
+-- with `flask --app app reconcile-counters`. Backfill it for existing threads.
+
+UPDATE DiscussionThread t
+SET t.replies = (
+    SELECT COUNT(*) FROM DiscussionReply r WHERE r.thread_id = t.thread_id
+);
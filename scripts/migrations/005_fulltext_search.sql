@@ -0,0 +1,6 @@
+-- Inverted indexes behind GET /course/<course_code>/search. InnoDB keeps them up to
+-- date as rows are inserted, updated and deleted.
+
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_discussion_reply_text ON DiscussionReply (reply_text);
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_section_item_text ON SectionItems (title, description);
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_assignment_text ON Assignment (title, description);
@@ -0,0 +1,5 @@
+-- Buffered replies are written with the client ID they were acknowledged with, so a
+-- journal replayed after a crash never inserts the same reply twice.
+
+ALTER TABLE DiscussionReply ADD COLUMN IF NOT EXISTS client_id CHAR(36) NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_discussion_reply_client ON DiscussionReply (client_id);
@@ -0,0 +1,9 @@
+import pytest
+from modules.utils.db import close_thread_db
+
+
+@pytest.fixture(scope="session", autouse=True)
+def release_thread_db():
+    yield
+    # The tests use `db` outside of a request, give its connection back to the pool.
+    close_thread_db()
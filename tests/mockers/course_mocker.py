@@ -318,6 +318,14 @@ class CourseMocker:
             "INSERT INTO Enrollment (course_code, student_id) VALUES (%s, %s)",
             (mock_course["course_code"], mock_student["student_id"]),
         )
+        db_cursor.execute(
+            "UPDATE Course SET enrollment_count = enrollment_count + 1 WHERE course_code = %s",
+            (mock_course["course_code"],),
+        )
+        db_cursor.execute(
+            "UPDATE StudentDetails SET course_count = course_count + 1 WHERE student_id = %s",
+            (mock_student["student_id"],),
+        )
         db.commit()
 
     @staticmethod
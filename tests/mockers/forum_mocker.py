@@ -92,6 +92,7 @@ class ForumMocker:
     ) -> MockDiscussionThread:
         db_cursor = db.cursor(dictionary=True)
         mock_thread = ForumMocker().mock_discussion_thread(mock_forum["forum_id"])
+        mock_thread["replies"] = 0
         db_cursor.execute(
             "INSERT INTO DiscussionThread (replies, timeStamp, forum_id) VALUES (%s, %s, %s)",
             (
@@ -103,7 +104,6 @@ class ForumMocker:
         db.commit()
         mock_thread_id = db_cursor.lastrowid
         mock_thread["thread_id"] = mock_thread_id
-        mock_thread["replies"] = 0
         return mock_thread
 
     @staticmethod
@@ -124,6 +124,10 @@ class ForumMocker:
                 mock_reply["reply_text"],
             ),
         )
+        db_cursor.execute(
+            "UPDATE DiscussionThread SET replies = replies + 1 WHERE thread_id = %s",
+            (mock_thread["thread_id"],),
+        )
         db.commit()
         mock_reply_id = db_cursor.lastrowid
         mock_reply["reply_id"] = mock_reply_id
@@ -1,5 +1,10 @@
 from app import app
+from modules.utils import route_utils
 from modules.utils.db import db
+from modules.utils.route_utils import fetch_session, token_cache
+import jwt
+import os
+import time
 from tests import utils
 from tests.mockers.account_mocker import AccountMocker
 
@@ -69,3 +74,93 @@ def test_login():
             (mock_student["mock_account"]["email"],),
         )
         db.commit()
+
+
+def test_login_token_has_student_id():
+    db_cursor = db.cursor(dictionary=True)
+    mock_student = account_mocker.insert_mock_student()
+
+    body = {
+        "user_id": mock_student["mock_account"]["email"],
+        "password": mock_student["mock_account"]["password"],
+    }
+
+    try:
+        response = test_client.post("/auth/login", json=body)
+
+        assert response.status_code == 200
+
+        claims = jwt.decode(
+            utils.response_json(response)["token"],
+            os.getenv("JWT_SECRET"),
+            algorithms=["HS256"],
+        )
+
+        assert claims["sub"] == mock_student["account_id"]
+        assert claims["student_id"] == mock_student["student_id"]
+        assert "lecturer_id" not in claims
+    finally:
+        # Delete the user
+        db_cursor.execute(
+            "DELETE FROM Account WHERE email = %s",
+            (mock_student["mock_account"]["email"],),
+        )
+        db.commit()
+
+
+def _count_decodes(monkeypatch) -> list:
+    decodes = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decodes.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(route_utils.jwt, "decode", counting_decode)
+    return decodes
+
+
+def test_token_decoded_once_per_request(monkeypatch):
+    decodes = _count_decodes(monkeypatch)
+    token_cache.clear()
+
+    with app.test_request_context(headers={"Authorization": f"Bearer {admin_token}"}):
+        assert fetch_session()["sub"] == 1
+        assert fetch_session() is fetch_session()
+    assert decodes == [admin_token]
+
+
+def test_cached_token_reused_across_requests(monkeypatch):
+    decodes = _count_decodes(monkeypatch)
+    token_cache.clear()
+
+    for _ in range(2):
+        with app.test_request_context(
+            headers={"Authorization": f"Bearer {admin_token}"}
+        ):
+            assert fetch_session()["sub"] == 1
+    assert decodes == [admin_token]
+
+
+def test_cached_token_expires_with_token(monkeypatch):
+    decodes = _count_decodes(monkeypatch)
+    token_cache.clear()
+    token = utils.create_token(
+        {
+            "sub": 1,
+            "name": "Admin",
+            "email": "admin@email.com",
+            "account_type": "Admin",
+            "exp": int(time.time()) + 1,
+        }
+    )
+
+    with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        assert fetch_session()["sub"] == 1
+
+    # The cache entry lives no longer than the token, which is then rejected.
+    time.sleep(2)
+    assert token_cache.get(token) is None
+    with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        assert fetch_session() is None
+    assert decodes == [token, token]
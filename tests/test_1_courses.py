@@ -2,7 +2,10 @@ import io
 
 import pytest
 from app import app
-from modules.utils.route_utils import delete_file, open_file
+from modules.routes.courses import courses_access
+from modules.routes.courses.courses_route import _check_course_visibility
+from modules.utils.principals import principal_cache
+from modules.utils.route_utils import delete_file, fetch_session, open_file
 from tests.mockers.course_mocker import CourseMocker
 from tests.mockers.file_mocker import FileMocker
 import tests.utils as utils
@@ -138,6 +141,70 @@ def test_courses_fetch():
         db.commit()
 
 
+def test_courses_for_lecturer_pagination():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_courses = [
+        CourseMocker.insert_mock_course(mock_lecturer),
+        CourseMocker.insert_mock_course(mock_lecturer),
+    ]
+    course_codes = sorted(course["course_code"] for course in mock_courses)
+
+    try:
+        response = test_client.get(
+            f"/courses/lecturer/{mock_lecturer['lecturer_id']}?limit=1&fields=course_name",
+            headers={"Authorization": "Bearer " + admin_token},
+        )
+        response_json = utils.response_json(response)
+
+        assert response.status_code == 200
+        assert len(response_json) == 1
+        assert list(response_json[0].keys()) == ["course_name"]
+        assert "X-Next-Cursor" in response.headers
+
+        response = test_client.get(
+            f"/courses/lecturer/{mock_lecturer['lecturer_id']}?limit=1&cursor={response.headers['X-Next-Cursor']}",
+            headers={"Authorization": "Bearer " + admin_token},
+        )
+        response_json = utils.response_json(response)
+
+        assert response.status_code == 200
+        assert [course["course_code"] for course in response_json] == course_codes[1:]
+        assert "X-Next-Cursor" not in response.headers
+
+        # Without `limit` or `cursor` every course is returned, as before paging.
+        response = test_client.get(
+            f"/courses/lecturer/{mock_lecturer['lecturer_id']}",
+            headers={"Authorization": "Bearer " + admin_token},
+        )
+        response_json = utils.response_json(response)
+
+        assert response.status_code == 200
+        assert [course["course_code"] for course in response_json] == course_codes
+        assert "X-Next-Cursor" not in response.headers
+
+        response = test_client.get(
+            f"/courses/lecturer/{mock_lecturer['lecturer_id']}?fields=password",
+            headers={"Authorization": "Bearer " + admin_token},
+        )
+        assert response.status_code == 400
+
+    finally:
+        db_cursor = db.cursor(dictionary=True)
+
+        # Delete the courses
+        for course_code in course_codes:
+            db_cursor.execute(
+                "DELETE FROM Course WHERE course_code = %s", (course_code,)
+            )
+        db.commit()
+
+        # Delete the lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
 def test_course_fetch():
     mock_lecturer = AccountMocker.insert_mock_lecturer()
     mock_course = CourseMocker.insert_mock_course(mock_lecturer)
@@ -195,6 +262,17 @@ def test_course_registration():
         assert response.status_code == 201
         assert response_json["course_code"] == course_code
         assert response_json["student_id"] == mock_student["student_id"]
+
+        db_cursor = db.cursor(dictionary=True)
+        db_cursor.execute(
+            "SELECT enrollment_count FROM Course WHERE course_code = %s", (course_code,)
+        )
+        assert db_cursor.fetchone()["enrollment_count"] == 1
+        db_cursor.execute(
+            "SELECT course_count FROM StudentDetails WHERE student_id = %s",
+            (mock_student["student_id"],),
+        )
+        assert db_cursor.fetchone()["course_count"] == 1
     finally:
         db_cursor = db.cursor(dictionary=True)
 
@@ -883,6 +961,87 @@ def test_grade_assignment():
         db.commit()
 
 
+def test_submission_access_errors():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_other_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_student = AccountMocker.insert_mock_student()
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    course_code = mock_course["course_code"]
+
+    lecturer_jwt_token = utils.create_lecturer_token_from_mock(
+        (mock_lecturer["mock_account"], mock_lecturer["mock_details"])
+    )
+
+    other_lecturer_jwt_token = utils.create_lecturer_token_from_mock(
+        (mock_other_lecturer["mock_account"], mock_other_lecturer["mock_details"])
+    )
+
+    student_jwt_token = utils.create_student_token_from_mock(
+        (mock_student["mock_account"], mock_student["mock_details"])
+    )
+
+    # Insert mock assignment without enrolling the student
+    mock_assignment = CourseMocker.insert_mock_assignment(mock_course)
+    assignment_id = mock_assignment["assignment_id"]
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        # Test as a student that isn't enrolled in the course
+        response = test_client.get(
+            f"/courses/assignments/{assignment_id}/submissions",
+            headers={"Authorization": "Bearer " + student_jwt_token},
+        )
+        assert response.status_code == 403
+
+        # Test as a lecturer that doesn't teach the course
+        response = test_client.post(
+            f"/courses/assignments/{assignment_id}/submissions/1/grade",
+            headers={"Authorization": "Bearer " + other_lecturer_jwt_token},
+            json={"grade": 90.0},
+        )
+        assert response.status_code == 403
+
+        # Test with an assignment that doesn't exist
+        response = test_client.get(
+            f"/courses/assignments/{assignment_id + 1}/submissions",
+            headers={"Authorization": "Bearer " + lecturer_jwt_token},
+        )
+        assert response.status_code == 404
+
+        # Test with a submission that doesn't exist
+        response = test_client.get(
+            f"/courses/assignments/{assignment_id}/submissions/1",
+            headers={"Authorization": "Bearer " + lecturer_jwt_token},
+        )
+        assert response.status_code == 404
+    finally:
+        # Delete the assignment
+        db_cursor.execute(
+            "DELETE FROM Assignment WHERE assignment_id = %s",
+            (assignment_id,),
+        )
+        db.commit()
+
+        # Delete the course
+        db_cursor.execute("DELETE FROM Course WHERE course_code = %s", (course_code,))
+        db.commit()
+
+        # Delete the student
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s",
+            (mock_student["account_id"],),
+        )
+        db.commit()
+
+        # Delete the lecturers
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id IN (%s, %s)",
+            (mock_lecturer["account_id"], mock_other_lecturer["account_id"]),
+        )
+        db.commit()
+
+
 def test_create_course_section():
     mock_lecturer = AccountMocker.insert_mock_lecturer()
     mock_course = CourseMocker.insert_mock_course(mock_lecturer)
@@ -1064,6 +1223,57 @@ def test_get_course_section():
         db.commit()
 
 
+def test_course_visibility_is_resolved_once_per_request(monkeypatch):
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    course_code = mock_course["course_code"]
+
+    lecturer_jwt_token = utils.create_lecturer_token_from_mock(
+        (mock_lecturer["mock_account"], mock_lecturer["mock_details"])
+    )
+
+    # Count the queries the visibility check runs.
+    cursors = []
+
+    class CountingConnection:
+        def cursor(self, *args, **kwargs):
+            cursors.append(args)
+            return db.cursor(*args, **kwargs)
+
+    monkeypatch.setattr(courses_access, "db", CountingConnection())
+    principal_cache.delete(mock_lecturer["account_id"])
+
+    try:
+        with app.test_request_context(
+            headers={"Authorization": "Bearer " + lecturer_jwt_token}
+        ):
+            session = fetch_session()
+            visibility = courses_access.resolve_course_visibility(session, course_code)
+            assert visibility.course_exists
+            assert visibility.lecturer_id == mock_lecturer["mock_details"]["lecturer_id"]
+
+            # The check in the same request is answered from the memo.
+            assert _check_course_visibility(session, course_code) is None
+            assert courses_access.resolve_course_visibility(session, course_code) is visibility
+            assert len(cursors) == 1
+
+            assert not courses_access.resolve_course_visibility(session, "NOPE000").course_exists
+            assert _check_course_visibility(session, "NOPE000")[1] == 403
+            assert len(cursors) == 2
+    finally:
+        db_cursor = db.cursor(dictionary=True)
+
+        # Delete the course
+        db_cursor.execute("DELETE FROM Course WHERE course_code = %s", (course_code,))
+        db.commit()
+
+        # Delete the lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
 def test_create_course_section_item():
     mock_lecturer = AccountMocker.insert_mock_lecturer()
     mock_course = CourseMocker.insert_mock_course(mock_lecturer)
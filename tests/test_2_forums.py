@@ -1,10 +1,16 @@
+import json
+import os
 import pytest
 from app import app
+from modules.routes.forums import forum_route
+from modules.routes.forums.forum_stream import ReplyBroker, poll_new_replies
+from modules.routes.forums.reply_buffer import ReplyBuffer
 from tests.mockers.forum_mocker import ForumMocker
 from tests.mockers.account_mocker import AccountMocker
 from tests.mockers.course_mocker import CourseMocker
-from modules.utils.db import db
+from modules.utils.db import db, pooled_connection
 import tests.utils as utils
+from modules.utils.pagination import DEFAULT_PAGE_SIZE
 
 test_client = app.test_client()
 forum_mocker = ForumMocker()
@@ -281,6 +287,25 @@ def test_thread_reply():
         assert reply["thread_id"] == thread["thread_id"]
         assert reply["reply_text"] == "This is a test reply"
 
+        # The thread's reply counter is incremented with the reply
+        db_cursor.execute(
+            "SELECT replies FROM DiscussionThread WHERE thread_id = %s",
+            (thread["thread_id"],),
+        )
+        assert db_cursor.fetchone()["replies"] == 1
+
+        # Replies to a thread outside of the forum in the URL, or to no thread, are rejected
+        for forum_id, thread_id in (
+            (forum["forum_id"] + 1, thread["thread_id"]),
+            (forum["forum_id"], thread["thread_id"] + 1000),
+        ):
+            response = test_client.post(
+                f"/course/{mock_course['course_code']}/forums/{forum_id}/threads/{thread_id}/reply",
+                headers={"Authorization": f"Bearer {student_token}"},
+                json={"reply_text": "This reply goes nowhere"},
+            )
+            assert response.status_code == 404
+
         # Delete reply
         db_cursor.execute(
             "DELETE FROM DiscussionReply WHERE reply_id = %s", (reply["reply_id"],)
@@ -317,6 +342,65 @@ def test_thread_reply():
         )
 
 
+def test_rolled_back_reply_keeps_counter(monkeypatch):
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+    mock_student = AccountMocker.insert_mock_student()
+    student_token = utils.create_student_token_from_mock(
+        (
+            mock_student["mock_account"],
+            mock_student["mock_details"],
+        )
+    )
+    CourseMocker.enrol_mock_student(mock_course, mock_student)
+
+    def fail_publish(*args, **kwargs):
+        raise RuntimeError("publish failed")
+
+    # Fail the route after the counter was bumped, so the transaction rolls back.
+    monkeypatch.setattr(forum_route, "publish", fail_publish)
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        response = test_client.post(
+            f"/course/{mock_course['course_code']}/forums/{forum['forum_id']}/threads/{thread['thread_id']}/reply",
+            headers={"Authorization": f"Bearer {student_token}"},
+            json={"reply_text": "This reply is rolled back"},
+        )
+        assert response.status_code == 500
+
+        # Start a new snapshot to see what the request committed.
+        db.rollback()
+        db_cursor.execute(
+            "SELECT replies FROM DiscussionThread WHERE thread_id = %s",
+            (thread["thread_id"],),
+        )
+        assert db_cursor.fetchone()["replies"] == 0
+        db_cursor.execute(
+            "SELECT COUNT(*) AS replies FROM DiscussionReply WHERE thread_id = %s",
+            (thread["thread_id"],),
+        )
+        assert db_cursor.fetchone()["replies"] == 0
+    finally:
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id IN (%s, %s)",
+            (mock_student["account_id"], mock_lecturer["account_id"]),
+        )
+        db.commit()
+
+
 def test_fetch_replies():
     # Create lecturer
     mock_lecturer = AccountMocker.insert_mock_lecturer()
@@ -397,3 +481,499 @@ def test_fetch_replies():
             "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
         )
         db.commit()
+
+
+def test_paginated_replies_and_thread_summary():
+    # Create lecturer
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    lecturer_token = utils.create_lecturer_token_from_mock(
+        (
+            mock_lecturer["mock_account"],
+            mock_lecturer["mock_details"],
+        )
+    )
+
+    # Create a course
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+
+    # Create forum
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+
+    # Create thread
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+
+    # Create student
+    mock_student = AccountMocker.insert_mock_student()
+    student_token = utils.create_student_token_from_mock(
+        (
+            mock_student["mock_account"],
+            mock_student["mock_details"],
+        )
+    )
+
+    # Enrol student
+    CourseMocker.enrol_mock_student(mock_course, mock_student)
+
+    # Create replies
+    replies = [
+        ForumMocker.insert_mock_discussion_reply(thread, mock_student)
+        for _ in range(3)
+    ]
+
+    db_cursor = db.cursor(dictionary=True)
+    replies_url = f"/course/{mock_course['course_code']}/forums/{forum['forum_id']}/threads/{thread['thread_id']}/replies"
+
+    try:
+        # Fetch the first page of replies
+        response = test_client.get(
+            f"{replies_url}?limit=2",
+            headers={"Authorization": f"Bearer {student_token}"},
+        )
+        assert response.status_code == 200
+        first_page = response.get_json()
+        assert len(first_page) == 2
+        next_cursor = response.headers["X-Next-Cursor"]
+
+        # Fetch the second page of replies
+        response = test_client.get(
+            f"{replies_url}?limit=2&cursor={next_cursor}",
+            headers={"Authorization": f"Bearer {student_token}"},
+        )
+        assert response.status_code == 200
+        second_page = response.get_json()
+        assert len(second_page) == 1
+        assert "X-Next-Cursor" not in response.headers
+
+        fetched_ids = {reply["reply_id"] for reply in first_page + second_page}
+        assert fetched_ids == {reply["reply_id"] for reply in replies}
+
+        # Fetch the thread summaries
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/forums/{forum['forum_id']}/threads?summary=true",
+            headers={"Authorization": f"Bearer {lecturer_token}"},
+        )
+        assert response.status_code == 200
+
+        summaries = response.get_json()
+        assert len(summaries) == 1
+        assert summaries[0]["thread_id"] == thread["thread_id"]
+        assert summaries[0]["reply_count"] == 3
+        assert summaries[0]["last_reply_time"] is not None
+    finally:
+        # Delete replies
+        for reply in replies:
+            db_cursor.execute(
+                "DELETE FROM DiscussionReply WHERE reply_id = %s", (reply["reply_id"],)
+            )
+        db.commit()
+
+        # Delete thread
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db.commit()
+
+        # Delete forum
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db.commit()
+
+        # Delete course
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db.commit()
+
+        # Delete student
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_student["account_id"],)
+        )
+        db.commit()
+
+        # Delete lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
+def test_unpaginated_threads_and_replies_are_complete():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    lecturer_token = utils.create_lecturer_token_from_mock(
+        (
+            mock_lecturer["mock_account"],
+            mock_lecturer["mock_details"],
+        )
+    )
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+
+    # More threads and replies than a default page holds.
+    count = DEFAULT_PAGE_SIZE + 1
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.executemany(
+        "INSERT INTO DiscussionThread (replies, timeStamp, forum_id) VALUES (0, NOW(), %s)",
+        [(forum["forum_id"],)] * (count - 1),
+    )
+    db_cursor.executemany(
+        "INSERT INTO DiscussionReply (thread_id, user_id, reply_text, reply_time) VALUES (%s, %s, %s, NOW())",
+        [(thread["thread_id"], mock_lecturer["account_id"], f"Reply {i}") for i in range(count)],
+    )
+    db.commit()
+
+    forum_url = f"/course/{mock_course['course_code']}/forums/{forum['forum_id']}"
+
+    try:
+        # Without limit or cursor, every thread and reply is returned
+        for url in (f"{forum_url}/threads", f"{forum_url}/threads?summary=true"):
+            response = test_client.get(
+                url, headers={"Authorization": f"Bearer {lecturer_token}"}
+            )
+            assert response.status_code == 200
+            assert len(response.get_json()) == count
+            assert "X-Next-Cursor" not in response.headers
+
+        response = test_client.get(
+            f"{forum_url}/threads/{thread['thread_id']}/replies",
+            headers={"Authorization": f"Bearer {lecturer_token}"},
+        )
+        assert response.status_code == 200
+        assert len(response.get_json()) == count
+        assert "X-Next-Cursor" not in response.headers
+
+        # Sending a limit still pages them
+        response = test_client.get(
+            f"{forum_url}/threads/{thread['thread_id']}/replies?limit={DEFAULT_PAGE_SIZE}",
+            headers={"Authorization": f"Bearer {lecturer_token}"},
+        )
+        assert len(response.get_json()) == DEFAULT_PAGE_SIZE
+        assert "X-Next-Cursor" in response.headers
+    finally:
+        # Deleting the forum deletes its threads and their replies
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
+def test_reply_stream_resume():
+    # Create lecturer
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+
+    # Create a course
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+
+    # Create forum
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+
+    # Create thread
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+
+    # Create student
+    mock_student = AccountMocker.insert_mock_student()
+    student_token = utils.create_student_token_from_mock(
+        (
+            mock_student["mock_account"],
+            mock_student["mock_details"],
+        )
+    )
+
+    # Enrol student
+    CourseMocker.enrol_mock_student(mock_course, mock_student)
+
+    # Create reply
+    reply = ForumMocker.insert_mock_discussion_reply(thread, mock_student)
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        # Resume the thread's stream from before the reply
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/forums/{forum['forum_id']}/threads/{thread['thread_id']}/stream",
+            headers={
+                "Authorization": f"Bearer {student_token}",
+                "Last-Event-ID": str(reply["reply_id"] - 1),
+            },
+            buffered=False,
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+        events = iter(response.response)
+        assert next(events).startswith("retry:")
+        replayed = next(events)
+        assert f"id: {reply['reply_id']}\n" in replayed
+        assert "event: reply\n" in replayed
+        response.close()
+
+        # Streams of a thread in another course's forum are not found
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/forums/{forum['forum_id'] + 1}/threads/{thread['thread_id']}/stream",
+            headers={"Authorization": f"Bearer {student_token}"},
+        )
+        assert response.status_code == 404
+    finally:
+        # Delete reply
+        db_cursor.execute(
+            "DELETE FROM DiscussionReply WHERE reply_id = %s", (reply["reply_id"],)
+        )
+        db.commit()
+
+        # Delete thread
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db.commit()
+
+        # Delete forum
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db.commit()
+
+        # Delete course
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db.commit()
+
+        # Delete student
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_student["account_id"],)
+        )
+        db.commit()
+
+        # Delete lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
+def test_reply_bridge_across_brokers():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+    mock_student = AccountMocker.insert_mock_student()
+
+    # One broker per worker process, the reply is posted through the first one.
+    posting_broker = ReplyBroker()
+    receiving_broker = ReplyBroker()
+    posted = posting_broker.subscribe(("thread", thread["thread_id"]))
+    received = receiving_broker.subscribe(("forum", forum["forum_id"]))
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        with pooled_connection() as conn:
+            high_water = poll_new_replies(conn, None, receiving_broker)
+
+        reply = ForumMocker.insert_mock_discussion_reply(thread, mock_student)
+        db_cursor.execute(
+            "SELECT * FROM DiscussionReply WHERE reply_id = %s", (reply["reply_id"],)
+        )
+        reply_row = db_cursor.fetchone()
+        assert posting_broker.publish(forum["forum_id"], reply_row)
+        assert posted.get(timeout=0)["reply_id"] == reply["reply_id"]
+        assert received.get(timeout=0) is None
+
+        # The other process' bridge picks it up from the database
+        with pooled_connection() as conn:
+            high_water = poll_new_replies(conn, high_water, receiving_broker)
+        assert high_water == reply["reply_id"]
+        assert received.get(timeout=0)["reply_id"] == reply["reply_id"]
+
+        # Polls re-reading it don't deliver it twice
+        with pooled_connection() as conn:
+            poll_new_replies(conn, high_water, receiving_broker)
+        assert received.get(timeout=0) is None
+    finally:
+        posted.close()
+        received.close()
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id IN (%s, %s)",
+            (mock_student["account_id"], mock_lecturer["account_id"]),
+        )
+        db.commit()
+
+
+def test_reply_buffer_flush_and_replay(tmp_path):
+    # Create lecturer
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+
+    # Create a course
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+
+    # Create forum
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+
+    # Create thread
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+
+    # Create student
+    mock_student = AccountMocker.insert_mock_student()
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        # Journal replies without flushing them, as if the process crashed
+        crashed_buffer = ReplyBuffer(str(tmp_path), batch_size=2)
+        for i in range(3):
+            crashed_buffer.append(
+                forum["forum_id"],
+                thread["thread_id"],
+                mock_student["account_id"],
+                f"Buffered reply {i}",
+            )
+        assert len(crashed_buffer.pending_for(thread["thread_id"], mock_student["account_id"])) == 3
+
+        # A new buffer replays the journal in batches
+        recovered_buffer = ReplyBuffer(str(tmp_path), batch_size=2)
+        assert recovered_buffer.recover() == 3
+        assert recovered_buffer.flush() == 3
+
+        # Replaying replies that were already inserted doesn't insert them again
+        assert crashed_buffer.flush() == 0
+        assert os.listdir(tmp_path) == []
+
+        db_cursor.execute(
+            "SELECT COUNT(*) AS replies FROM DiscussionReply WHERE thread_id = %s",
+            (thread["thread_id"],),
+        )
+        assert db_cursor.fetchone()["replies"] == 3
+        db_cursor.execute(
+            "SELECT replies FROM DiscussionThread WHERE thread_id = %s",
+            (thread["thread_id"],),
+        )
+        assert db_cursor.fetchone()["replies"] == 3
+    finally:
+        # Delete thread, along with its replies
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db.commit()
+
+        # Delete forum
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db.commit()
+
+        # Delete course
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db.commit()
+
+        # Delete student
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_student["account_id"],)
+        )
+        db.commit()
+
+        # Delete lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
+def test_reply_buffer_quarantines_rejected_reply(tmp_path):
+    # Create lecturer
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+
+    # Create a course
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+
+    # Create forum
+    forum = ForumMocker.insert_mock_forum(mock_lecturer, mock_course)
+
+    # Create a thread, and one that is deleted before its reply is flushed
+    thread = ForumMocker.insert_mock_discussion_thread(forum)
+    deleted_thread = ForumMocker.insert_mock_discussion_thread(forum)
+
+    # Create student
+    mock_student = AccountMocker.insert_mock_student()
+
+    db_cursor = db.cursor(dictionary=True)
+
+    try:
+        buffer = ReplyBuffer(str(tmp_path), batch_size=10, max_attempts=2)
+        rejected = buffer.append(
+            forum["forum_id"], deleted_thread["thread_id"], mock_student["account_id"], "Rejected reply"
+        )
+        accepted = buffer.append(
+            forum["forum_id"], thread["thread_id"], mock_student["account_id"], "Accepted reply"
+        )
+
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s",
+            (deleted_thread["thread_id"],),
+        )
+        db.commit()
+
+        # The rejected reply doesn't hold up the one behind it
+        assert buffer.flush() == 1
+        assert buffer.pending_for(deleted_thread["thread_id"], mock_student["account_id"]) == [rejected]
+        assert buffer.pending_for(thread["thread_id"], mock_student["account_id"]) == []
+
+        # After its last attempt it is quarantined and the journal is cleared
+        assert buffer.flush() == 0
+        assert buffer.pending_for(deleted_thread["thread_id"], mock_student["account_id"]) == []
+        assert os.listdir(tmp_path) == ["quarantine"]
+        (quarantine_file,) = os.listdir(tmp_path / "quarantine")
+        with open(tmp_path / "quarantine" / quarantine_file) as f:
+            assert [json.loads(line)["client_id"] for line in f] == [rejected["client_id"]]
+
+        db.rollback()
+        db_cursor.execute(
+            "SELECT client_id FROM DiscussionReply WHERE thread_id IN (%s, %s)",
+            (thread["thread_id"], deleted_thread["thread_id"]),
+        )
+        assert [row["client_id"] for row in db_cursor.fetchall()] == [accepted["client_id"]]
+    finally:
+        db_cursor.execute(
+            "DELETE FROM DiscussionThread WHERE thread_id = %s", (thread["thread_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM DiscussionForum WHERE forum_id = %s", (forum["forum_id"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id IN (%s, %s)",
+            (mock_student["account_id"], mock_lecturer["account_id"]),
+        )
+        db.commit()
+
+
+def test_forked_reply_buffer_recovers_sibling_segments(tmp_path):
+    crashed_sibling = ReplyBuffer(str(tmp_path), batch_size=10)
+    crashed_sibling.append(1, 1, 1, "Journaled by a sibling worker")
+
+    # A worker forked from the same parent inherits the parent's instance name
+    worker = ReplyBuffer(str(tmp_path), batch_size=10)
+    worker._instance = crashed_sibling._instance
+    assert worker.recover() == 0
+
+    worker.forked()
+    assert worker.recover() == 1
@@ -0,0 +1,229 @@
+import time
+import numpy as np
+from app import app
+from modules.routes.report.analytics import (
+    GpaArrays,
+    describe,
+    major_means,
+    top_students,
+)
+from modules.routes.report.report_route import invalidate_reports
+from tests.mockers.account_mocker import AccountMocker
+from tests.mockers.course_mocker import CourseMocker
+from modules.utils.db import db
+import tests.utils as utils
+
+test_client = app.test_client()
+admin_token = utils.create_admin_token()
+
+
+def test_course_enrollment_report_threshold():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    mock_student = AccountMocker.insert_mock_student()
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    course_code = mock_course["course_code"]
+    CourseMocker.enrol_mock_student(mock_course, mock_student)
+
+    try:
+        response = test_client.get("/reports/course_enrollment?threshold=1")
+        response_json = utils.response_json(response)
+
+        assert response.status_code == 200
+        assert "generated_at" in response_json
+        assert course_code in [
+            course["course_code"] for course in response_json["results"]
+        ]
+
+        response = test_client.get("/reports/course_enrollment?threshold=2")
+        response_json = utils.response_json(response)
+
+        assert response.status_code == 200
+        assert course_code not in [
+            course["course_code"] for course in response_json["results"]
+        ]
+
+        response = test_client.get(
+            "/reports/course_enrollment?threshold=1", headers={"Accept": "text/csv"}
+        )
+        lines = response.get_data(as_text=True).splitlines()
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert lines[0] == "course_code,course_name,student_count"
+        assert any(line.startswith(course_code + ",") for line in lines[1:])
+
+        response = test_client.get("/reports/course_enrollment?limit=0")
+        assert response.status_code == 400
+
+        response = test_client.get("/reports/not_a_report")
+        assert response.status_code == 404
+    finally:
+        db_cursor = db.cursor(dictionary=True)
+
+        # Delete the course
+        db_cursor.execute("DELETE FROM Course WHERE course_code = %s", (course_code,))
+        db.commit()
+
+        # Delete the student
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_student["account_id"],)
+        )
+        db.commit()
+
+        # Delete the lecturer
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id = %s", (mock_lecturer["account_id"],)
+        )
+        db.commit()
+
+
+def test_report_etag():
+    response = test_client.get("/reports/top10enrolled")
+    etag = response.headers.get("ETag")
+
+    assert response.status_code == 200
+    assert etag
+
+    response = test_client.get(
+        "/reports/top10enrolled", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    # A recomputed report with the same rows keeps its ETag.
+    invalidate_reports("course_enrollment")
+    response = test_client.get(
+        "/reports/top10enrolled", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    # Live reports have no generation time to send.
+    response = test_client.get("/reports/top10enrolled")
+    assert "Last-Modified" not in response.headers
+
+    # Neither do their exports.
+    response = test_client.get("/reports/top10enrolled", headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    assert "Last-Modified" not in response.headers
+
+
+def test_report_job():
+    response = test_client.post(
+        "/reports/jobs",
+        json={"report": "gpa_distribution"},
+        headers={"Authorization": "Bearer " + admin_token},
+    )
+    response_json = utils.response_json(response)
+
+    assert response.status_code == 202
+    location = response_json["location"]
+
+    # Poll until the job has finished.
+    for _ in range(50):
+        response = test_client.get(
+            location, headers={"Authorization": "Bearer " + admin_token}
+        )
+        response_json = utils.response_json(response)
+        if response_json["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.1)
+
+    assert response.status_code == 200
+    assert response_json["status"] == "succeeded"
+    assert "buckets" in response_json["result"]
+
+    response = test_client.post(
+        "/reports/jobs",
+        json={"report": "not_a_report"},
+        headers={"Authorization": "Bearer " + admin_token},
+    )
+    assert response.status_code == 400
+
+    # Only admins can queue jobs or read their results.
+    student_token = utils.create_token(
+        {"sub": 0, "name": "Student", "email": "student@email.com", "account_type": "Student"}
+    )
+    response = test_client.post(
+        "/reports/jobs",
+        json={"report": "gpa_distribution"},
+        headers={"Authorization": "Bearer " + student_token},
+    )
+    assert response.status_code == 401
+    response = test_client.get(
+        location, headers={"Authorization": "Bearer " + student_token}
+    )
+    assert response.status_code == 401
+
+
+def _gpa_arrays(gpa, major_codes=None, majors=("",)):
+    return GpaArrays(
+        student_ids=np.arange(1, len(gpa) + 1, dtype=np.int32),
+        gpa=np.array(gpa, dtype=np.float32),
+        major_codes=np.array(major_codes or [0] * len(gpa), dtype=np.int32),
+        majors=np.array(majors),
+    )
+
+
+def test_describe():
+    stats = describe(np.array([1, 2, 3, 4], dtype=np.float32), bins=4, upper_bound=4)
+
+    assert stats["count"] == 4
+    assert stats["mean"] == 2.5
+    assert stats["percentiles"]["p50"] == 2.5
+    assert [bucket["count"] for bucket in stats["histogram"]] == [0, 1, 1, 2]
+    assert stats["histogram"][-1]["end"] == 4
+
+
+
+def test_describe_empty():
+    stats = describe(np.array([1, 2], dtype=np.float32), bins=4, upper_bound=4)
+    empty = describe(np.array([], dtype=np.float32), bins=4, upper_bound=4)
+
+    # Empty input has the same keys, without values.
+    assert empty.keys() == stats.keys()
+    assert empty["percentiles"].keys() == stats["percentiles"].keys()
+    assert empty["count"] == 0
+    assert empty["mean"] is None
+    assert empty["stddev"] is None
+    assert empty["min"] is None
+    assert empty["max"] is None
+    assert set(empty["percentiles"].values()) == {None}
+    assert empty["histogram"] == []
+
+
+def test_major_means():
+    arrays = _gpa_arrays(
+        [3.0, 4.0, 2.0], major_codes=[1, 1, 0], majors=["", "Biology", "Physics"]
+    )
+
+    # Majors without students are left out, an empty major is reported as None.
+    assert major_means(arrays) == [
+        {"major": None, "students": 1, "mean_gpa": 2.0},
+        {"major": "Biology", "students": 2, "mean_gpa": 3.5},
+    ]
+    assert major_means(_gpa_arrays([])) == []
+
+
+def test_top_students_dense_rank():
+    arrays = _gpa_arrays([3.5, 4.0, 3.5, 2.0, 4.0, 3.0])
+
+    # Tied GPAs share a rank and the next GPA gets the next rank, like DENSE_RANK().
+    assert [(s["student_id"], s["rank"]) for s in top_students(arrays, 2)] == [
+        (2, 1),
+        (5, 1),
+        (1, 2),
+        (3, 2),
+    ]
+    # Asking for more ranks than there are distinct GPAs returns everyone.
+    assert len(top_students(arrays, 10)) == 6
+    assert top_students(_gpa_arrays([]), 10) == []
+
+
+def test_gpa_analytics_requires_admin():
+    response = test_client.get("/reports/analytics/gpa")
+    assert response.status_code == 401
+
+    response = test_client.get(
+        "/reports/analytics/gpa", headers={"Authorization": "Bearer " + admin_token}
+    )
+    assert response.status_code == 200
+    assert "top_students" in utils.response_json(response)
@@ -0,0 +1,73 @@
+from app import app
+from tests.mockers.account_mocker import AccountMocker
+from tests.mockers.course_mocker import CourseMocker
+from modules.utils.db import db
+import tests.utils as utils
+
+test_client = app.test_client()
+
+
+def test_course_search():
+    mock_lecturer = AccountMocker.insert_mock_lecturer()
+    lecturer_token = utils.create_lecturer_token_from_mock(
+        (
+            mock_lecturer["mock_account"],
+            mock_lecturer["mock_details"],
+        )
+    )
+    mock_student = AccountMocker.insert_mock_student()
+    student_token = utils.create_student_token_from_mock(
+        (
+            mock_student["mock_account"],
+            mock_student["mock_details"],
+        )
+    )
+    mock_course = CourseMocker.insert_mock_course(mock_lecturer)
+    mock_assignment = CourseMocker.insert_mock_assignment(mock_course)
+
+    db_cursor = db.cursor(dictionary=True)
+    db_cursor.execute(
+        "UPDATE Assignment SET description = %s WHERE assignment_id = %s",
+        (
+            "Measure how chlorophyll absorbs light in the photosynthesis lab",
+            mock_assignment["assignment_id"],
+        ),
+    )
+    db.commit()
+
+    try:
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/search?q=chlorophyll",
+            headers={"Authorization": f"Bearer {lecturer_token}"},
+        )
+        assert response.status_code == 200
+
+        results = response.get_json()
+        assert [(r["kind"], r["id"]) for r in results] == [
+            ("assignment", mock_assignment["assignment_id"])
+        ]
+        assert "chlorophyll" in results[0]["snippet"]
+        assert results[0]["score"] > 0
+
+        # A query is required
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/search",
+            headers={"Authorization": f"Bearer {lecturer_token}"},
+        )
+        assert response.status_code == 400
+
+        # Students can only search the courses they are enrolled in
+        response = test_client.get(
+            f"/course/{mock_course['course_code']}/search?q=chlorophyll",
+            headers={"Authorization": f"Bearer {student_token}"},
+        )
+        assert response.status_code == 403
+    finally:
+        db_cursor.execute(
+            "DELETE FROM Course WHERE course_code = %s", (mock_course["course_code"],)
+        )
+        db_cursor.execute(
+            "DELETE FROM Account WHERE account_id IN (%s, %s)",
+            (mock_lecturer["account_id"], mock_student["account_id"]),
+        )
+        db.commit()
@@ -0,0 +1,266 @@
+import threading
+import time
+import pytest
+from app import app
+from modules.models.account import AccountType
+from modules.utils import migrations
+from modules.utils.db import (
+    ConnectionPool,
+    PoolTimeoutError,
+    after_commit,
+    db,
+    pooled_connection,
+    seed_root_user,
+    transaction,
+    unit_of_work,
+)
+from modules.utils.migrations import apply_migrations
+from modules.utils.query_plans import ROUTE_QUERIES, find_full_scans, route_query_sql
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.unread_result = False
+        self.rollbacks = 0
+        self.reconnects = 0
+        self.closed = False
+
+    def is_connected(self):
+        return self.connected
+
+    def reconnect(self, attempts=1, delay=0):
+        self.connected = True
+        self.reconnects += 1
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def rollback(self):
+        if not self.connected:
+            raise ConnectionError("Lost connection")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(ConnectionPool):
+    def _connect(self):
+        return FakeConnection()
+
+
+def test_pool_reuses_released_connections():
+    pool = FakePool(min_size=1, max_size=2, timeout=1)
+
+    conn = pool.acquire()
+    assert pool.stats()["in_use"] == 1
+    assert pool.stats()["idle"] == 0
+
+    pool.release(conn)
+    assert pool.acquire() is conn
+
+    stats = pool.stats()
+    assert stats["size"] == 1
+    assert stats["checkouts"] == 2
+
+
+def test_pool_release_rolls_back():
+    pool = FakePool(min_size=0, max_size=1, timeout=1)
+
+    conn = pool.acquire()
+    conn.unread_result = True
+    pool.release(conn)
+
+    assert conn.rollbacks == 1
+    assert not conn.unread_result
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_release_drops_broken_connections():
+    pool = FakePool(min_size=0, max_size=1, timeout=1)
+
+    conn = pool.acquire()
+    conn.connected = False
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+    assert pool.acquire() is not conn
+
+
+def test_pool_reconnects_stale_connections():
+    pool = FakePool(min_size=1, max_size=1, timeout=1)
+    conn = pool.acquire()
+    pool.release(conn)
+
+    # The server closed the idle socket.
+    conn.connected = False
+    assert pool.acquire() is conn
+    assert conn.reconnects == 1
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_pool_times_out_when_exhausted():
+    pool = FakePool(min_size=0, max_size=1, timeout=0.05)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["waiting"] == 0
+    assert stats["in_use"] == 1
+
+
+def test_pool_waiter_gets_released_connection():
+    pool = FakePool(min_size=0, max_size=1, timeout=5)
+    conn = pool.acquire()
+    acquired = []
+
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    while pool.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    pool.release(conn)
+    waiter.join(timeout=5)
+
+    assert acquired == [conn]
+    assert pool.stats()["max_wait_time"] > 0
+
+
+def test_pool_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        FakePool(min_size=2, max_size=1)
+
+
+def _account_exists(email):
+    with pooled_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute("SELECT 1 FROM Account WHERE email = %s", (email,))
+        return db_cursor.fetchone() is not None
+
+
+def _insert_account(email):
+    db.cursor().execute(
+        "INSERT INTO Account (email, password, account_type, name) VALUES (%s, %s, %s, %s)",
+        (email, "password", AccountType.Admin.name, "Unit Of Work"),
+    )
+
+
+def _delete_account(email):
+    with pooled_connection() as conn:
+        conn.cursor().execute("DELETE FROM Account WHERE email = %s", (email,))
+        conn.commit()
+
+
+@pytest.mark.parametrize(
+    "status, committed", [(200, True), (201, True), (400, False), (500, False)]
+)
+def test_unit_of_work_commits_only_successful_responses(status, committed):
+    email = f"unit-of-work-{status}@email.com"
+    callbacks = []
+
+    @unit_of_work
+    def handler():
+        _insert_account(email)
+        after_commit(lambda: callbacks.append(email))
+        return {}, status
+
+    try:
+        with app.test_request_context():
+            handler()
+
+        assert _account_exists(email) == committed
+        assert callbacks == ([email] if committed else [])
+    finally:
+        _delete_account(email)
+
+
+def test_unit_of_work_rolls_back_on_exception():
+    email = "unit-of-work-raise@email.com"
+
+    @unit_of_work
+    def handler():
+        _insert_account(email)
+        raise RuntimeError("Handler failed")
+
+    try:
+        with app.test_request_context():
+            with pytest.raises(RuntimeError):
+                handler()
+
+        assert not _account_exists(email)
+    finally:
+        _delete_account(email)
+
+
+def test_nested_transaction_commits_once():
+    email = "unit-of-work-nested@email.com"
+
+    @unit_of_work
+    def handler():
+        with transaction():
+            _insert_account(email)
+        # Still uncommitted, the outer transaction decides.
+        assert not _account_exists(email)
+        return {}, 409
+
+    try:
+        with app.test_request_context():
+            handler()
+
+        assert not _account_exists(email)
+    finally:
+        _delete_account(email)
+
+
+def test_seed_root_user_is_idempotent():
+    seed_root_user()
+
+    # The account exists now, so seeding again creates nothing.
+    assert seed_root_user() is False
+    assert seed_root_user() is False
+
+    with pooled_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute("SELECT COUNT(*) FROM Account WHERE email = 'root'")
+        assert db_cursor.fetchone()[0] == 1
+
+
+def test_apply_migrations_skips_applied_versions(tmp_path, monkeypatch):
+    version = "999_test_migration"
+    (tmp_path / f"{version}.sql").write_text(
+        """
+        -- A table only this test uses
+        CREATE TABLE IF NOT EXISTS MigrationTest (id INT PRIMARY KEY);
+        INSERT INTO MigrationTest (id) VALUES (1);
+        """
+    )
+    monkeypatch.setattr(migrations, "MIGRATIONS_DIR", str(tmp_path))
+
+    try:
+        with pooled_connection() as conn:
+            assert apply_migrations(conn) == [version]
+            # Running it again would fail on the duplicate row if it wasn't skipped.
+            assert apply_migrations(conn) == []
+    finally:
+        with pooled_connection() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute("DROP TABLE IF EXISTS MigrationTest")
+            db_cursor.execute("DELETE FROM SchemaMigration WHERE version = %s", (version,))
+            conn.commit()
+
+
+def test_query_plan_check_uses_route_queries():
+    queries = {query.name: query for query in ROUTE_QUERIES}
+
+    # The registered SQL is what the route builds, keyset condition included.
+    sql = route_query_sql(queries["courses.get_courses_for_student"])
+    assert "c.enrollment_count" in sql
+    assert "(c.course_code) > (%s)" in sql
+
+    # Every registered query is valid with its sample parameters.
+    with pooled_connection() as conn:
+        assert find_full_scans(conn, min_rows=10**9) == []
@@ -0,0 +1,136 @@
+import glob
+import importlib.util
+import io
+import os
+import re
+import subprocess
+import sys
+import pytest
+
+GEN_SQL = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "gen_sql.py"
+)
+
+# Large enough for two student shards, so the workers really split the work.
+SCALE = 0.25
+
+
+def _load_gen_sql():
+    spec = importlib.util.spec_from_file_location("gen_sql", GEN_SQL)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+gen_sql = _load_gen_sql()
+
+
+def _generate(*args: str):
+    subprocess.run([sys.executable, GEN_SQL, *args], check=True, capture_output=True)
+
+
+# How LOAD DATA reads the escape sequences of its default FIELDS ESCAPED BY '\\'.
+LOAD_DATA_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "0": "\0", "Z": "\x1a"}
+
+
+def _load_data_fields(line: str) -> list[str | None]:
+    """Split a line into fields the way LOAD DATA does with its default options."""
+    return [
+        None
+        if field == "\\N"
+        else re.sub(r"\\(.)", lambda m: LOAD_DATA_ESCAPES.get(m.group(1), m.group(1)), field)
+        for field in line.split("\t")
+    ]
+
+
+def _table_rows(output_dir: str, table: str) -> list[str]:
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, f"{table}-*.tsv"))):
+        with open(path) as f:
+            rows.extend(f.read().splitlines())
+    return rows
+
+
+@pytest.mark.parametrize("output_format", ["sql", "tsv"])
+def test_gen_sql_output_does_not_depend_on_workers(tmp_path, output_format):
+    outputs = []
+    for workers in (1, 3):
+        output = tmp_path / f"workers-{workers}"
+        output.mkdir()
+        _generate(
+            "--scale", str(SCALE),
+            "--seed", "42",
+            "--workers", str(workers),
+            "--format", output_format,
+            "--output", str(output / "dataset.sql"),
+            "--output-dir", str(output),
+        )
+        outputs.append(
+            {
+                path.name: path.read_bytes()
+                for path in sorted(output.iterdir())
+                if path.is_file()
+            }
+        )
+
+    assert outputs[0]
+    assert outputs[0] == outputs[1]
+
+
+def test_gen_sql_row_counts_match_scale(tmp_path):
+    _generate(
+        "--scale", str(SCALE),
+        "--seed", "42",
+        "--format", "tsv",
+        "--output-dir", str(tmp_path),
+    )
+
+    num_students = int(gen_sql.BASE_STUDENTS * SCALE)
+    num_lecturers = int(gen_sql.BASE_LECTURERS * SCALE)
+    num_courses = max(num_lecturers, int(gen_sql.BASE_COURSES * SCALE))
+
+    assert len(_table_rows(tmp_path, "Account")) == num_students + num_lecturers
+    assert len(_table_rows(tmp_path, "LecturerDetails")) == num_lecturers
+    assert len(_table_rows(tmp_path, "StudentDetails")) == num_students
+    assert len(_table_rows(tmp_path, "Course")) == num_courses
+
+    # Every student takes 3 to 6 courses, and every course gets students.
+    enrollments = [row.split("\t") for row in _table_rows(tmp_path, "Enrollment")]
+    assert 3 * num_students <= len(enrollments) <= 6 * num_students
+    assert len({course_code for _, course_code in enrollments}) == num_courses
+
+
+def test_gen_sql_accounts_are_unique(tmp_path):
+    _generate("--scale", "0.05", "--seed", "7", "--format", "tsv", "--output-dir", str(tmp_path))
+
+    columns = gen_sql.TABLE_COLUMNS["Account"]
+    accounts = [
+        dict(zip(columns, _load_data_fields(row))) for row in _table_rows(tmp_path, "Account")
+    ]
+    assert len(accounts) > 5000
+
+    emails = [account["email"] for account in accounts]
+    contacts = [account["contact_info"] for account in accounts]
+    assert len(set(emails)) == len(emails)
+    assert len(set(contacts)) == len(contacts)
+
+
+def test_tsv_escaping_round_trips():
+    rows = [
+        (1, "Tab\tSeparated", "Line\nBreak", "Carriage\rReturn"),
+        (2, "Back\\slash", "Trailing backslash\\", "\\N"),
+        (3, "Nul\0byte", None, "O'Brien \\t \\n"),
+    ]
+    f = io.StringIO()
+    writer = gen_sql.TsvWriter(f, "Account", batch_size=1)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+
+    # Every row stays on one line and reads back as it was written.
+    lines = f.getvalue().split("\n")
+    assert lines.pop() == ""
+    assert len(lines) == len(rows)
+    assert [tuple(_load_data_fields(line)) for line in lines] == [
+        tuple(None if value is None else str(value) for value in row) for row in rows
+    ]